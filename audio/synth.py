@@ -5,6 +5,7 @@ from typing import Iterable, Optional
 from nmigen import *
 from nmigen.build import *
 from nmigen.hdl.ast import Statement
+from nmigen.lib.coding import PriorityEncoder
 
 from nmigen_nexys.core import shift_register
 from nmigen_nexys.core import timer
@@ -233,8 +234,16 @@ class Mixer(Elaboratable):
             period=fractions.Fraction(util.GetClockFreq(platform), 44_100))
         sample = Signal.like(self.sample)
         notes = Signal.like(self.notes)
+        # Jump straight to the next active note, so that each sample takes one
+        # cycle per voice rather than one per key
+        m.submodules.next_note = next_note = PriorityEncoder(len(self.notes))
+        m.d.comb += next_note.i.eq(notes)
+        tones = Array(C(i % 12, 4) for i in range(len(self.notes)))
+        octaves = Array(C(i // 12, range(self.phi.octaves))
+                        for i in range(len(self.notes)))
         tone = Signal(range(12))
         octave = Signal(range(self.phi.octaves))
+        valid = Signal()
         m.d.sync += self.update.eq(0)  # Default
         with m.FSM(reset='IDLE'):
             with m.State('IDLE'):
@@ -242,24 +251,23 @@ class Mixer(Elaboratable):
                     with m.If(self.notes):
                         m.d.sync += sample.eq(0)
                         m.d.sync += notes.eq(self.notes)
-                        m.d.sync += tone.eq(0)
-                        m.d.sync += octave.eq(0)
+                        m.d.sync += valid.eq(0)
                         m.next = 'SAMPLING'
                     with m.Else():
                         m.d.sync += self.sample.eq(0)
                         m.d.sync += self.update.eq(1)
             with m.State('SAMPLING'):
+                # Look up the next note while accumulating the current one
                 m.d.comb += sin.input.eq(self.phi.note_phase(tone, octave))
-                with m.If(notes[0]):
+                with m.If(valid):
                     # m.d.sync += SatAdd(m, sample, sin.output)
                     m.d.sync += sample.eq(sample + sin.output)  # TODO: Saturating addition
-                m.d.sync += notes.eq(notes >> 1)
-                with m.If(tone + 1 == 12):
-                    m.d.sync += tone.eq(0)
-                    m.d.sync += octave.eq(octave + 1)
-                with m.Else():
-                    m.d.sync += tone.eq(tone + 1)
-                with m.If(~(notes >> 1).any()):
+                m.d.sync += tone.eq(tones[next_note.o])
+                m.d.sync += octave.eq(octaves[next_note.o])
+                m.d.sync += valid.eq(~next_note.n)
+                # Clear the lowest set bit
+                m.d.sync += notes.eq(notes & (notes - 1))
+                with m.If(next_note.n):
                     m.next = 'UPDATE'
             with m.State('UPDATE'):
                 m.d.sync += self.sample.eq(sample)
@@ -1,4 +1,5 @@
 import os
+from typing import Iterable, Tuple
 import unittest
 
 import mido
@@ -94,6 +95,46 @@ class BasicMIDISinkTest(unittest.TestCase):
             sim.run()
 
 
+class MixerTest(unittest.TestCase):
+
+    def _first_update(self, notes: Iterable[str]) -> Tuple[int, int]:
+        """Return the cycle and value of the first sample."""
+        m = Module()
+        m.submodules.phi = phi = synth.TwelveTETPhaseArray()
+        active = Signal(12 * phi.octaves)
+        for note in notes:
+            m.d.comb += active[synth.Parse12TETNote(note)].eq(1)
+        m.submodules.mixer = mixer = synth.Mixer(active, phi)
+        m.submodules.timer = timer = test_util.Timer(self, timeout_s=50e-6)
+        sim = Simulator(m)
+        sim.add_clock(1.0 / util.SIMULATION_CLOCK_FREQUENCY)
+        result = []
+
+        def process():
+            yield from test_util.WaitSync(mixer.update)
+            result.append((yield timer.cycle_counter))
+            result.append((yield mixer.sample))
+
+        sim.add_sync_process(process)
+        sim.add_sync_process(timer.timeout_process)
+        sim.run()
+        return tuple(result)
+
+    def test_silence(self):
+        _, sample = self._first_update([])
+        self.assertEqual(sample, 0)
+
+    def test_cost_per_voice(self):
+        low, _ = self._first_update(['C-1'])
+        high, sample = self._first_update(['B6'])
+        self.assertNotEqual(sample, 0)
+        # The position of a note on the keyboard doesn't matter
+        self.assertEqual(high, low)
+        # Each additional voice costs one cycle
+        chord, _ = self._first_update(['C-1', 'E4', 'G4', 'B6'])
+        self.assertEqual(chord, low + 3)
+
+
 # class DemoTest(unittest.TestCase):
 
 #     def test_demo(self):
@@ -30,8 +30,8 @@ class Demo(Elaboratable):
         m.submodules.sin = sin = trig.SineLUT(Signal(8), Signal(8))
         with m.If(sin_timer.triggered):
             m.d.sync += sin.input.eq(sin.input + 1)
-        m.submodules.gamma = gamma = srgb.sRGBGammaLUT(sin.output, Signal(12))
-        m.submodules.pwm = pwm = pwm_module.PWM(gamma.output)
+        m.submodules.gamma = gamma = srgb.sRGBGammaLUT(sin.output, Signal(16))
+        m.submodules.pwm = pwm = pwm_module.PWM(gamma.output, dither_bits=8)
 
         segments = platform.request('display_7seg')
         anodes = platform.request('display_7seg_an')
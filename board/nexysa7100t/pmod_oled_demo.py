@@ -11,6 +11,7 @@ from nmigen_nexys.core import timer as timer_module
 from nmigen_nexys.core import util
 from nmigen_nexys.display import ssd1306
 from nmigen_nexys.math import lfsr as lfsr_module
+from nmigen_nexys.pmod.oled import framebuffer
 from nmigen_nexys.pmod.oled import pmod_oled
 
 
@@ -18,51 +19,64 @@ class Demo(Elaboratable):
     """Demo for the Digilent Pmod OLED.
 
     This demo assumes the module is plugged into JC. It displays pseudo-random
-    data, similar to the noise you'd see on an old NTSC television.
+    data, similar to the noise you'd see on an old NTSC television. Each image
+    is drawn into the back buffer of a double-buffered framebuffer, which is
+    refreshed at 60 Hz.
     """
 
     def elaborate(self, platform: Platform) -> Module:
         m = Module()
         m.submodules.lfsr = lfsr = lfsr_module.Fibonacci(
             polynomial=[24, 23, 22, 17, 0], seed=0x123456)
-        m.submodules.data = data = shift_register.Up(64)
+        m.submodules.data = data = shift_register.Up(8)
         m.d.comb += data.bit_in.eq(lfsr.output)
         m.d.comb += data.shift.eq(1)
 
         pins = pmod_oled.PmodPins()
         m.d.comb += platform.request('pmod_oled', 0).eq(pins)
+        # The power sequencer and the framebuffer each get their own
+        # controller, and the pins are handed over once the display is ready
+        power_bus = ssd1306.Bus(
+            dc=Signal(), cs_n=Signal(reset=1), clk=Signal(), mosi=Signal())
+        stream_bus = ssd1306.Bus(
+            dc=Signal(), cs_n=Signal(reset=1), clk=Signal(), mosi=Signal())
         m.submodules.controller = controller = ssd1306.Controller(
-            pins.ControllerBus(), max_data_bytes=8)
-        ifaces = [
-            ssd1306.Controller.Interface(controller.interface.max_bits)
-            for _ in range(2)
-        ]
-        select = Signal(reset=0)
-        m.d.comb += util.Multiplex(select, controller.interface, ifaces)
+            power_bus, max_data_bytes=0)
+        m.submodules.stream = stream = ssd1306.StreamController(stream_bus)
         m.submodules.sequencer = sequencer = pmod_oled.PowerSequencer(
-            pins, ifaces[0])
+            pins, controller.interface)
+        ready = sequencer.status == pmod_oled.PowerStatus.READY
+        with m.If(ready):
+            m.d.comb += pins.ControllerBus().eq(stream_bus)
+        with m.Else():
+            m.d.comb += pins.ControllerBus().eq(power_bus)
+        m.submodules.framebuffer = fb = framebuffer.Framebuffer(
+            stream.interface, frame_rate=60, double_buffer=True)
         m.submodules.timer = timer = timer_module.UpTimer(
             util.GetClockFreq(platform) // 10)
-        m.d.sync += ifaces[1].start.eq(0)  # default
+        m.d.comb += fb.enable.eq(ready)
+        m.d.sync += fb.write_en.eq(0)  # default
+        m.d.sync += fb.swap.eq(0)  # default
         with m.FSM(reset='RESET'):
             with m.State('RESET'):
                 with m.If(timer.triggered):
                     m.next = 'START'
             with m.State('START'):
                 m.d.sync += sequencer.enable.eq(1)
-                m.next = 'WAIT_UP'
-            with m.State('WAIT_UP'):
-                with m.If(sequencer.status == pmod_oled.PowerStatus.READY):
-                    m.d.sync += select.eq(1)
-                    m.d.sync += ifaces[1].WriteCommand(
-                        ssd1306.SetMemoryAddressingMode(
-                            ssd1306.AddressingMode.VERTICAL))
-                    m.d.sync += ifaces[1].start.eq(1)
-                    m.next = 'DRAW'
+                m.next = 'DRAW'
             with m.State('DRAW'):
-                with m.If(ifaces[1].done):
-                    m.d.sync += ifaces[1].WriteData(data.word_out)
-                    m.d.sync += ifaces[1].start.eq(1)
+                # Shift in a fresh byte of noise between writes
+                with m.If(timer.counter[:3] == 0):
+                    m.d.sync += fb.write_addr.eq(fb.write_addr + 1)
+                    m.d.sync += fb.write_data.eq(data.word_out)
+                    m.d.sync += fb.write_en.eq(1)
+                    with m.If(fb.write_addr == fb.size - 1):
+                        m.d.sync += fb.write_addr.eq(0)
+                        m.d.sync += fb.swap.eq(1)
+                        m.next = 'SWAP'
+            with m.State('SWAP'):
+                with m.If(fb.swapped):
+                    m.next = 'DRAW'
 
         leds = Cat(*[platform.request('led', i) for i in range(4)])
         m.d.comb += leds.eq(1 << sequencer.status)
@@ -3,12 +3,20 @@ from typing import Iterable, NamedTuple, Optional
 from minerva import wishbone
 from nmigen import *
 from nmigen.build import *
+from nmigen.lib.fifo import SyncFIFOBuffered
 from nmigen.hdl.mem import *
 from nmigen.hdl.ast import Statement
 from nmigen.hdl.rec import Record
+from nmigen.utils import log2_int
 
+from nmigen_nexys.core import pwm
 from nmigen_nexys.core import util
 from nmigen_nexys.display import seven_segment
+from nmigen_nexys.display import ssd1306
+from nmigen_nexys.pmod.oled import framebuffer
+from nmigen_nexys.pmod.oled import pmod_oled
+from nmigen_nexys.serial import spi
+from nmigen_nexys.serial import spi_flash
 from nmigen_nexys.vendor.xilinx import macro
 
 
@@ -75,6 +83,47 @@ class WishboneMux(Elaboratable):
         return m
 
 
+class WishboneArbiter(Elaboratable):
+    """Fixed-priority arbiter sharing one slave between n masters.
+
+    A master keeps the bus for as long as it holds cyc. When the bus is
+    released, it is granted to the lowest-numbered master requesting it on the
+    following cycle.
+    """
+
+    def __init__(self, n: int):
+        super().__init__()
+        self.masters = [Record(wishbone.wishbone_layout, name=f'master{i}')
+                        for i in range(n)]
+        self.wbus = Record(wishbone.wishbone_layout)
+
+    def elaborate(self, _: Optional[Platform]) -> Module:
+        m = Module()
+        grant = Signal(range(len(self.masters)), reset=0)
+        cyc = Array(master.cyc for master in self.masters)
+        with m.If(~cyc[grant]):
+            # Lowest index wins
+            for i, master in reversed(list(enumerate(self.masters))):
+                with m.If(master.cyc):
+                    m.d.sync += grant.eq(i)
+        for i, master in enumerate(self.masters):
+            with m.If(grant == i):
+                m.d.comb += [
+                    self.wbus.adr.eq(master.adr),
+                    self.wbus.dat_w.eq(master.dat_w),
+                    self.wbus.sel.eq(master.sel),
+                    self.wbus.cyc.eq(master.cyc),
+                    self.wbus.stb.eq(master.stb),
+                    self.wbus.we.eq(master.we),
+                    self.wbus.cti.eq(master.cti),
+                    self.wbus.bte.eq(master.bte),
+                    master.dat_r.eq(self.wbus.dat_r),
+                    master.ack.eq(self.wbus.ack),
+                    master.err.eq(self.wbus.err),
+                ]
+        return m
+
+
 class DualPortBRAM(Elaboratable):
 
     def __init__(self, *,
@@ -202,7 +251,7 @@ class WishboneRegisters(Elaboratable):
         assert reg.size in (4,)  # TODO: 1, 2
         assert reg.start % reg.size == 0
         for other in self.registers:
-            assert reg.name != reg.name
+            assert reg.name != other.name
             assert reg.start + reg.size <= self.size
             before = reg.start + reg.size <= other.start
             after = other.start + other.size <= reg.start
@@ -269,13 +318,198 @@ class SevenSegmentDisplay(Elaboratable):
         return m
 
 
+class PWMOutputs(Elaboratable):
+    """Register front-end for a bank of PWM outputs.
+
+    Each 32-bit register holds the duty cycles of 32 // width consecutive
+    channels, with the lowest-numbered channel in the least significant bits.
+    """
+
+    def __init__(self, outputs: Signal, width: int = 8, stagger: bool = True):
+        super().__init__()
+        assert 32 % width == 0
+        self.outputs = outputs
+        self.width = width
+        self.stagger = stagger
+        self.wbus = Record(wishbone.wishbone_layout)
+
+    def elaborate(self, _: Optional[Platform]) -> Module:
+        m = Module()
+        per_reg = 32 // self.width
+        nregs = (self.outputs.width + per_reg - 1) // per_reg
+        m.submodules.regs = regs = WishboneRegisters(
+            size=0x100,
+            regs=[(f'duty{i}', 4 * i, 4, 0x0000_0000) for i in range(nregs)])
+        m.d.comb += self.wbus.connect(regs.wbus)
+        duty_cycles = [
+            getattr(regs, f'duty{i // per_reg}').word_select(
+                i % per_reg, self.width)
+            for i in range(self.outputs.width)
+        ]
+        m.submodules.pwm = bank = pwm.PWMBank(
+            [Signal(self.width, name=f'duty_cycle{i}')
+             for i in range(self.outputs.width)],
+            stagger=self.stagger)
+        for signal, duty_cycle in zip(bank.duty_cycles, duty_cycles):
+            m.d.comb += signal.eq(duty_cycle)
+        m.d.comb += self.outputs.eq(bank.outputs)
+        return m
+
+
+class OLEDDisplay(Elaboratable):
+    """Register front-end for a Pmod OLED.
+
+    Register map (byte offsets):
+
+      0x000 CTRL     bit 0: power the display up (1) or down (0)
+      0x004 STATUS   bits 1:0: pmod_oled.PowerStatus (read-only)
+      0x008 COMMAND  bits 7:0: SSD1306 command byte to queue; bit 8: more
+                     bytes of the same command follow (write-only)
+      0x200-0x3FF    framebuffer, in GDDRAM order (write-only)
+
+    Queued commands are sent between the windows of the framebuffer refresh,
+    which runs at frame_rate in Hz and sets up its own addressing for each
+    window. The bytes of a multi-byte command are kept together by setting
+    bit 8 on all but the last. Writes to COMMAND stall while the command FIFO
+    is full. Each word written to the framebuffer takes one cycle per byte
+    lane, and the changed columns are sent in the next frame. Commands are
+    only sent, and the framebuffer only refreshed, while the display is READY.
+    """
+
+    SIZE = 0x400
+
+    def __init__(self, pins: pmod_oled.PmodPins,
+                 frame_rate: float = 60, cmd_fifo_depth: int = 16,
+                 sim_logic_wait_us: Optional[float] = None,
+                 sim_vcc_wait_us: Optional[float] = None):
+        super().__init__()
+        self.pins = pins
+        self.frame_rate = frame_rate
+        self.cmd_fifo_depth = cmd_fifo_depth
+        self.wbus = Record(wishbone.wishbone_layout)
+        self._sim_logic_wait_us = sim_logic_wait_us
+        self._sim_vcc_wait_us = sim_vcc_wait_us
+
+    def elaborate(self, _: Optional[Platform]) -> Module:
+        m = Module()
+        # The power sequencer and the refresh logic each get their own
+        # controller, and the pins are handed over once the display is ready
+        power_bus = ssd1306.Bus(
+            dc=Signal(), cs_n=Signal(reset=1), clk=Signal(), mosi=Signal())
+        stream_bus = ssd1306.Bus(
+            dc=Signal(), cs_n=Signal(reset=1), clk=Signal(), mosi=Signal())
+        m.submodules.controller = controller = ssd1306.Controller(
+            power_bus, max_data_bytes=0)
+        m.submodules.stream = stream = ssd1306.StreamController(stream_bus)
+        m.submodules.sequencer = sequencer = pmod_oled.PowerSequencer(
+            self.pins, controller.interface,
+            sim_logic_wait_us=self._sim_logic_wait_us,
+            sim_vcc_wait_us=self._sim_vcc_wait_us)
+        ready = sequencer.status == pmod_oled.PowerStatus.READY
+        with m.If(ready):
+            m.d.comb += self.pins.ControllerBus().eq(stream_bus)
+        with m.Else():
+            m.d.comb += self.pins.ControllerBus().eq(power_bus)
+
+        # Share the stream between the framebuffer and the command FIFO. Each
+        # keeps it until the end of the window or command it has started.
+        fb_stream = ssd1306.StreamController.Interface()
+        m.submodules.framebuffer = fb = framebuffer.Framebuffer(
+            fb_stream, frame_rate=self.frame_rate, partial_refresh=True)
+        m.d.comb += fb.enable.eq(ready)
+        cmd_stream = ssd1306.StreamController.Interface()
+        m.submodules.cmd_fifo = cmd_fifo = SyncFIFOBuffered(
+            width=9, depth=self.cmd_fifo_depth)
+        m.d.comb += [
+            cmd_stream.data.eq(cmd_fifo.r_data[:8]),
+            cmd_stream.dc.eq(0),
+            cmd_stream.last.eq(~cmd_fifo.r_data[8]),
+            cmd_stream.valid.eq(cmd_fifo.r_rdy),
+            cmd_fifo.r_en.eq(cmd_stream.ready),
+        ]
+        in_window = Signal(reset=0)
+        in_command = Signal(reset=0)
+        with m.If(fb_stream.valid & fb_stream.ready):
+            m.d.sync += in_window.eq(~fb_stream.last)
+        with m.If(cmd_stream.valid & cmd_stream.ready):
+            m.d.sync += in_command.eq(~cmd_stream.last)
+        with m.If(in_command | (~in_window & ready & cmd_stream.valid)):
+            m.d.comb += stream.interface.connect(cmd_stream)
+        with m.Else():
+            m.d.comb += stream.interface.connect(fb_stream)
+
+        # Wishbone registers
+        ctrl = Signal(32, reset=0)
+        m.d.comb += sequencer.enable.eq(ctrl[0])
+        strobe = self.wbus.cyc & self.wbus.stb & ~self.wbus.ack
+        offset = self.wbus.adr[:log2_int(self.SIZE) - 2]
+        in_framebuffer = offset >= 0x200 >> 2
+        lane = Signal(2, reset=0)
+        m.d.sync += self.wbus.ack.eq(0)  # default
+        m.d.sync += self.wbus.err.eq(0)  # default
+        m.d.sync += self.wbus.dat_r.eq(0)  # default
+        with m.If(strobe & ~self.wbus.err):
+            with m.If(in_framebuffer):
+                with m.If(self.wbus.we):
+                    # Write the selected byte lanes one at a time
+                    m.d.comb += [
+                        fb.write_addr.eq(Cat(lane, offset[:-1])),
+                        fb.write_data.eq(self.wbus.dat_w.word_select(lane, 8)),
+                        fb.write_en.eq(self.wbus.sel.bit_select(lane, 1)),
+                    ]
+                    m.d.sync += lane.eq(lane + 1)
+                    with m.If(lane == 3):
+                        m.d.sync += self.wbus.ack.eq(1)
+                with m.Else():
+                    m.d.sync += self.wbus.err.eq(1)
+            with m.Elif(offset == 0x000 >> 2):
+                with m.If(self.wbus.we):
+                    wmask = Cat(*(Repl(self.wbus.sel[i], 8) for i in range(4)))
+                    m.d.sync += ctrl.eq(
+                        (ctrl & ~wmask) | (self.wbus.dat_w & wmask))
+                m.d.sync += self.wbus.dat_r.eq(ctrl)
+                m.d.sync += self.wbus.ack.eq(1)
+            with m.Elif(offset == 0x004 >> 2):
+                with m.If(self.wbus.we):
+                    m.d.sync += self.wbus.err.eq(1)
+                with m.Else():
+                    m.d.sync += self.wbus.dat_r.eq(sequencer.status)
+                    m.d.sync += self.wbus.ack.eq(1)
+            with m.Elif(offset == 0x008 >> 2):
+                with m.If(~self.wbus.we):
+                    m.d.sync += self.wbus.err.eq(1)
+                with m.Elif(cmd_fifo.w_rdy):
+                    m.d.comb += cmd_fifo.w_data.eq(self.wbus.dat_w[:9])
+                    m.d.comb += cmd_fifo.w_en.eq(1)
+                    m.d.sync += self.wbus.ack.eq(1)
+            with m.Else():
+                m.d.sync += self.wbus.err.eq(1)
+        return m
+
+
 class Peripherals(Elaboratable):
+    """Memory map for the RISC-V demo.
+
+    If a flash bus is given, the upper half of the 16 MiB configuration flash
+    is mapped read-only at FLASH_BASE on both the instruction and data buses,
+    so that firmware can execute in place from there. If Pmod OLED pins are
+    given, an OLEDDisplay is mapped at OLED_BASE on the data bus.
+    """
 
-    def __init__(self, rom_file: str):
+    FLASH_BASE = 0x1000_0000
+    FLASH_SIZE = 8 * 1024 * 1024
+    FLASH_OFFSET = 8 * 1024 * 1024
+    OLED_BASE = 0x0000_2400
+
+    def __init__(self, rom_file: str, flash: Optional[spi.QuadBus] = None,
+                 oled: Optional[pmod_oled.PmodPins] = None):
         super().__init__()
         self.rom_file = rom_file
+        self.flash = flash
+        self.oled = oled
         self.segments = Signal(8)
         self.anodes = Signal(8)
+        self.leds = Signal(16)
         self.ibus = Record(wishbone.wishbone_layout)
         self.dbus = Record(wishbone.wishbone_layout)
 
@@ -291,12 +525,32 @@ class Peripherals(Elaboratable):
         m.d.comb += self.segments.eq(bank.segments)
         m.d.comb += self.anodes.eq(bank.anodes)
         m.submodules.sseg = sseg = SevenSegmentDisplay(bank)
+        # Set up the LED peripheral
+        m.submodules.leds = leds = PWMOutputs(self.leds)
         # Connect peripherals to the instruction and data buses
-        m.d.comb += self.ibus.connect(rom.abus)
         m.submodules.dmux = dmux = WishboneMux((
             ('rom', 0x00000000, 4 * 1024, rom.bbus),
             ('ram', 0x00001000, 4 * 1024, ram.abus),
             ('sseg', 0x00002000, 0x100, sseg.wbus),
+            ('leds', 0x00002100, 0x100, leds.wbus),
         ))
         m.d.comb += self.dbus.connect(dmux.wbus)
+        if self.oled is not None:
+            m.submodules.oled = oled = OLEDDisplay(self.oled)
+            dmux.add_port(('oled', self.OLED_BASE, OLEDDisplay.SIZE, oled.wbus))
+        if self.flash is None:
+            m.d.comb += self.ibus.connect(rom.abus)
+            return m
+        # Set up the execute-in-place flash peripheral
+        m.submodules.flash = flash = spi_flash.XIPCache(
+            self.flash, size=self.FLASH_SIZE, flash_offset=self.FLASH_OFFSET)
+        m.submodules.flash_arbiter = arbiter = WishboneArbiter(2)
+        m.d.comb += arbiter.wbus.connect(flash.wbus)
+        m.submodules.imux = imux = WishboneMux((
+            ('rom', 0x00000000, 4 * 1024, rom.abus),
+            ('flash', self.FLASH_BASE, self.FLASH_SIZE, arbiter.masters[0]),
+        ))
+        m.d.comb += self.ibus.connect(imux.wbus)
+        dmux.add_port(
+            ('flash', self.FLASH_BASE, self.FLASH_SIZE, arbiter.masters[1]))
         return m
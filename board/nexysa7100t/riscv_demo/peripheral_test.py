@@ -1,5 +1,5 @@
 import os
-from typing import List, NamedTuple
+from typing import List, NamedTuple, Tuple
 import unittest
 
 from minerva import core
@@ -10,6 +10,7 @@ from rules_python.python.runfiles import runfiles
 
 from nmigen_nexys.board.nexysa7100t.riscv_demo import peripheral
 from nmigen_nexys.core import util
+from nmigen_nexys.pmod.oled import pmod_oled
 from nmigen_nexys.test import event
 from nmigen_nexys.test import test_util
 
@@ -116,5 +117,85 @@ class PeripheralTest(unittest.TestCase):
         ])
 
 
+class OLEDDisplayTest(unittest.TestCase):
+
+    def test_commands_and_pixels(self):
+        m = Module()
+        pins = pmod_oled.PmodPins()
+        m.submodules.oled = oled = peripheral.OLEDDisplay(
+            pins, frame_rate=util.SIMULATION_CLOCK_FREQUENCY / 100_000,
+            sim_logic_wait_us=0.1, sim_vcc_wait_us=1)
+        m.submodules.timer = timer = test_util.Timer(self, timeout_s=2e-3)
+        sim = Simulator(m)
+        sim.add_clock(1.0 / util.SIMULATION_CLOCK_FREQUENCY)
+        wbus = oled.wbus
+        sent: List[Tuple[int, int]] = []
+
+        def Transfer(adr: int, we: int, dat_w: int = 0, sel: int = 0b1111):
+            yield wbus.adr.eq(adr >> 2)
+            yield wbus.we.eq(we)
+            yield wbus.dat_w.eq(dat_w)
+            yield wbus.sel.eq(sel)
+            yield wbus.cyc.eq(1)
+            yield wbus.stb.eq(1)
+            yield
+            while not ((yield wbus.ack) or (yield wbus.err)):
+                yield
+            result = (yield wbus.err), (yield wbus.dat_r)
+            yield wbus.cyc.eq(0)
+            yield wbus.stb.eq(0)
+            yield
+            return result
+
+        def Sent(*chunks: Tuple[int, bytes]) -> bool:
+            pattern = [(dc, b) for dc, data in chunks for b in data]
+            return any(sent[i:i + len(pattern)] == pattern
+                       for i in range(len(sent)))
+
+        def firmware():
+            self.assertEqual((yield from Transfer(0x000, 1, 1)), (0, 0))
+            while True:
+                err, status = yield from Transfer(0x004, 0)
+                self.assertEqual(err, 0)
+                if status == pmod_oled.PowerStatus.READY:
+                    break
+            # Set the contrast and blit the top left corner
+            self.assertEqual((yield from Transfer(0x008, 1, 0x181)), (0, 0))
+            self.assertEqual((yield from Transfer(0x008, 1, 0x07F)), (0, 0))
+            yield from Transfer(0x200, 1, 0x0403_0201)
+            yield from Transfer(0x280, 1, 0xA5A5_A5A5, sel=0b0100)
+            # Read-only and write-only registers
+            self.assertEqual((yield from Transfer(0x004, 1, 0))[0], 1)
+            self.assertEqual((yield from Transfer(0x008, 0))[0], 1)
+            self.assertEqual((yield from Transfer(0x200, 0))[0], 1)
+            # Each page is sent in its own window
+            while not (Sent((0, b'\x81\x7F')) and
+                       Sent((0, b'\x22\x00\x00'),
+                            (1, b'\x01\x02\x03\x04')) and
+                       Sent((0, b'\x22\x01\x01'), (1, b'\x00\x00\xA5'))):
+                yield
+
+        def spi_monitor():
+            yield Passive()
+            bits = []
+            clk = 0
+            while True:
+                prev, clk = clk, (yield pins.sclk)
+                if (yield pins.cs):
+                    bits = []
+                elif clk and not prev:
+                    bits.append((yield pins.mosi))
+                    if len(bits) == 8:
+                        sent.append(((yield pins.dc),
+                                     int(''.join(map(str, bits)), 2)))
+                        bits = []
+                yield
+
+        sim.add_sync_process(firmware)
+        sim.add_sync_process(spi_monitor)
+        sim.add_sync_process(timer.timeout_process)
+        sim.run()
+
+
 if __name__ == '__main__':
     unittest.main()
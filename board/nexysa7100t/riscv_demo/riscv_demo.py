@@ -8,6 +8,43 @@ from nmigen_nexys.bazel import top
 from nmigen_nexys.board.nexysa7100t import nexysa7100t
 from nmigen_nexys.board.nexysa7100t.riscv_demo import peripheral
 from nmigen_nexys.debug import remote_bitbang
+from nmigen_nexys.pmod.oled import pmod_oled
+from nmigen_nexys.serial import spi
+from nmigen_nexys.vendor.xilinx import primitive
+
+
+# The configuration flash clock is the dedicated CCLK pin, which is only
+# reachable through STARTUPE2. Each data line gets its own output enable.
+FLASH_RESOURCE = Resource(
+    'flash_qspi', 0,
+    Subsignal('cs_n', Pins('L13', dir='o')),
+    *[Subsignal(f'dq{i}', Pins(pin, dir='io'))
+      for i, pin in enumerate(['K17', 'K18', 'L14', 'M14'])],
+    Attrs(IOSTANDARD='LVCMOS33'))
+
+
+def ConnectFlash(m: Module, platform: Platform) -> spi.QuadBus:
+    """Connect a quad SPI bus to the configuration flash."""
+    platform.add_resources([FLASH_RESOURCE])
+    pins = platform.request('flash_qspi', 0)
+    bus = spi.QuadBus(
+        cs_n=Signal(reset=1),
+        clk=Signal(),
+        dq_o=Signal(4),
+        dq_oe=Signal(4),
+        dq_i=Signal(4),
+        freq_Hz=50_000_000)
+    m.submodules.startup = startup = primitive.StartupE2()
+    m.d.comb += startup.usrcclko.eq(bus.clk)
+    m.d.comb += pins.cs_n.eq(bus.cs_n)
+    for i in range(4):
+        dq = getattr(pins, f'dq{i}')
+        m.d.comb += [
+            dq.o.eq(bus.dq_o[i]),
+            dq.oe.eq(bus.dq_oe[i]),
+            bus.dq_i[i].eq(dq.i),
+        ]
+    return bus
 
 
 class RiscvDemo(Elaboratable):
@@ -34,17 +71,27 @@ class RiscvDemo(Elaboratable):
         ]
         # Connect peripherals to the CPU and external world
         r = runfiles.Create()
+        # The Pmod OLED is expected in JC
+        oled = pmod_oled.PmodPins()
+        m.d.comb += platform.request('pmod_oled', 0).eq(oled)
         m.submodules.periph = periph = peripheral.Peripherals(r.Rlocation(
-            'nmigen_nexys/board/nexysa7100t/riscv_demo/main.bin'))
+            'nmigen_nexys/board/nexysa7100t/riscv_demo/main.bin'),
+            flash=ConnectFlash(m, platform), oled=oled)
         m.d.comb += platform.request('display_7seg').eq(periph.segments)
         m.d.comb += platform.request('display_7seg_an').eq(periph.anodes)
+        leds = Cat(*[platform.request('led', i) for i in range(16)])
+        m.d.comb += leds.eq(periph.leds)
         m.d.comb += cpu.ibus.connect(periph.ibus)
         m.d.comb += cpu.dbus.connect(periph.dbus)
         return m
 
 
 def main(_):
-    top.build(nexysa7100t.NexysA7100TPlatform(), RiscvDemo())
+    platform = nexysa7100t.NexysA7100TPlatform()
+    platform.add_resources([
+        pmod_oled.PmodOLEDResource(0, conn=('pmod', 2)),
+    ])
+    top.build(platform, RiscvDemo())
 
 if __name__ == "__main__":
     app.run(main)
@@ -1,6 +1,7 @@
 from typing import Optional
 
 from absl import app
+from absl import flags
 from nmigen import *
 from nmigen.build import *
 from nmigen.lib.cdc import FFSynchronizer
@@ -10,6 +11,12 @@ from nmigen_nexys.bazel import top
 from nmigen_nexys.board.nexysa7100t import nexysa7100t
 from nmigen_nexys.math import delta_sigma
 
+flags.DEFINE_integer('delta_sigma_order', 2,
+                     'Order of the delta-sigma modulator driving the audio out',
+                     lower_bound=1, upper_bound=4)
+
+FLAGS = flags.FLAGS
+
 
 class SynthDemoDriver(Elaboratable):
 
@@ -22,7 +29,12 @@ class SynthDemoDriver(Elaboratable):
         m.submodules.rx_sync = FFSynchronizer(rx, demo.rx)
         audio = platform.request('audio', 0)
         # Pulse-density modulated output processed by on-board LPF
-        m.submodules.pdm = pdm = delta_sigma.Modulator(demo.pcm_output.width)
+        if FLAGS.delta_sigma_order == 1:
+            pdm = delta_sigma.Modulator(demo.pcm_output.width)
+        else:
+            pdm = delta_sigma.HigherOrderModulator(
+                demo.pcm_output.width, order=FLAGS.delta_sigma_order)
+        m.submodules.pdm = pdm
         m.d.comb += pdm.input.eq(demo.pcm_output)
         m.d.comb += audio.pwm.eq(pdm.output)
         m.d.comb += audio.sd.eq(0)  # No shutdown
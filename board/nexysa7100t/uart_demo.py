@@ -19,7 +19,13 @@ FLAGS = flags.FLAGS
 
 
 class ASCIIRenderer(Elaboratable):
-    """Response rendering pipeline."""
+    """Streaming response renderer.
+
+    Each character accepted on the input stream is expanded into the bytes of
+    TEMPLATE on the output stream. The next character is accepted on the same
+    cycle as the last byte of the previous response, so back-to-back responses
+    are rendered without gaps.
+    """
 
     TEMPLATE = b"'X' = 0xXX\r\n"
 
@@ -29,18 +35,29 @@ class ASCIIRenderer(Elaboratable):
     def __init__(self):
         super().__init__()
         self.input = Signal(8)
-        self.output = [Signal(8) for _ in range(len(self.TEMPLATE))]
-        self.start = Signal()
-        self.done = Signal(reset=0)
+        self.input_valid = Signal()
+        self.input_ready = Signal()
+        self.output = Signal(8)
+        self.output_valid = Signal(reset=0)
+        self.output_ready = Signal()
 
     def elaborate(self, _: Platform) -> Module:
         m = Module()
-        m.d.comb += self.done.eq(self.start)
-        for out, template in zip(self.output, self.TEMPLATE):
-            m.d.comb += out.eq(template)
-        m.d.comb += self.output[1].eq(self.input)
-        m.d.comb += self.output[8].eq(self._hexdigit(self.input[4:8]))
-        m.d.comb += self.output[9].eq(self._hexdigit(self.input[0:4]))
+        char = Signal(8)
+        index = Signal(range(len(self.TEMPLATE)), reset=0)
+        rendered = [C(template, 8) for template in self.TEMPLATE]
+        rendered[1] = char
+        rendered[8] = self._hexdigit(char[4:8])
+        rendered[9] = self._hexdigit(char[0:4])
+        m.d.comb += self.output.eq(Array(rendered)[index])
+        last = index == len(self.TEMPLATE) - 1
+        sent = self.output_valid & self.output_ready
+        m.d.comb += self.input_ready.eq(~self.output_valid | (sent & last))
+        with m.If(sent):
+            m.d.sync += index.eq(Mux(last, 0, index + 1))
+        with m.If(self.input_ready):
+            m.d.sync += char.eq(self.input)
+            m.d.sync += self.output_valid.eq(self.input_valid)
         return m
 
 
@@ -53,49 +70,40 @@ class UARTDemo(Elaboratable):
 
         'A' = 0x41
 
-    Input buffering is currently not implemented, so immediately consecutive
-    characters are likely to be dropped.
+    Input is queued in an RX FIFO, rendered as a stream, and sent through a TX
+    FIFO at the full line rate. Since each response is twelve times longer than
+    its input, a continuous input stream is absorbed without drops up to
+    rx_fifo_depth characters.
     """
 
-    def __init__(self, pins: Record):
+    def __init__(self, pins: Record, rx_fifo_depth: int = 512,
+                 tx_fifo_depth: int = 16):
         super().__init__()
         self.pins = pins
+        self.rx_fifo_depth = rx_fifo_depth
+        self.tx_fifo_depth = tx_fifo_depth
 
     def elaborate(self, _: Platform) -> Module:
         m = Module()
         m.d.comb += self.pins.cts.eq(self.pins.rts)
 
         baud_rate = 12_000_000
-        m.submodules.tx = tx = uart.Transmit(baud_rate)
-        m.submodules.rx = rx = uart.Receive(baud_rate)
+        m.submodules.tx = tx = uart.StreamTransmit(
+            baud_rate, fifo_depth=self.tx_fifo_depth)
+        m.submodules.rx = rx = uart.StreamReceive(
+            baud_rate, fifo_depth=self.rx_fifo_depth)
         m.d.comb += self.pins.tx.eq(tx.output)
         m.d.comb += rx.input.eq(self.pins.rx)
 
         m.submodules.render = render = ASCIIRenderer()
-        output = Signal(8 * len(render.output))
-        m.d.comb += tx.data.eq(output[0:8])
-
-        m.d.sync += render.start.eq(0)  # default
-        m.d.sync += tx.start.eq(0)  # default
-        with m.FSM(reset='IDLE'):
-            with m.State('IDLE'):
-                # TODO: This will drop input until the last transmission is done
-                with m.If(rx.done):
-                    m.d.sync += render.input.eq(rx.data)
-                    m.d.sync += render.start.eq(1)
-                    m.next = 'RENDER'
-            with m.State('RENDER'):
-                with m.If(render.done):
-                    m.d.sync += output.eq(Cat(*render.output))
-                    m.d.sync += tx.start.eq(1)
-                    m.next = 'TRANSMIT'
-            with m.State('TRANSMIT'):
-                with m.If(tx.done):
-                    with m.If(output[8:24].any()):
-                        m.d.sync += output.eq(output >> 8)
-                        m.d.sync += tx.start.eq(1)
-                    with m.Else():
-                        m.next = 'IDLE'
+        m.d.comb += [
+            render.input.eq(rx.data),
+            render.input_valid.eq(rx.valid),
+            rx.ready.eq(render.input_ready),
+            tx.data.eq(render.output),
+            tx.valid.eq(render.output_valid),
+            render.output_ready.eq(tx.ready),
+        ]
         return m
 
 
@@ -89,5 +89,57 @@ class UARTDemoTest(unittest.TestCase):
         self._run_test('a', b"'a' = 0x61\r\n")
 
 
+class UARTDemoStreamTest(unittest.TestCase):
+    """Send a contiguous burst of input and check for drops and gaps."""
+
+    MESSAGE = b'Hello, world!\t\0'
+
+    def test_stream(self):
+        m = Module()
+        pins = Record(Layout([
+            ('rx', 1, Direction.FANIN),
+            ('tx', 1, Direction.FANOUT),
+            ('rts', 1, Direction.FANOUT),
+            ('cts', 1, Direction.FANIN),
+        ]))
+        m.submodules.tx = tx = uart.StreamTransmit(12_000_000)
+        m.submodules.rx = rx = uart.StreamReceive(12_000_000)
+        m.submodules.demo = uart_demo.UARTDemo(pins)
+        m.d.comb += pins.rx.eq(tx.output)
+        m.d.comb += rx.input.eq(pins.tx)
+        expected = b''.join(
+            b"'" + bytes([c]) + f"' = 0x{c:02X}\r\n".encode()
+            for c in self.MESSAGE)
+        m.submodules.timer = timer = test_util.Timer(
+            self, timeout_s=len(expected) * 1e-6)
+        sim = Simulator(m)
+        sim.add_clock(1.0 / util.SIMULATION_CLOCK_FREQUENCY)
+        received = []
+        cycles = []
+
+        def transmit():
+            yield Passive()
+            yield from test_util.StreamWrite(tx, self.MESSAGE)
+
+        def receive():
+            received.extend(
+                (yield from test_util.StreamRead(rx, len(expected))))
+            cycles.append((yield timer.cycle_counter))
+
+        sim.add_sync_process(transmit)
+        sim.add_sync_process(receive)
+        sim.add_sync_process(timer.timeout_process)
+        test_dir = test_util.BazelTestOutput(self.id())
+        os.makedirs(test_dir, exist_ok=True)
+        with sim.write_vcd(os.path.join(test_dir, "test.vcd"),
+                           os.path.join(test_dir, "test.gtkw"),
+                           traces=[tx.output, rx.input]):
+            sim.run()
+        self.assertEqual(bytes(received), expected)
+        # After the first input character, the response line never idles
+        cycles_per_frame = 10 * util.SIMULATION_CLOCK_FREQUENCY / 12_000_000
+        self.assertLess(cycles[0], (len(expected) + 3) * cycles_per_frame)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,5 +1,7 @@
 """Common tools for pulse-width modulation (PWM)."""
 
+from typing import List
+
 from nmigen import *
 from nmigen.build import *
 
@@ -9,19 +11,82 @@ class PWM(Elaboratable):
 
     The period of the PWM output is ``2**duty_cycle.width`` cycles. The strobe
     signal strobes at the beginning of the PWM cycle.
+
+    If dither_bits is non-zero, the period is instead shortened to
+    ``2**(duty_cycle.width - dither_bits)`` cycles. The high bits of the duty
+    cycle set the base pulse width, and the low dither_bits bits are fed to a
+    first-order delta-sigma modulator that lengthens the pulse by one cycle in
+    the appropriate fraction of periods. The average duty cycle over
+    ``2**dither_bits`` periods is the same as without dithering, but the output
+    refreshes much faster, which avoids visible flicker at high resolutions.
+    The strobe signal strobes at the beginning of each shortened period.
     """
 
-    def __init__(self, duty_cycle: Signal):
+    def __init__(self, duty_cycle: Signal, dither_bits: int = 0):
         super().__init__()
+        assert 0 <= dither_bits < duty_cycle.width
         self.duty_cycle = duty_cycle
+        self.dither_bits = dither_bits
         self.strobe = Signal()
         self.output = Signal()
 
     def elaborate(self, _: Platform) -> Module:
         m = Module()
-        counter = Signal(self.duty_cycle.width, reset=0)
+        counter = Signal(self.duty_cycle.width - self.dither_bits, reset=0)
         m.d.sync += counter.eq(counter + 1)
         m.d.comb += self.strobe.eq(counter ==
                                    C(2**counter.width - 1, counter.width))
-        m.d.comb += self.output.eq(counter < self.duty_cycle)
+        if not self.dither_bits:
+            m.d.comb += self.output.eq(counter < self.duty_cycle)
+            return m
+        coarse = self.duty_cycle[self.dither_bits:]
+        fine = self.duty_cycle[:self.dither_bits]
+        # Accumulate the fine duty cycle once per period. The carry out of the
+        # accumulator extends the next pulse by one cycle.
+        accumulator = Signal(self.dither_bits, reset=0)
+        carry = Signal(reset=0)
+        with m.If(self.strobe):
+            m.d.sync += Cat(accumulator, carry).eq(accumulator + fine)
+        pulse_width = Signal(counter.width + 1)
+        m.d.comb += pulse_width.eq(coarse + carry)
+        m.d.comb += self.output.eq(counter < pulse_width)
+        return m
+
+
+class PWMBank(Elaboratable):
+    """Multi-channel PWM sharing a single counter.
+
+    Each channel has its own duty cycle and comparator, but all channels share
+    one counter and therefore one period of ``2**width`` cycles, where width is
+    the common width of the duty cycle signals. The strobe signal strobes at the
+    beginning of the PWM cycle, as for PWM.
+
+    If stagger is set, the start of each channel's cycle is offset by an equal
+    fraction of the period. This keeps the rising edges of the channels from
+    coinciding, which spreads out the current spikes from switching many loads
+    at once. The duty cycle of each channel is unaffected.
+    """
+
+    def __init__(self, duty_cycles: List[Signal], stagger: bool = False):
+        super().__init__()
+        assert len(duty_cycles) != 0
+        self.width = duty_cycles[0].width
+        assert all(d.width == self.width for d in duty_cycles)
+        self.duty_cycles = duty_cycles
+        self.stagger = stagger
+        self.strobe = Signal()
+        self.outputs = Signal(len(duty_cycles))
+
+    def elaborate(self, _: Platform) -> Module:
+        m = Module()
+        counter = Signal(self.width, reset=0)
+        m.d.sync += counter.eq(counter + 1)
+        m.d.comb += self.strobe.eq(counter == C(2**self.width - 1, self.width))
+        n = len(self.duty_cycles)
+        for i, duty_cycle in enumerate(self.duty_cycles):
+            offset = (i * 2**self.width) // n if self.stagger else 0
+            # Subtraction wraps around modulo the period
+            phase = Signal(self.width, name=f'phase{i}')
+            m.d.comb += phase.eq(counter - offset)
+            m.d.comb += self.outputs[i].eq(phase < duty_cycle)
         return m
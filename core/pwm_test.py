@@ -0,0 +1,90 @@
+"""Tests for nmigen_nexys.core.pwm."""
+
+from typing import List
+import unittest
+
+from nmigen import *
+from nmigen.sim import *
+
+from nmigen_nexys.core import pwm
+from nmigen_nexys.core import util
+from nmigen_nexys.test import test_util
+
+
+class PWMBankTest(unittest.TestCase):
+    """Check the duty cycle and phase of each channel over one period."""
+
+    def _run_test(self, duty_cycles: List[int], stagger: bool) -> List[int]:
+        m = Module()
+        m.submodules.bank = bank = pwm.PWMBank(
+            [Signal(4) for _ in duty_cycles], stagger=stagger)
+        for signal, duty_cycle in zip(bank.duty_cycles, duty_cycles):
+            m.d.comb += signal.eq(duty_cycle)
+        sim = Simulator(m)
+        sim.add_clock(1.0 / util.SIMULATION_CLOCK_FREQUENCY)
+        waveforms = [[] for _ in duty_cycles]
+
+        def process():
+            # Skip to the beginning of a PWM cycle
+            yield from test_util.WaitSync(bank.strobe)
+            yield
+            for _ in range(16):
+                for i, waveform in enumerate(waveforms):
+                    waveform.append((yield bank.outputs[i]))
+                yield
+
+        sim.add_sync_process(process)
+        sim.run()
+        for waveform, duty_cycle in zip(waveforms, duty_cycles):
+            self.assertEqual(sum(waveform), duty_cycle)
+        return [w.index(1) if 1 in w else None for w in waveforms]
+
+    def test_aligned(self):
+        rising = self._run_test([0, 1, 5, 15], stagger=False)
+        self.assertEqual(rising, [None, 0, 0, 0])
+
+    def test_staggered(self):
+        rising = self._run_test([0, 1, 5, 15], stagger=True)
+        self.assertEqual(rising, [None, 4, 8, 0])
+
+
+class DitheredPWMTest(unittest.TestCase):
+    """Check the pulse widths of a dithered PWM over a full dither cycle."""
+
+    def _run_test(self, duty_cycle: int):
+        m = Module()
+        m.submodules.pwm = dithered = pwm.PWM(Signal(6), dither_bits=2)
+        m.d.comb += dithered.duty_cycle.eq(duty_cycle)
+        sim = Simulator(m)
+        sim.add_clock(1.0 / util.SIMULATION_CLOCK_FREQUENCY)
+        pulses = []
+
+        def process():
+            # Skip to the beginning of a PWM cycle
+            yield from test_util.WaitSync(dithered.strobe)
+            yield
+            for _ in range(4):
+                pulse = 0
+                for _ in range(16):
+                    pulse += yield dithered.output
+                    yield
+                pulses.append(pulse)
+
+        sim.add_sync_process(process)
+        sim.run()
+        self.assertEqual(sum(pulses), duty_cycle)
+        for pulse in pulses:
+            self.assertIn(pulse, (duty_cycle >> 2, (duty_cycle >> 2) + 1))
+
+    def test_zero(self):
+        self._run_test(0)
+
+    def test_fraction(self):
+        self._run_test(0b010110)
+
+    def test_max(self):
+        self._run_test(0b111111)
+
+
+if __name__ == '__main__':
+    unittest.main()
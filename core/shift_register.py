@@ -1,6 +1,7 @@
 """Shift register implementations."""
 
 import abc
+from typing import Optional
 
 from nmigen import *
 from nmigen.build import *
@@ -105,3 +106,31 @@ class ArrayDown(ArrayRegister):
         with m.Elif(self.shift):
             m.d.sync += reg.eq(Cat(reg[self.width:], self.word_in))
         return m
+
+
+class Delay(Elaboratable):
+    """Serial-in, serial-out shift register.
+
+    This is equivalent to an Up register without the parallel interface:
+    strobing shift moves bit_in into the first stage, and bit_out is the bit
+    that was shifted in depth shifts ago. Without a parallel interface, it can
+    be implemented by vendor-specific shift register primitives.
+    """
+
+    def __init__(self, depth: int, reset: int = 0):
+        super().__init__()
+        assert depth >= 1
+        self.depth = depth
+        self.reset = reset
+        self.bit_in = Signal()
+        self.bit_out = Signal()
+        self.shift = Signal()
+
+    def elaborate(self, _: Optional[Platform]) -> Module:
+        m = Module()
+        reg = Signal(self.depth, reset=self.reset)
+        m.d.comb += self.bit_out.eq(reg[-1])
+        with m.If(self.shift):
+            m.d.sync += reg.eq(Cat(self.bit_in, reg[:-1]))
+        return m
+
@@ -0,0 +1,48 @@
+"""Tests for nmigen_nexys.core.shift_register."""
+
+import random
+import unittest
+
+from nmigen import *
+from nmigen.sim import *
+
+from nmigen_nexys.core import shift_register
+from nmigen_nexys.core import util
+
+
+class DelayTest(unittest.TestCase):
+
+    def _run_test(self, delay: shift_register.Delay):
+        sim = Simulator(delay)
+        sim.add_clock(1.0 / util.SIMULATION_CLOCK_FREQUENCY)
+        rng = random.Random(delay.depth)
+        initial = [(delay.reset >> i) & 1 for i in range(delay.depth)]
+
+        def process():
+            history = list(reversed(initial))
+            for _ in range(3 * delay.depth):
+                bit = rng.getrandbits(1)
+                shift = rng.getrandbits(1)
+                yield delay.bit_in.eq(bit)
+                yield delay.shift.eq(shift)
+                yield
+                if shift:
+                    history.append(bit)
+                yield Settle()
+                actual = yield delay.bit_out
+                self.assertEqual(actual, history[-delay.depth])
+
+        sim.add_sync_process(process)
+        sim.run()
+
+    def test_delay(self):
+        for depth in [1, 5, 32, 70]:
+            with self.subTest(depth=depth):
+                self._run_test(shift_register.Delay(depth))
+
+    def test_reset(self):
+        self._run_test(shift_register.Delay(12, reset=0b101100111000))
+
+
+if __name__ == '__main__':
+    unittest.main()
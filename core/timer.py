@@ -128,3 +128,37 @@ class OneShot(Elaboratable):
         with m.If(self.go):
             m.d.sync += counter.eq(1)
         return m
+
+
+class FractionalTimer(Elaboratable):
+    """Self-reloading timer with a runtime-adjustable period.
+
+    The period is an unsigned fixed-point number of cycles with fraction_bits
+    fractional bits, and must be at least one. As with UpTimer, non-integer
+    periods are realized by alternating between the neighboring integer periods
+    so that the average period is exact. Asserting reload restarts the period
+    from the following cycle. The timer triggers once immediately after reset.
+    """
+
+    def __init__(self, period: Value, fraction_bits: int):
+        super().__init__()
+        self.period = period
+        self.fraction_bits = fraction_bits
+        self.reload = Signal(reset=0)
+        self.triggered = Signal()
+        # Cycles left in the current period, in the same fixed-point format
+        self.remaining = Signal(len(period) + 1, reset=0)
+
+    def elaborate(self, _: Platform) -> Module:
+        m = Module()
+        one = 1 << self.fraction_bits
+        # Trigger on the last whole cycle of the period, carrying the
+        # fractional remainder over into the next one
+        m.d.comb += self.triggered.eq(self.remaining < 2 * one)
+        with m.If(self.reload):
+            m.d.sync += self.remaining.eq(self.period)
+        with m.Elif(self.triggered):
+            m.d.sync += self.remaining.eq(self.remaining + self.period - one)
+        with m.Else():
+            m.d.sync += self.remaining.eq(self.remaining - one)
+        return m
@@ -0,0 +1,64 @@
+"""Tests for nmigen_nexys.core.timer."""
+
+import fractions
+import unittest
+
+from nmigen import *
+from nmigen.sim import *
+
+from nmigen_nexys.core import timer as timer_module
+from nmigen_nexys.core import util
+
+
+class FractionalTimerTest(unittest.TestCase):
+
+    def _trigger_cycles(self, period: fractions.Fraction, fraction_bits: int,
+                        count: int):
+        """Cycles, relative to a reload, on which the timer triggers."""
+        m = Module()
+        period_signal = Signal(16)
+        m.submodules.timer = timer = timer_module.FractionalTimer(
+            period_signal, fraction_bits)
+        m.d.comb += period_signal.eq(int(period * 2**fraction_bits))
+        sim = Simulator(m)
+        sim.add_clock(1.0 / util.SIMULATION_CLOCK_FREQUENCY)
+        triggers = []
+
+        def process():
+            yield timer.reload.eq(1)
+            yield
+            yield timer.reload.eq(0)
+            cycle = 0
+            while len(triggers) < count:
+                cycle += 1
+                yield Settle()
+                if (yield timer.triggered):
+                    triggers.append(cycle)
+                yield
+
+        sim.add_sync_process(process)
+        sim.run()
+        return triggers
+
+    def test_integer(self):
+        self.assertEqual(self._trigger_cycles(fractions.Fraction(5), 3, 4),
+                         [5, 10, 15, 20])
+
+    def test_one(self):
+        self.assertEqual(self._trigger_cycles(fractions.Fraction(1), 3, 4),
+                         [1, 2, 3, 4])
+
+    def test_fraction(self):
+        # 25/6 is not representable, so compare against the quantized period
+        period = fractions.Fraction(int(fractions.Fraction(25, 6) * 256), 256)
+        triggers = self._trigger_cycles(period, 8, 60)
+        # Each trigger is within a cycle of the ideal time
+        for n, cycle in enumerate(triggers, start=1):
+            self.assertLess(abs(cycle - n * period), 1)
+        # Successive periods use the neighboring integers
+        self.assertEqual(
+            set(b - a for a, b in zip(triggers, triggers[1:])), {4, 5})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -126,12 +126,67 @@ class MultiplexError(Exception):
     """Logic error in the construction of NMux or Multiplex."""
 
 
-def NMux(select: Signal, signals: List[Signal]) -> Value:
-    """Multiplex arbitrarily many signals."""
+class Pipeline(typing.NamedTuple):
+    """Pipelining options for multiplexer trees.
+
+    A register is inserted in the given domain of m after every `levels` levels
+    of the tree (including the root level), shortening the critical path at the
+    cost of PipelineLatency(n, levels) cycles for a tree with n leaves.
+    """
+    m: Module
+    levels: int
+    domain: str = 'sync'
+
+    def Register(self, value: Value) -> Signal:
+        reg = Signal(value.shape(), reset=0)
+        self.m.d[self.domain] += reg.eq(value)
+        return reg
+
+
+def PipelineLatency(n: int, levels: int) -> int:
+    """Latency in cycles through a pipelined tree with n leaves."""
+    return log2_int(n, need_pow2=False) // levels
+
+
+def _PipelinedTree(nodes: List[Value],
+                   combine: typing.Callable[[Value, int, Value, Value], Value],
+                   select: Optional[Value], pipeline: Pipeline) -> Value:
+    """Reduce nodes pairwise, registering every pipeline.levels levels.
+
+    combine is called with select, the (zero-based) level number, and the low
+    and high nodes of each pair. If given, select is registered alongside the
+    nodes so that combine always sees the select that accompanies its data.
+    """
+    level = 0
+    while len(nodes) > 1:
+        pairs = [combine(select, level, low, high)
+                 for low, high in zip(nodes[0::2], nodes[1::2])]
+        if len(nodes) % 2 == 1:
+            pairs.append(nodes[-1])
+        nodes = pairs
+        level += 1
+        if level % pipeline.levels == 0:
+            nodes = [pipeline.Register(node) for node in nodes]
+            if select is not None:
+                select = pipeline.Register(select)
+    return nodes[0]
+
+
+def NMux(select: Signal, signals: List[Signal],
+         pipeline: Optional[Pipeline] = None) -> Value:
+    """Multiplex arbitrarily many signals.
+
+    If pipeline is given, the output is the signal selected
+    PipelineLatency(len(signals), pipeline.levels) cycles ago.
+    """
     if len(signals) == 0:
         raise MultiplexError('Cannot mux zero signals')
     if len(signals) == 1:
         return signals[0]
+    if pipeline is not None:
+        return _PipelinedTree(
+            signals, lambda sel, level, low, high: Mux(sel[level], high, low),
+            select, pipeline)
     nbits = log2_int(len(signals), need_pow2=False)
     midpoint = (1 << nbits) // 2
     low = signals[:midpoint]
@@ -140,20 +195,60 @@ def NMux(select: Signal, signals: List[Signal]) -> Value:
                NMux(select[:nbits - 1], low))
 
 
-def Multiplex(select: Signal, root: Record,
-              leaves: List[Record]) -> Iterable[Assign]:
+def OneHotNMux(select: Signal, signals: List[Signal],
+               pipeline: Optional[Pipeline] = None) -> Value:
+    """Multiplex arbitrarily many signals using a one-hot select.
+
+    Each signal is masked by its select bit and the results are OR-reduced, so
+    the select bits only appear at the leaves rather than along the whole depth
+    of the tree. If more than one select bit is set, the output is the bitwise
+    OR of the selected signals; if none are, it is zero.
+
+    If pipeline is given, the output is the signal selected
+    PipelineLatency(len(signals), pipeline.levels) cycles ago.
+    """
+    if len(signals) == 0:
+        raise MultiplexError('Cannot mux zero signals')
+    if len(select) != len(signals):
+        raise MultiplexError(
+            f'One-hot select has {len(select)} bits for {len(signals)} signals')
+    masked = [signal & Repl(select[i], len(signal))
+              for i, signal in enumerate(signals)]
+    if pipeline is not None:
+        return _PipelinedTree(
+            masked, lambda sel, level, low, high: low | high, None, pipeline)
+    return _OrReduce(masked)
+
+
+def _OrReduce(values: List[Value]) -> Value:
+    if len(values) == 1:
+        return values[0]
+    midpoint = len(values) // 2
+    return _OrReduce(values[:midpoint]) | _OrReduce(values[midpoint:])
+
+
+def Multiplex(select: Signal, root: Record, leaves: List[Record],
+              one_hot: bool = False,
+              pipeline: Optional[Pipeline] = None) -> Iterable[Assign]:
     """Multiplex entire objects.
 
-    Fan-in signals are multiplexed from the leaves to the root using select.
-    Fan-out signals are propagated unconditionally from the root to the leaves.
+    Fan-in signals are multiplexed from the leaves to the root using select,
+    which is one-hot if one_hot is set and binary otherwise. Fan-out signals are
+    propagated unconditionally from the root to the leaves.
+
+    If pipeline is given, the fan-in signals are delayed by
+    PipelineLatency(len(leaves), pipeline.levels) cycles but the fan-out
+    signals are not. This is suitable for interfaces that use single-cycle
+    start/done strobes.
     """
+    mux = OneHotNMux if one_hot else NMux
     for field, (shape, direction) in root.layout.fields.items():
         sub_root = getattr(root, field)
         sub_leaves = [getattr(leaf, field) for leaf in leaves]
         if isinstance(shape, Layout):
-            yield from Multiplex(select, sub_root, sub_leaves)
+            yield from Multiplex(select, sub_root, sub_leaves, one_hot, pipeline)
         elif direction == Direction.FANIN:
-            yield sub_root.eq(NMux(select, sub_leaves))
+            yield sub_root.eq(mux(select, sub_leaves, pipeline))
         elif direction == Direction.FANOUT:
             yield Cat(*sub_leaves).eq(Repl(sub_root, len(sub_leaves)))
         else:
@@ -0,0 +1,64 @@
+"""Tests for nmigen_nexys.core.util."""
+
+import itertools
+from typing import Callable, Optional
+import unittest
+
+from nmigen import *
+from nmigen.sim import *
+
+from nmigen_nexys.core import util
+
+
+class NMuxTest(unittest.TestCase):
+    """Sweep the select input and check the latency-adjusted output."""
+
+    def _run_test(self, mux: Callable, n: int, index: Callable[[int], int],
+                  levels: Optional[int]):
+        m = Module()
+        signals = [C(10 + i, 8) for i in range(n)]
+        select = Signal(len(Const(index(n - 1))), reset=index(0))
+        pipeline = util.Pipeline(m, levels) if levels is not None else None
+        # Register the output so that there is always a sync domain
+        output = Signal(8)
+        m.d.sync += output.eq(mux(select, signals, pipeline))
+        latency = 1
+        if levels is not None:
+            latency += util.PipelineLatency(n, levels)
+        sim = Simulator(m)
+        sim.add_clock(1.0 / util.SIMULATION_CLOCK_FREQUENCY)
+
+        def process():
+            history = []
+            for i in itertools.chain(range(n), reversed(range(n)), [0] * 4):
+                yield select.eq(index(i))
+                history.append(i)
+                yield Settle()
+                if len(history) > latency:
+                    actual = yield output
+                    self.assertEqual(actual, 10 + history[-1 - latency])
+                yield
+
+        sim.add_sync_process(process)
+        sim.run()
+
+    def test_binary(self):
+        for n, levels in itertools.product([1, 2, 3, 5, 8], [None, 1, 2]):
+            with self.subTest(n=n, levels=levels):
+                self._run_test(util.NMux, n, lambda i: i, levels)
+
+    def test_one_hot(self):
+        for n, levels in itertools.product([1, 2, 3, 5, 8], [None, 1, 2]):
+            with self.subTest(n=n, levels=levels):
+                self._run_test(util.OneHotNMux, n, lambda i: 1 << i, levels)
+
+    def test_latency(self):
+        self.assertEqual(util.PipelineLatency(1, 1), 0)
+        self.assertEqual(util.PipelineLatency(2, 1), 1)
+        self.assertEqual(util.PipelineLatency(5, 1), 3)
+        self.assertEqual(util.PipelineLatency(5, 2), 1)
+        self.assertEqual(util.PipelineLatency(16, 2), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
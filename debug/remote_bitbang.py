@@ -48,7 +48,7 @@ class RemoteBitbang(Elaboratable):
         # Frontend + FIFOs
         # TODO: This shouldn't need to go 8 deep, but things get flaky if I
         #   reduce it down to 2
-        m.submodules.rx = rx = uart.Receive(self.baud_rate)
+        m.submodules.rx = rx = uart.OversamplingReceive(self.baud_rate)
         m.submodules.rx_fifo = rx_fifo = SyncFIFOBuffered(width=8, depth=8)
         m.d.comb += [
             rx.input.eq(self.uart.rx),
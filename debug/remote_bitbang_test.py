@@ -117,9 +117,10 @@ class RemoteBitbagTest(unittest.TestCase):
                 yield
                 yield tx.start.eq(0)
                 yield from test_util.WaitSync(tx.done)
-            # Yield a couple more times to pick up edges
-            yield
-            yield
+            # Yield a few more times to let the receiver finish the last frame
+            # and pick up edges
+            for _ in range(8):
+                yield
 
         sim.add_sync_process(transmit)
         edge_monitor.attach(sim, events)
@@ -0,0 +1,32 @@
+"""Tests for nmigen_nexys.display.font5x7."""
+
+import unittest
+
+from nmigen_nexys.display import font5x7
+
+
+class Font5x7Test(unittest.TestCase):
+
+    def test_coverage(self):
+        self.assertEqual(len(font5x7.GLYPHS), 95)
+        for glyph in font5x7.GLYPHS:
+            self.assertEqual(len(glyph), font5x7.WIDTH)
+            # The bottom row is reserved for spacing
+            self.assertFalse(any(column & 0x80 for column in glyph))
+
+    def test_glyph(self):
+        self.assertEqual(font5x7.Glyph(' '), bytes(5))
+        self.assertEqual(font5x7.Glyph('H'), b'\x7F\x08\x08\x08\x7F')
+        self.assertEqual(font5x7.Glyph('\n'), font5x7.Glyph(' '))
+        self.assertEqual(font5x7.Glyph('\x7F'), font5x7.Glyph(' '))
+
+    def test_memory_init(self):
+        init = font5x7.MemoryInit()
+        self.assertEqual(len(init), 95 * font5x7.WIDTH)
+        offset = (ord('A') - font5x7.FIRST) * font5x7.WIDTH
+        self.assertEqual(bytes(init[offset:offset + font5x7.WIDTH]),
+                         font5x7.Glyph('A'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+"""Host-side conversion between images and SSD1306 GDDRAM byte layouts.
+
+GDDRAM is organized as pages of eight pixel rows. Each byte holds one column
+of a page, with the topmost pixel in the least significant bit. The order in
+which the bytes are written depends on the addressing mode:
+
+  HORIZONTAL, PAGE: column by column within each page, page by page
+  VERTICAL:         page by page within each column, column by column
+
+In page addressing mode, each page must additionally be selected with
+ssd1306.SetPageStartAddress before its bytes are written.
+
+Images are boolean arrays of shape (..., height, width), where any leading
+dimensions index a batch of frames. The height must be a multiple of eight.
+"""
+
+from typing import List
+
+import numpy as np
+
+from nmigen_nexys.display import ssd1306
+
+
+def Pack(images: np.ndarray,
+         mode: ssd1306.AddressingMode = ssd1306.AddressingMode.HORIZONTAL
+         ) -> np.ndarray:
+    """Convert images to GDDRAM bytes of shape (..., height * width // 8)."""
+    images = np.asarray(images, dtype=bool)
+    *batch, height, width = images.shape
+    if height % 8 != 0:
+        raise ValueError(f'Image height {height} is not a multiple of 8')
+    pages = images.reshape(*batch, height // 8, 8, width)
+    # (..., pages, width)
+    data = np.packbits(pages, axis=-2, bitorder='little').squeeze(-2)
+    if mode == ssd1306.AddressingMode.VERTICAL:
+        data = np.swapaxes(data, -1, -2)
+    return data.reshape(*batch, height * width // 8)
+
+
+def Unpack(data: np.ndarray, height: int, width: int,
+           mode: ssd1306.AddressingMode = ssd1306.AddressingMode.HORIZONTAL
+           ) -> np.ndarray:
+    """Convert GDDRAM bytes back to images of shape (..., height, width)."""
+    data = np.asarray(data, dtype=np.uint8)
+    *batch, size = data.shape
+    if height % 8 != 0:
+        raise ValueError(f'Image height {height} is not a multiple of 8')
+    if size != height * width // 8:
+        raise ValueError(
+            f'{size} bytes do not make up a {width}x{height} image')
+    if mode == ssd1306.AddressingMode.VERTICAL:
+        data = np.swapaxes(data.reshape(*batch, width, height // 8), -1, -2)
+    else:
+        data = data.reshape(*batch, height // 8, width)
+    pages = np.unpackbits(data[..., np.newaxis, :], axis=-2, bitorder='little')
+    return pages.reshape(*batch, height, width).astype(bool)
+
+
+def MemoryInit(images: np.ndarray,
+               mode: ssd1306.AddressingMode = ssd1306.AddressingMode.HORIZONTAL
+               ) -> List[int]:
+    """Pack a batch of images back to back, e.g. as a Memory's init data."""
+    return Pack(images, mode).reshape(-1).tolist()
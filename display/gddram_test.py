@@ -0,0 +1,80 @@
+"""Tests for nmigen_nexys.display.gddram."""
+
+import itertools
+import unittest
+
+import numpy as np
+
+from nmigen_nexys.display import gddram
+from nmigen_nexys.display import ssd1306
+
+
+def ReferencePack(image: np.ndarray,
+                  mode: ssd1306.AddressingMode) -> bytes:
+    """Per-pixel reference implementation for a single image."""
+    height, width = image.shape
+    pages = height // 8
+    if mode == ssd1306.AddressingMode.VERTICAL:
+        order = [(p, c) for c in range(width) for p in range(pages)]
+    else:
+        order = [(p, c) for p in range(pages) for c in range(width)]
+    data = bytearray()
+    for p, c in order:
+        byte = 0
+        for bit in range(8):
+            if image[8 * p + bit, c]:
+                byte |= 1 << bit
+        data.append(byte)
+    return bytes(data)
+
+
+class GDDRAMTest(unittest.TestCase):
+
+    def test_single_pixel(self):
+        image = np.zeros((32, 128), dtype=bool)
+        image[10, 5] = True
+        data = gddram.Pack(image)
+        self.assertEqual(np.flatnonzero(data).tolist(), [128 + 5])
+        self.assertEqual(data[128 + 5], 1 << 2)
+        data = gddram.Pack(image, ssd1306.AddressingMode.VERTICAL)
+        self.assertEqual(np.flatnonzero(data).tolist(), [5 * 4 + 1])
+
+    def test_reference(self):
+        rng = np.random.default_rng(0)
+        for mode, (height, width) in itertools.product(
+                ssd1306.AddressingMode, [(8, 1), (32, 128), (64, 128),
+                                         (16, 24)]):
+            with self.subTest(mode=mode, height=height, width=width):
+                image = rng.random((height, width)) < 0.5
+                self.assertEqual(gddram.Pack(image, mode).tobytes(),
+                                 ReferencePack(image, mode))
+
+    def test_round_trip(self):
+        rng = np.random.default_rng(1)
+        images = rng.random((3, 2, 16, 24)) < 0.5
+        for mode in ssd1306.AddressingMode:
+            with self.subTest(mode=mode):
+                data = gddram.Pack(images, mode)
+                self.assertEqual(data.shape, (3, 2, 48))
+                np.testing.assert_array_equal(
+                    gddram.Unpack(data, 16, 24, mode), images)
+
+    def test_memory_init(self):
+        rng = np.random.default_rng(2)
+        images = rng.random((4, 32, 128)) < 0.5
+        init = gddram.MemoryInit(images)
+        self.assertEqual(len(init), 4 * 512)
+        self.assertEqual(
+            bytes(init),
+            b''.join(ReferencePack(image, ssd1306.AddressingMode.HORIZONTAL)
+                     for image in images))
+
+    def test_bad_shape(self):
+        with self.assertRaises(ValueError):
+            gddram.Pack(np.zeros((12, 8), dtype=bool))
+        with self.assertRaises(ValueError):
+            gddram.Unpack(np.zeros(10, dtype=np.uint8), 16, 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
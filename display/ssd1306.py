@@ -11,9 +11,9 @@ from nmigen.build import *
 from nmigen.hdl.ast import Assign
 from nmigen.hdl.rec import Direction, Layout, Record
 
-from nmigen_nexys.core import shift_register
 from nmigen_nexys.core import util
 from nmigen_nexys.serial import spi
+from nmigen_nexys.vendor.xilinx import macro
 
 
 MAX_COMMAND_BYTES = 7
@@ -181,34 +181,40 @@ class ContinuousHorizontalScrollSetup(Command):
 # 3. Addressing setting commands
 
 
-# def SetLowerColumnStartAddress(address: int) -> Command:
-#     """Set Lower Column Start Address for Page Addressing Mode.
+class SetLowerColumnStartAddress(Command):
+    """Set Lower Column Start Address for Page Addressing Mode.
 
-#     Set the lower nibble of the column start address register for Page
-#     Addressing Mode using address as data bits. The initial display line
-#     register is reset to 0000b after RESET.
+    Set the lower nibble of the column start address register for Page
+    Addressing Mode using address as data bits. The initial display line
+    register is reset to 0000b after RESET.
 
-#     Note: This command is only for page addressing mode.
-#     """
-#     if not 0 <= address < 16:
-#         raise CommandEncodingError('SetLowerColumnStartAddress', 'address',
-#                                    address)
-#     return Command(address)
+    Note: This command is only for page addressing mode.
+    """
 
+    def __init__(self, address: int):
+        if not 0 <= address < 16:
+            raise CommandEncodingError('SetLowerColumnStartAddress', 'address',
+                                       address)
+        super().__init__(address)
+        self.address = address
 
-# def SetHigherColumnStartAddress(address: int) -> Command:
-#     """Set Higher Column Start Address for Page Addressing Mode.
 
-#     Set the higher nibble of the column start address register for Page
-#     Addressing Mode using address as data bits. The initial display line
-#     register is reset to 0000b after RESET.
+class SetHigherColumnStartAddress(Command):
+    """Set Higher Column Start Address for Page Addressing Mode.
 
-#     Note: This command is only for page addressing mode.
-#     """
-#     if not 0 <= address < 16:
-#         raise CommandEncodingError('SetLowerColumnStartAddress', 'address',
-#                                    address)
-#     return Command(0x10 | address)
+    Set the higher nibble of the column start address register for Page
+    Addressing Mode using address as data bits. The initial display line
+    register is reset to 0000b after RESET.
+
+    Note: This command is only for page addressing mode.
+    """
+
+    def __init__(self, address: int):
+        if not 0 <= address < 16:
+            raise CommandEncodingError('SetHigherColumnStartAddress',
+                                       'address', address)
+        super().__init__(0x10 | address)
+        self.address = address
 
 
 class AddressingMode(enum.IntEnum):
@@ -232,61 +238,72 @@ class SetMemoryAddressingMode(Command):
         self.mode = mode
 
 
-# def SetColumnAddress(start_address: int, end_address: int) -> Command:
-#     """Set Column Address.
+class SetColumnAddress(Command):
+    """Set Column Address.
 
-#     Setup column start and end address.
+    Setup column start and end address.
 
-#     Note: This command is only for horizontal or vertical addressing mode.
+    Note: This command is only for horizontal or vertical addressing mode.
 
-#     Args:
-#         start_address: Column start address
-#             Range: 0-127 (RESET = 0)
-#         end_address: Column end address
-#             Range: 0-127 (RESET = 127)
-#     """
-#     if not 0 <= start_address < 128:
-#         raise CommandEncodingError('SetColumnAddress', 'start_address',
-#                                    start_address)
-#     if not 0 <= end_address < 128:
-#         raise CommandEncodingError('SetColumnAddress', 'end_address',
-#                                    end_address)
-#     return Command(0x21, start_address, end_address)
+    Args:
+        start_address: Column start address
+            Range: 0-127 (RESET = 0)
+        end_address: Column end address
+            Range: 0-127 (RESET = 127)
+    """
 
+    def __init__(self, start_address: int, end_address: int):
+        if not 0 <= start_address < 128:
+            raise CommandEncodingError('SetColumnAddress', 'start_address',
+                                       start_address)
+        if not 0 <= end_address < 128:
+            raise CommandEncodingError('SetColumnAddress', 'end_address',
+                                       end_address)
+        super().__init__(0x21, start_address, end_address)
+        self.start_address = start_address
+        self.end_address = end_address
 
-# def SetPageAddress(start_address: int, end_address: int) -> Command:
-#     """Set Page Address.
 
-#     Setup page start and end address.
+class SetPageAddress(Command):
+    """Set Page Address.
 
-#     Note: This command is only for horizontal or vertical addressing mode.
+    Setup page start and end address.
 
-#     Args:
-#         start_address: Page start Address
-#             Range: 0-7 (RESET = 0)
-#         end_address: Page end Address
-#             Range: 0-7 (RESET = 7)
-#     """
-#     if not 0 <= start_address < 8:
-#         raise CommandEncodingError('SetPageAddress', 'start_address',
-#                                    start_address)
-#     if not 0 <= end_address < 8:
-#         raise CommandEncodingError(
-#             'SetPageAddress', 'end_address', end_address)
-#     return Command(0x22, start_address, end_address)
+    Note: This command is only for horizontal or vertical addressing mode.
 
+    Args:
+        start_address: Page start Address
+            Range: 0-7 (RESET = 0)
+        end_address: Page end Address
+            Range: 0-7 (RESET = 7)
+    """
 
-# def SetPageStartAddress(page: int) -> Command:
-#     """Set Page Start Address for Page Addressing Mode.
+    def __init__(self, start_address: int, end_address: int):
+        if not 0 <= start_address < 8:
+            raise CommandEncodingError('SetPageAddress', 'start_address',
+                                       start_address)
+        if not 0 <= end_address < 8:
+            raise CommandEncodingError(
+                'SetPageAddress', 'end_address', end_address)
+        super().__init__(0x22, start_address, end_address)
+        self.start_address = start_address
+        self.end_address = end_address
 
-#     Set GDDRAM Page Start Address (PAGE0~PAGE7) for Page Addressing Mode using
-#     page.
 
-#     Note: This command is only for page addressing mode.
-#     """
-#     if not 0 <= page < 8:
-#         raise CommandEncodingError('SetPageStartAddress', 'page', page)
-#     return Command(0xB0 | page)
+class SetPageStartAddress(Command):
+    """Set Page Start Address for Page Addressing Mode.
+
+    Set GDDRAM Page Start Address (PAGE0~PAGE7) for Page Addressing Mode using
+    page.
+
+    Note: This command is only for page addressing mode.
+    """
+
+    def __init__(self, page: int):
+        if not 0 <= page < 8:
+            raise CommandEncodingError('SetPageStartAddress', 'page', page)
+        super().__init__(0xB0 | page)
+        self.page = page
 
 
 # 4. Hardware configuration (panel resolution & layout related) commands
@@ -437,10 +454,62 @@ class Controller(Elaboratable):
     def elaborate(self, _: Platform) -> Module:
         m = Module()
         m.d.comb += self.bus.dc.eq(self.interface.dc)
+        # The word is only shifted out, and the interface holds it until done,
+        # so it can be kept in SRLs instead of flip-flops
         m.submodules.master = master = spi.ShiftMaster(
-            self.bus.SPIBus(), shift_register.Up(self.max_bits))
+            self.bus.SPIBus(), macro.XilinxSerialUp(self.max_bits))
         m.d.comb += master.interface.mosi_data.eq(self.interface.data)
         m.d.comb += master.interface.transfer_size.eq(self.interface.data_size)
         m.d.comb += master.interface.start.eq(self.interface.start)
         m.d.comb += self.interface.done.eq(master.interface.done)
         return m
+
+
+class StreamController(Elaboratable):
+    """Byte-streaming SPI master controller for the SSD1306.
+
+    Bytes are queued on the interface along with their D/C# flag (0 for
+    command bytes, 1 for GDDRAM data) and sent back to back, so that whole
+    frames can be written at the bus rate from a FIFO or memory. Chip select is
+    held until a byte with last set has been sent. The controller's area does
+    not depend on the length of the transfer.
+    """
+
+    class Interface(Record):
+        """Muxable interface for StreamController.
+
+        Note that ready fans out to all multiplexed interfaces, so only the
+        selected one should assert valid.
+        """
+
+        def __init__(self):
+            super().__init__(Layout([
+                ('dc', 1, Direction.FANIN),
+                ('data', 8, Direction.FANIN),
+                ('last', 1, Direction.FANIN),
+                ('valid', 1, Direction.FANIN),
+                ('ready', 1, Direction.FANOUT),
+            ]))
+
+    def __init__(self, bus: Bus, fifo_depth: int = 16):
+        super().__init__()
+        self.bus = bus
+        self.fifo_depth = fifo_depth
+        self.interface = self.Interface()
+        self.busy = Signal()
+
+    def elaborate(self, _: Platform) -> Module:
+        m = Module()
+        m.submodules.master = master = spi.StreamMaster(
+            self.bus.SPIBus(), width=8, fifo_depth=self.fifo_depth,
+            sideband_width=1)
+        m.d.comb += [
+            master.data.eq(self.interface.data),
+            master.sideband.eq(self.interface.dc),
+            master.last.eq(self.interface.last),
+            master.valid.eq(self.interface.valid),
+            self.interface.ready.eq(master.ready),
+            self.bus.dc.eq(master.word_sideband),
+            self.busy.eq(master.busy),
+        ]
+        return m
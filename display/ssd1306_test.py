@@ -0,0 +1,103 @@
+"""Tests for nmigen_nexys.display.ssd1306."""
+
+import os
+from typing import List, Tuple
+import unittest
+
+from nmigen import *
+from nmigen.sim import *
+
+from nmigen_nexys.core import util
+from nmigen_nexys.display import ssd1306
+from nmigen_nexys.test import test_util
+
+
+class StreamControllerTest(unittest.TestCase):
+    """Stream bytes to the controller and decode them from the bus."""
+
+    def _run_test(self, packets: List[List[Tuple[int, int]]]):
+        m = Module()
+        bus = ssd1306.Bus(
+            dc=Signal(name='dc'),
+            cs_n=Signal(name='cs', reset=1),
+            clk=Signal(name='spi_clk'),
+            mosi=Signal(name='mosi'))
+        m.submodules.controller = controller = ssd1306.StreamController(
+            bus, fifo_depth=4)
+        m.submodules.timer = timer = test_util.Timer(self, timeout_s=200e-6)
+        sim = Simulator(m)
+        sim.add_clock(1.0 / util.SIMULATION_CLOCK_FREQUENCY)
+        iface = controller.interface
+        frames = []
+        cycles = []
+
+        def write():
+            start = yield timer.cycle_counter
+            for packet in packets:
+                for i, (dc, byte) in enumerate(packet):
+                    yield iface.dc.eq(dc)
+                    yield iface.data.eq(byte)
+                    yield iface.last.eq(i == len(packet) - 1)
+                    yield iface.valid.eq(1)
+                    yield
+                    while not (yield iface.ready):
+                        yield
+            yield iface.valid.eq(0)
+            yield Settle()
+            while (yield controller.busy):
+                yield
+                yield Settle()
+            cycles.append((yield timer.cycle_counter) - start)
+
+        def monitor():
+            # The SSD1306 samples MOSI on rising edges and D/C# with the last
+            # bit of each byte
+            yield Passive()
+            last_clk = 0
+            last_cs_n = 1
+            bits = []
+            while True:
+                yield
+                clk = yield bus.clk
+                cs_n = yield bus.cs_n
+                if last_cs_n and not cs_n:
+                    frames.append([])
+                if not last_cs_n and cs_n:
+                    self.assertEqual(bits, [])
+                if clk and not last_clk and not cs_n:
+                    bits.append((yield bus.mosi))
+                    if len(bits) == 8:
+                        byte = int(''.join(str(b) for b in bits), 2)
+                        frames[-1].append(((yield bus.dc), byte))
+                        bits = []
+                last_clk, last_cs_n = clk, cs_n
+
+        sim.add_sync_process(write)
+        sim.add_sync_process(monitor)
+        sim.add_sync_process(timer.timeout_process)
+        test_dir = test_util.BazelTestOutput(self.id())
+        os.makedirs(test_dir, exist_ok=True)
+        with sim.write_vcd(os.path.join(test_dir, "test.vcd"),
+                           os.path.join(test_dir, "test.gtkw"),
+                           traces=list(bus.fields.values())):
+            sim.run()
+        self.assertEqual(frames, packets)
+        return cycles[0]
+
+    def test_commands_and_data(self):
+        self._run_test([
+            [(0, 0x21), (0, 0x00), (0, 0x7F)],
+            [(1, 0xA5), (1, 0x5A), (0, 0xAF), (1, 0xFF)],
+        ])
+
+    def test_line_rate(self):
+        # A full page is sent back to back, so the transfer time is dominated
+        # by the bus clock
+        page = [(1, i) for i in range(128)]
+        cycles = self._run_test([page])
+        bit_cycles = util.SIMULATION_CLOCK_FREQUENCY // 10_000_000
+        self.assertLess(cycles, 8 * bit_cycles * (len(page) + 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,6 +4,7 @@ from nmigen import *
 from nmigen.build import *
 
 from nmigen_nexys.core import util
+from nmigen_nexys.math import delta_sigma_model
 
 
 class Modulator(Elaboratable):
@@ -99,3 +100,123 @@ class Modulator(Elaboratable):
         ]
         m.d.sync += S.eq((S - Y) + X)
         return m
+
+
+class HigherOrderModulator(Elaboratable):
+    """Single-bit delta-sigma modulator of arbitrary order.
+
+    The loop is a chain of delaying integrators with distributed feedback
+    (CIFB). Its coefficients come from delta_sigma_model.FeedbackCoefficients:
+    the noise transfer function places every zero at DC, and its poles bound
+    the out-of-band gain to h_inf. Placing the poles at the origin instead,
+    i.e. shaping by (1 - z**-1)**order, makes single-bit loops above order two
+    unstable at every input level.
+
+    Even so, the stable input range shrinks as the order grows (to roughly
+    60% of full scale for order four with the default h_inf). Rather than
+    wrapping around, each integrator saturates at the limits of its
+    integrator_width-bit register, so the loop recovers once the input comes
+    back down. Lowering h_inf widens the stable range at the cost of SNR.
+
+    The output is bit-exact with delta_sigma_model.HigherOrder.
+    """
+
+    def __init__(self, width: int, order: int = 2,
+                 integrator_width: Optional[int] = None, h_inf: float = 1.5):
+        super().__init__()
+        assert order >= 1
+        self.width = width
+        self.order = order
+        self.h_inf = h_inf
+        self.integrator_width = (
+            integrator_width or
+            delta_sigma_model.DefaultIntegratorWidth(width, order, h_inf))
+        self.input = Signal(signed(width))
+        self.output = Signal()
+
+    def elaborate(self, _: Optional[Platform]) -> Module:
+        m = Module()
+        # For order N, integrator k (counting from one at the input) evolves as:
+        #
+        #   S_k(n + 1) = clamp(S_k(n) + U_k(n) - a_k * Y(n))
+        #
+        # where U_1 is the input X, U_k = S_(k - 1) for k > 1, and the output Y
+        # is determined by the sign of S_N as in Modulator. Since Y only takes
+        # two values, each product a_k * Y is selected from a pair of
+        # constants.
+        shape = signed(self.integrator_width)
+        S_min = util.ShapeMin(shape)
+        S_max = util.ShapeMax(shape)
+        S = [Signal(shape, name=f'S{k + 1}', reset=0)
+             for k in range(self.order)]
+        m.d.comb += self.output.eq(S[-1] >= 0)
+        feedback = delta_sigma_model.FeedbackConstants(
+            self.width, self.order, self.h_inf)
+        for k, (s, u, (f_low, f_high)) in enumerate(
+                zip(S, [self.input] + S[:-1], feedback)):
+            f = Signal(signed(f_low.bit_length() + 1), name=f'F{k + 1}')
+            m.d.comb += f.eq(Mux(self.output, f_high, f_low))
+            total = Signal(
+                signed(max(self.integrator_width, len(f)) + 2),
+                name=f'total{k + 1}')
+            m.d.comb += total.eq(s + u - f)
+            with m.If(total > S_max):
+                m.d.sync += s.eq(S_max)
+            with m.Elif(total < S_min):
+                m.d.sync += s.eq(S_min)
+            with m.Else():
+                m.d.sync += s.eq(total)
+        return m
+
+
+class MASH111(Elaboratable):
+    """Multi-stage noise shaping modulator with three first-order stages.
+
+    Each stage is an overflow accumulator whose residue feeds the next stage,
+    and the carries are recombined through differentiators so that the noise of
+    the first two stages cancels. The remaining noise is shaped by
+    (1 - z**-1)**3, and unlike HigherOrderModulator the loop is unconditionally
+    stable.
+
+    The output is a multi-level signed value in [-3, 4] whose average is
+    (input + 2**(width - 1)) / 2**width, so it needs a multi-level output stage
+    (e.g. a short PWM period per sample) rather than a single pin. No such
+    stage exists in this tree, so for now this is only used to compare against
+    the single-bit modulators with delta_sigma_snr.
+
+    The output is bit-exact with delta_sigma_model.MASH111.
+    """
+
+    def __init__(self, width: int):
+        super().__init__()
+        self.width = width
+        self.input = Signal(signed(width))
+        self.output = Signal(signed(4))
+
+    def elaborate(self, _: Optional[Platform]) -> Module:
+        m = Module()
+        # Offset binary representation of the input
+        u = Cat(self.input[:-1], ~self.input[-1])
+        carries = []
+        for k in range(3):
+            acc = Signal(self.width, name=f'acc{k + 1}', reset=0)
+            total = Signal(self.width + 1, name=f'total{k + 1}')
+            m.d.comb += total.eq(acc + u)
+            m.d.sync += acc.eq(total[:-1])
+            carries.append(total[-1])
+            u = total[:-1]
+        # Widen the carries so the recombination is computed as signed
+        c1, c2, c3 = [Signal(self.output.shape(), name=f'c{k + 1}')
+                      for k in range(3)]
+        m.d.comb += [c.eq(carry) for c, carry in zip([c1, c2, c3], carries)]
+        c2_1 = Signal(self.output.shape(), reset=0)
+        c3_1 = Signal(self.output.shape(), reset=0)
+        c3_2 = Signal(self.output.shape(), reset=0)
+        m.d.sync += [
+            c2_1.eq(c2),
+            c3_1.eq(c3),
+            c3_2.eq(c3_1),
+        ]
+        m.d.comb += self.output.eq(
+            c1 + (c2 - c2_1) + (c3 - 2 * c3_1 + c3_2))
+        return m
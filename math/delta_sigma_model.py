@@ -0,0 +1,150 @@
+"""Bit-exact software models of the modulators in delta_sigma.
+
+Each model consumes an array of signed input samples, one per clock cycle, and
+returns the corresponding array of modulator outputs exactly as they would be
+observed on the hardware output signal during those cycles. The models step
+through the samples one at a time in plain Python, so they are slow for long
+inputs; NumPy arrays are only used to pass the samples in and out.
+"""
+
+from typing import List, Tuple
+
+import numpy as np
+
+
+def _NoiseTransferPoles(order: int, cutoff: float) -> np.ndarray:
+    """Poles of a Butterworth high-pass filter with the given cutoff.
+
+    The cutoff is relative to the sample rate. The analog prototype is mapped
+    to the z-plane with the bilinear transform.
+    """
+    k = np.arange(order)
+    prototype = np.exp(1j * np.pi * (2 * k + order + 1) / (2 * order))
+    s = 2 * np.tan(np.pi * cutoff) / prototype
+    return (1 + s / 2) / (1 - s / 2)
+
+
+def _OutOfBandGain(order: int, poles: np.ndarray) -> float:
+    """Peak magnitude of (z - 1)**order / prod(z - poles) on the unit circle."""
+    z = np.exp(1j * np.pi * np.linspace(0, 1, 4097))
+    ntf = (z - 1)**order / np.prod([z - p for p in poles], axis=0)
+    return float(np.max(np.abs(ntf)))
+
+
+def FeedbackCoefficients(order: int, h_inf: float = 1.5) -> List[float]:
+    """Feedback coefficients for a CIFB loop with bounded out-of-band gain.
+
+    The noise transfer function has all of its zeros at DC and the poles of a
+    Butterworth high-pass filter, with the cutoff chosen so that the peak gain
+    of the NTF is h_inf. Keeping h_inf around 1.5 (Lee's rule of thumb) is
+    what keeps single-bit loops of order three and above stable.
+
+    Coefficient k counts from the input. The coefficients are normalized so
+    that the first one is one, which lets the input feed the first integrator
+    directly.
+    """
+    assert order >= 1
+    assert h_inf > 1
+    # Bisect the cutoff frequency; the peak gain increases with the cutoff
+    low, high = 0.0, 0.5
+    for _ in range(50):
+        cutoff = (low + high) / 2
+        if _OutOfBandGain(order, _NoiseTransferPoles(order, cutoff)) > h_inf:
+            high = cutoff
+        else:
+            low = cutoff
+    denominator = np.poly1d(np.real(np.poly(_NoiseTransferPoles(order, low))))
+    # With delaying integrators, the NTF of the loop is (z - 1)**N / D(z) where
+    # D(u + 1) = u**N + a_N * u**(N - 1) + ... + a_1.
+    b = denominator(np.poly1d([1, 1])).coeffs
+    return [float(b[order - k] / b[order]) for k in range(order)]
+
+
+def FeedbackConstants(width: int, order: int,
+                      h_inf: float = 1.5) -> List[Tuple[int, int]]:
+    """Per-integrator feedback values subtracted for outputs of zero and one.
+
+    These are the feedback coefficients scaled by the smallest and largest
+    width-bit inputs and rounded to integers, so that the hardware needs no
+    multipliers.
+    """
+    y_max = 2**(width - 1) - 1
+    y_min = -2**(width - 1)
+    return [(round(a * y_min), round(a * y_max))
+            for a in FeedbackCoefficients(order, h_inf)]
+
+
+def DefaultIntegratorWidth(width: int, order: int, h_inf: float = 1.5) -> int:
+    """Integrator width giving the loop one bit of headroom.
+
+    This is one bit more than is needed to represent the feedback constants,
+    which bounds the integrators of a stable loop. Narrower integrators
+    saturate earlier, trading SNR near full scale for stability.
+    """
+    constants = FeedbackConstants(width, order, h_inf)
+    return max(-low for low, _ in constants).bit_length() + 2
+
+
+def FirstOrder(x: np.ndarray, width: int) -> np.ndarray:
+    """Model of delta_sigma.Modulator."""
+    y_max = 2**(width - 1) - 1
+    y_min = -2**(width - 1)
+    s = 0
+    output = np.zeros(len(x), dtype=np.uint8)
+    for n, x_n in enumerate(x.tolist()):
+        y = s >= 0
+        output[n] = y
+        s = (s - (y_max if y else y_min)) + x_n
+    return output
+
+
+def HigherOrder(x: np.ndarray, width: int, order: int, integrator_width: int,
+                h_inf: float = 1.5) -> np.ndarray:
+    """Model of delta_sigma.HigherOrderModulator."""
+    s_max = 2**(integrator_width - 1) - 1
+    s_min = -2**(integrator_width - 1)
+    feedback = FeedbackConstants(width, order, h_inf)
+    s = [0] * order
+    output = np.zeros(len(x), dtype=np.uint8)
+    for n, x_n in enumerate(x.tolist()):
+        y = s[-1] >= 0
+        output[n] = y
+        u = [x_n] + s[:-1]
+        s = [min(max(s_k + u_k - f_k[y], s_min), s_max)
+             for s_k, u_k, f_k in zip(s, u, feedback)]
+    return output
+
+
+def MASH111(x: np.ndarray, width: int) -> np.ndarray:
+    """Model of delta_sigma.MASH111."""
+    modulus = 2**width
+    offset = 2**(width - 1)
+    acc = [0, 0, 0]
+    c2_1 = 0
+    c3_1 = 0
+    c3_2 = 0
+    output = np.zeros(len(x), dtype=np.int8)
+    for n, x_n in enumerate(x.tolist()):
+        u = x_n + offset
+        carries = []
+        for k in range(3):
+            total = acc[k] + u
+            carries.append(total >= modulus)
+            acc[k] = total % modulus
+            u = acc[k]
+        c1, c2, c3 = carries
+        output[n] = c1 + (c2 - c2_1) + (c3 - 2 * c3_1 + c3_2)
+        c2_1 = c2
+        c3_1, c3_2 = c3, c3_1
+    return output
+
+
+def Reconstruct(modulator: str, output: np.ndarray, width: int) -> np.ndarray:
+    """Map modulator outputs back onto the scale of the input samples.
+
+    The low-pass filtered reconstruction approximates the input signal.
+    """
+    if modulator == 'mash':
+        return output.astype(np.float64) * 2**width - 2**(width - 1)
+    return np.where(output != 0, 2**(width - 1) - 1, -2**(width - 1)).astype(
+        np.float64)
@@ -0,0 +1,76 @@
+"""Offline in-band SNR measurement for the delta-sigma modulators.
+
+Runs the bit-exact models from delta_sigma_model on a full-scale-relative sine
+wave and reports the ratio of signal power to in-band noise power, e.g.:
+
+  delta_sigma_snr --modulator=cifb --order=2 --amplitude=0.5
+"""
+
+from absl import app
+from absl import flags
+import numpy as np
+
+from nmigen_nexys.math import delta_sigma_model
+
+flags.DEFINE_enum('modulator', 'cifb', ['first', 'cifb', 'mash'],
+                  'Modulator model to measure')
+flags.DEFINE_integer('order', 2, 'Loop order for the CIFB modulator',
+                     lower_bound=1)
+flags.DEFINE_float('h_inf', 1.5, 'Out-of-band NTF gain for the CIFB modulator')
+flags.DEFINE_integer('integrator_width', None,
+                     'CIFB integrator width (defaults to one bit of headroom)')
+flags.DEFINE_integer('width', 16, 'Input sample width')
+flags.DEFINE_float('clock_frequency', 100e6, 'Modulator clock frequency (Hz)')
+flags.DEFINE_float('signal_frequency', 1e3, 'Test tone frequency (Hz)')
+flags.DEFINE_float('amplitude', 0.5, 'Test tone amplitude relative to full scale')
+flags.DEFINE_float('bandwidth', 20e3, 'Upper edge of the signal band (Hz)')
+flags.DEFINE_integer('samples', 2**20, 'Number of modulator clock cycles')
+
+FLAGS = flags.FLAGS
+
+
+def Modulate(x: np.ndarray) -> np.ndarray:
+    if FLAGS.modulator == 'first':
+        return delta_sigma_model.FirstOrder(x, FLAGS.width)
+    if FLAGS.modulator == 'mash':
+        return delta_sigma_model.MASH111(x, FLAGS.width)
+    integrator_width = (
+        FLAGS.integrator_width or
+        delta_sigma_model.DefaultIntegratorWidth(
+            FLAGS.width, FLAGS.order, FLAGS.h_inf))
+    return delta_sigma_model.HigherOrder(
+        x, FLAGS.width, FLAGS.order, integrator_width, FLAGS.h_inf)
+
+
+def InBandSNR(y: np.ndarray, signal_bin: int, band_bins: int) -> float:
+    """SNR in dB of a Hann-windowed tone at signal_bin within [1, band_bins]."""
+    spectrum = np.abs(np.fft.rfft(y * np.hanning(len(y))))**2
+    # The Hann window spreads the tone across its immediate neighbors
+    is_signal = np.zeros(len(spectrum), dtype=bool)
+    is_signal[max(signal_bin - 2, 1):signal_bin + 3] = True
+    in_band = np.zeros(len(spectrum), dtype=bool)
+    in_band[1:band_bins + 1] = True
+    signal_power = np.sum(spectrum[is_signal])
+    noise_power = np.sum(spectrum[in_band & ~is_signal])
+    return 10 * np.log10(signal_power / noise_power)
+
+
+def main(_):
+    n = FLAGS.samples
+    # Snap the tone to an FFT bin to avoid leakage into the noise measurement
+    signal_bin = max(int(round(FLAGS.signal_frequency * n /
+                               FLAGS.clock_frequency)), 1)
+    band_bins = int(FLAGS.bandwidth * n / FLAGS.clock_frequency)
+    full_scale = 2**(FLAGS.width - 1) - 1
+    t = np.arange(n)
+    x = np.round(FLAGS.amplitude * full_scale *
+                 np.sin(2 * np.pi * signal_bin * t / n)).astype(np.int64)
+    y = delta_sigma_model.Reconstruct(FLAGS.modulator, Modulate(x), FLAGS.width)
+    snr = InBandSNR(y, signal_bin, band_bins)
+    print(f'signal: {signal_bin * FLAGS.clock_frequency / n:.1f} Hz')
+    print(f'band: {band_bins * FLAGS.clock_frequency / n:.1f} Hz')
+    print(f'SNR: {snr:.1f} dB')
+
+
+if __name__ == '__main__':
+    app.run(main)
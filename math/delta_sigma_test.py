@@ -1,6 +1,10 @@
 import fractions
 import os
+import random
 import unittest
+from typing import Callable
+
+import numpy as np
 
 from nmigen import *
 from nmigen.back.pysim import *
@@ -8,6 +12,7 @@ from nmigen.back.pysim import *
 from nmigen_nexys.core import timer as timer_module
 from nmigen_nexys.core import util
 from nmigen_nexys.math import delta_sigma
+from nmigen_nexys.math import delta_sigma_model
 from nmigen_nexys.test import test_util
 
 
@@ -41,5 +46,104 @@ class DeltaSigmaTest(unittest.TestCase):
             sim.run_until(250e-6, run_passive=True)
 
 
+class ModelTest(unittest.TestCase):
+
+    def _check(self, dut: Elaboratable,
+               model: Callable[[np.ndarray], np.ndarray], x: np.ndarray):
+        sim = Simulator(dut)
+        sim.add_clock(1.0 / util.SIMULATION_CLOCK_FREQUENCY)
+        output = []
+
+        def process():
+            for x_n in x.tolist():
+                yield dut.input.eq(x_n)
+                yield Settle()
+                output.append((yield dut.output))
+                yield
+
+        sim.add_sync_process(process)
+        test_dir = test_util.BazelTestOutput(self.id())
+        os.makedirs(test_dir, exist_ok=True)
+        with sim.write_vcd(os.path.join(test_dir, "test.vcd"),
+                           os.path.join(test_dir, "test.gtkw"),
+                           traces=[dut.input, dut.output]):
+            sim.run()
+        # The sync process starts after the first clock edge, during which the
+        # input is still zero.
+        expected = model(np.concatenate([[0], x]))[1:]
+        np.testing.assert_array_equal(np.array(output), expected)
+
+    def _input(self, width: int, n: int = 1000) -> np.ndarray:
+        rng = random.Random(width)
+        # Random walk to exercise both the slow-moving and full-scale regimes
+        x = []
+        value = 0
+        for _ in range(n):
+            value += rng.randint(-2**(width - 3), 2**(width - 3))
+            value = max(-2**(width - 1), min(2**(width - 1) - 1, value))
+            x.append(value)
+        return np.array(x)
+
+    def test_first_order(self):
+        self._check(delta_sigma.Modulator(8),
+                    lambda x: delta_sigma_model.FirstOrder(x, 8),
+                    self._input(8))
+
+    def test_second_order(self):
+        self._check(delta_sigma.HigherOrderModulator(8, order=2),
+                    lambda x: delta_sigma_model.HigherOrder(x, 8, 2, 11),
+                    self._input(8))
+
+    def test_third_order(self):
+        self._check(delta_sigma.HigherOrderModulator(8, order=3),
+                    lambda x: delta_sigma_model.HigherOrder(x, 8, 3, 14),
+                    self._input(8))
+
+    def test_third_order_clamped(self):
+        self._check(
+            delta_sigma.HigherOrderModulator(8, order=3, integrator_width=11),
+            lambda x: delta_sigma_model.HigherOrder(x, 8, 3, 11),
+            self._input(8))
+
+    def test_fourth_order(self):
+        self._check(
+            delta_sigma.HigherOrderModulator(8, order=4, h_inf=1.3),
+            lambda x: delta_sigma_model.HigherOrder(x, 8, 4, 18, h_inf=1.3),
+            self._input(8))
+
+    def test_feedback_coefficients(self):
+        # Poles at the origin would give the binomial coefficients of
+        # (1 - z**-1)**order; bounding the out-of-band gain pulls them down.
+        self.assertEqual(delta_sigma_model.FeedbackCoefficients(1), [1.0])
+        a = delta_sigma_model.FeedbackCoefficients(2)
+        self.assertAlmostEqual(a[1], 2 + 2**0.5, places=6)
+        for order in range(1, 6):
+            a = delta_sigma_model.FeedbackCoefficients(order)
+            self.assertEqual(len(a), order)
+            self.assertTrue(all(a_k > 0 for a_k in a))
+
+    def test_model_stable(self):
+        # Fourth order with the default design holds a half-scale tone
+        n = 2**14
+        x = np.round(0.5 * 127 * np.sin(2 * np.pi * 4 * np.arange(n) / n))
+        y = delta_sigma_model.HigherOrder(
+            x.astype(np.int64), 8, 4,
+            delta_sigma_model.DefaultIntegratorWidth(8, 4))
+        y = delta_sigma_model.Reconstruct('cifb', y, 8)
+        # Moving average over 64 cycles tracks the input
+        lpf = np.convolve(y, np.ones(64) / 64, mode='same')
+        self.assertLess(np.max(np.abs(lpf - x)[64:-64]), 16)
+
+    def test_mash111(self):
+        self._check(delta_sigma.MASH111(8),
+                    lambda x: delta_sigma_model.MASH111(x, 8),
+                    self._input(8))
+
+    def test_mash111_mean(self):
+        y = delta_sigma_model.MASH111(np.full(4096, 37), 8)
+        self.assertTrue(np.all((y >= -3) & (y <= 4)))
+        self.assertAlmostEqual(y.mean(), (37 + 128) / 256, places=2)
+
+
 if __name__ == '__main__':
     unittest.main()
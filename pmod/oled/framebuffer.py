@@ -0,0 +1,249 @@
+"""Block RAM framebuffer and refresh engine for SSD1306 displays."""
+
+from typing import List, Optional
+
+from nmigen import *
+from nmigen.build import *
+from nmigen.utils import log2_int
+
+from nmigen_nexys.core import timer as timer_module
+from nmigen_nexys.core import util
+from nmigen_nexys.display import ssd1306
+
+
+def WindowHeader(col_lo: Value, col_hi: Value, page_lo: Value,
+                 page_hi: Value) -> List[Value]:
+    """Commands selecting a horizontally addressed GDDRAM window."""
+    mode = ssd1306.SetMemoryAddressingMode(ssd1306.AddressingMode.HORIZONTAL)
+    column = ssd1306.SetColumnAddress(0, 0)
+    page = ssd1306.SetPageAddress(0, 0)
+    return [
+        *[C(b, 8) for b in mode.data],
+        C(column.data[0], 8), col_lo, col_hi,
+        C(page.data[0], 8), page_lo, page_hi,
+    ]
+
+
+class Framebuffer(Elaboratable):
+    """GDDRAM image in block RAM, continuously streamed to the display.
+
+    The image is stored in GDDRAM order: byte address page * columns + column
+    holds the eight vertically stacked pixels of that column within the page,
+    least significant bit on top. The application updates it through the
+    write_addr/write_data/write_en port.
+
+    While enable is asserted, the refresh engine sends the whole image to the
+    controller once per frame, preceded by the commands that select
+    horizontal addressing over the full window so that each frame starts at
+    the top left corner. If frame_rate is given, frames start at that rate in
+    Hz; otherwise they are sent back to back. The frame_done signal strobes
+    once the last byte of each frame has been read from the buffer.
+
+    If partial_refresh is set, the range of columns written within each page
+    since it was last sent is tracked instead, and each frame only sends those
+    ranges, each in its own window. The whole image is dirty while the display
+    is disabled and after each swap. Writes made while a page is being sent
+    are picked up in the next frame. This requires a power-of-two number of
+    columns.
+
+    If double_buffer is set, the application writes to a back buffer while the
+    front buffer is displayed. Strobing swap exchanges them at the end of the
+    frame in progress (or immediately if none is), after which swapped
+    strobes. The new back buffer holds the image from before the previous
+    swap.
+    """
+
+    def __init__(self, controller: ssd1306.StreamController.Interface,
+                 columns: int = 128, pages: int = 4,
+                 frame_rate: Optional[float] = None,
+                 double_buffer: bool = False,
+                 partial_refresh: bool = False):
+        super().__init__()
+        assert 0 < columns <= 128
+        assert 0 < pages <= 8
+        assert not partial_refresh or columns & (columns - 1) == 0
+        self.controller = controller
+        self.columns = columns
+        self.pages = pages
+        self.frame_rate = frame_rate
+        self.double_buffer = double_buffer
+        self.partial_refresh = partial_refresh
+        self.size = columns * pages
+        self.enable = Signal(reset=0)
+        self.write_addr = Signal(range(self.size))
+        self.write_data = Signal(8)
+        self.write_en = Signal()
+        self.swap = Signal()
+        self.swapped = Signal(reset=0)
+        self.frame_done = Signal(reset=0)
+
+    def Header(self) -> bytes:
+        """Commands sent ahead of each full frame."""
+        return bytes(value.value for value in WindowHeader(
+            C(0, 8), C(self.columns - 1, 8), C(0, 8), C(self.pages - 1, 8)))
+
+    def elaborate(self, platform: Platform) -> Module:
+        m = Module()
+        banks = 2 if self.double_buffer else 1
+        mem = Memory(width=8, depth=banks * self.size)
+        m.submodules.rport = rport = mem.read_port(transparent=False)
+        m.submodules.wport = wport = mem.write_port()
+        # Bank being displayed
+        front = Signal(range(banks), reset=0)
+        back = Signal(range(banks))
+        m.d.comb += back.eq(front + 1 if self.double_buffer else front)
+        m.d.comb += [
+            wport.addr.eq(back * self.size + self.write_addr),
+            wport.data.eq(self.write_data),
+            wport.en.eq(self.write_en),
+        ]
+
+        # Frame timing
+        frame_go = Signal()
+        if self.frame_rate is not None:
+            m.submodules.timer = timer = timer_module.UpTimer(
+                util.GetClockFreq(platform) / self.frame_rate)
+            frame_pending = Signal(reset=0)
+            with m.If(timer.triggered):
+                m.d.sync += frame_pending.eq(1)
+            m.d.comb += frame_go.eq(frame_pending | timer.triggered)
+        else:
+            m.d.comb += frame_go.eq(1)
+
+        # Each frame is sent as one or more windows, each consisting of a
+        # header followed by the bytes within the window in horizontal
+        # addressing order. Each byte lands in the output registers (and the
+        # memory read port) on the cycle after it is produced, where it is held
+        # until the controller accepts it.
+        col_lo = Signal(range(self.columns))
+        col_hi = Signal(range(self.columns))
+        page_lo = Signal(range(self.pages))
+        page_hi = Signal(range(self.pages))
+        header = Array(WindowHeader(col_lo, col_hi, page_lo, page_hi))
+        header_index = Signal(range(len(header)))
+        col = Signal(range(self.columns))
+        page = Signal(range(self.pages))
+        header_data = Signal(8)
+        is_header = Signal()
+        last = Signal()
+        valid = Signal(reset=0)
+        advance = ~valid | self.controller.ready
+        window_last = (col == col_hi) & (page == page_hi)
+        m.d.comb += [
+            self.controller.data.eq(Mux(is_header, header_data, rport.data)),
+            self.controller.dc.eq(~is_header),
+            self.controller.last.eq(last),
+            self.controller.valid.eq(valid),
+            rport.addr.eq(front * self.size + page * self.columns + col),
+        ]
+
+        # Dirty column range within each page
+        dirty = Signal(self.pages, reset=2**self.pages - 1)
+        dirty_lo = Array(Signal(range(self.columns), name=f'dirty_lo{i}')
+                         for i in range(self.pages))
+        dirty_hi = Array(Signal(range(self.columns), reset=self.columns - 1,
+                                name=f'dirty_hi{i}')
+                         for i in range(self.pages))
+
+        def MarkAllDirty(m: Module):
+            m.d.sync += dirty.eq(dirty.reset)
+            for i in range(self.pages):
+                m.d.sync += dirty_lo[i].eq(0)
+                m.d.sync += dirty_hi[i].eq(self.columns - 1)
+
+        swap_pending = Signal(reset=0)
+        with m.If(self.swap):
+            m.d.sync += swap_pending.eq(1)
+        m.d.sync += self.swapped.eq(0)  # default
+        m.d.sync += self.frame_done.eq(0)  # default
+        m.d.comb += rport.en.eq(0)  # default
+        with m.If(advance):
+            m.d.sync += valid.eq(0)  # default
+        with m.FSM(reset='IDLE'):
+            with m.State('IDLE'):
+                if self.double_buffer:
+                    with m.If(swap_pending | self.swap):
+                        m.d.sync += front.eq(back)
+                        m.d.sync += swap_pending.eq(0)
+                        m.d.sync += self.swapped.eq(1)
+                        if self.partial_refresh:
+                            MarkAllDirty(m)
+                with m.If(self.enable & frame_go):
+                    if self.frame_rate is not None:
+                        m.d.sync += frame_pending.eq(0)
+                    if self.partial_refresh:
+                        m.d.sync += page.eq(0)
+                        m.next = 'SCAN'
+                    else:
+                        m.d.sync += col_lo.eq(0)
+                        m.d.sync += col_hi.eq(self.columns - 1)
+                        m.d.sync += page_lo.eq(0)
+                        m.d.sync += page_hi.eq(self.pages - 1)
+                        m.d.sync += header_index.eq(0)
+                        m.next = 'HEADER'
+            if self.partial_refresh:
+                with m.State('SCAN'):
+                    # page holds the next page to check
+                    with m.If(dirty.bit_select(page, 1)):
+                        m.d.sync += dirty.bit_select(page, 1).eq(0)
+                        m.d.sync += col_lo.eq(dirty_lo[page])
+                        m.d.sync += col_hi.eq(dirty_hi[page])
+                        m.d.sync += page_lo.eq(page)
+                        m.d.sync += page_hi.eq(page)
+                        m.d.sync += header_index.eq(0)
+                        m.next = 'HEADER'
+                    with m.Elif(page == self.pages - 1):
+                        m.d.sync += self.frame_done.eq(1)
+                        m.next = 'IDLE'
+                    with m.Else():
+                        m.d.sync += page.eq(page + 1)
+            with m.State('HEADER'):
+                with m.If(advance):
+                    m.d.sync += header_data.eq(header[header_index])
+                    m.d.sync += is_header.eq(1)
+                    m.d.sync += last.eq(0)
+                    m.d.sync += valid.eq(1)
+                    m.d.sync += header_index.eq(header_index + 1)
+                    with m.If(header_index == len(header) - 1):
+                        m.d.sync += col.eq(col_lo)
+                        m.d.sync += page.eq(page_lo)
+                        m.next = 'DATA'
+            with m.State('DATA'):
+                with m.If(advance):
+                    m.d.comb += rport.en.eq(1)
+                    m.d.sync += is_header.eq(0)
+                    m.d.sync += last.eq(window_last)
+                    m.d.sync += valid.eq(1)
+                    m.d.sync += col.eq(col + 1)
+                    with m.If(col == col_hi):
+                        m.d.sync += col.eq(col_lo)
+                        m.d.sync += page.eq(page + 1)
+                    with m.If(window_last):
+                        if self.partial_refresh:
+                            with m.If(page == self.pages - 1):
+                                m.d.sync += self.frame_done.eq(1)
+                                m.next = 'IDLE'
+                            with m.Else():
+                                m.next = 'SCAN'
+                        else:
+                            m.d.sync += self.frame_done.eq(1)
+                            m.next = 'IDLE'
+
+        # Track writes to the displayed buffer
+        if self.partial_refresh:
+            write_col = self.write_addr[:log2_int(self.columns)]
+            write_page = self.write_addr[log2_int(self.columns):]
+            if not self.double_buffer:
+                with m.If(self.write_en):
+                    m.d.sync += dirty.bit_select(write_page, 1).eq(1)
+                    with m.If(dirty.bit_select(write_page, 1)):
+                        with m.If(write_col < dirty_lo[write_page]):
+                            m.d.sync += dirty_lo[write_page].eq(write_col)
+                        with m.If(write_col > dirty_hi[write_page]):
+                            m.d.sync += dirty_hi[write_page].eq(write_col)
+                    with m.Else():
+                        m.d.sync += dirty_lo[write_page].eq(write_col)
+                        m.d.sync += dirty_hi[write_page].eq(write_col)
+            with m.If(~self.enable):
+                MarkAllDirty(m)
+        return m
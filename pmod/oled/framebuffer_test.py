@@ -0,0 +1,181 @@
+"""Tests for nmigen_nexys.pmod.oled.framebuffer."""
+
+import random
+from typing import List, NamedTuple, Optional, Tuple
+import unittest
+
+from nmigen import *
+from nmigen.sim import *
+
+from nmigen_nexys.core import util
+from nmigen_nexys.display import ssd1306
+from nmigen_nexys.pmod.oled import framebuffer
+from nmigen_nexys.test import test_util
+
+
+COLUMNS = 16
+PAGES = 2
+SIZE = COLUMNS * PAGES
+
+
+class Window(NamedTuple):
+    """GDDRAM window sent to the controller."""
+    col_lo: int
+    col_hi: int
+    page_lo: int
+    page_hi: int
+    data: bytes
+
+
+class FramebufferTest(unittest.TestCase):
+    """Act as the controller and collect the windows sent to it."""
+
+    def _run_test(self, windows: int, double_buffer: bool = False,
+                  frame_rate: Optional[float] = None,
+                  partial_refresh: bool = False,
+                  swaps: List[bytes] = (),
+                  updates: List[Tuple[int, int]] = (),
+                  cycles: Optional[int] = None
+                  ) -> Tuple[List[Window], List[int]]:
+        m = Module()
+        controller = ssd1306.StreamController.Interface()
+        m.submodules.fb = fb = framebuffer.Framebuffer(
+            controller, columns=COLUMNS, pages=PAGES, frame_rate=frame_rate,
+            double_buffer=double_buffer, partial_refresh=partial_refresh)
+        m.submodules.timer = timer = test_util.Timer(self, timeout_s=100e-6)
+        sim = Simulator(m)
+        sim.add_clock(1.0 / util.SIMULATION_CLOCK_FREQUENCY)
+        header_size = len(fb.Header())
+        result = []
+        starts = []
+
+        def Write(image: bytes):
+            for addr, byte in enumerate(image):
+                yield fb.write_addr.eq(addr)
+                yield fb.write_data.eq(byte)
+                yield fb.write_en.eq(1)
+                yield
+            yield fb.write_en.eq(0)
+
+        def app():
+            yield Passive()
+            # Fill the displayed buffer before refreshing
+            yield from Write(bytes(range(SIZE)))
+            if double_buffer:
+                yield fb.swap.eq(1)
+                yield
+                yield fb.swap.eq(0)
+                yield from test_util.WaitSync(fb.swapped)
+            yield fb.enable.eq(1)
+            for image in swaps:
+                yield from Write(image)
+                yield fb.swap.eq(1)
+                yield
+                yield fb.swap.eq(0)
+                yield from test_util.WaitSync(fb.swapped)
+            if updates:
+                yield from test_util.WaitSync(fb.frame_done)
+                for addr, byte in updates:
+                    yield fb.write_addr.eq(addr)
+                    yield fb.write_data.eq(byte)
+                    yield fb.write_en.eq(1)
+                    yield
+                yield fb.write_en.eq(0)
+
+        def controller_process():
+            rng = random.Random(0)
+            packet = bytearray()
+            for _ in range(cycles or 100_000):
+                if len(result) == windows and cycles is None:
+                    break
+                ready = rng.random() < 0.7
+                yield controller.ready.eq(ready)
+                yield Settle()
+                if ready and (yield controller.valid):
+                    if not packet:
+                        starts.append((yield timer.cycle_counter))
+                    packet.append((yield controller.data))
+                    self.assertEqual((yield controller.dc),
+                                     int(len(packet) > header_size))
+                    if (yield controller.last):
+                        self.assertEqual(packet[:2], b'\x20\x00')
+                        self.assertEqual(packet[2], 0x21)
+                        self.assertEqual(packet[5], 0x22)
+                        result.append(Window(
+                            packet[3], packet[4], packet[6], packet[7],
+                            bytes(packet[header_size:])))
+                        packet = bytearray()
+                yield
+
+        sim.add_sync_process(app)
+        sim.add_sync_process(controller_process)
+        sim.add_sync_process(timer.timeout_process)
+        sim.run()
+        return result, starts
+
+    def test_header(self):
+        fb = framebuffer.Framebuffer(
+            ssd1306.StreamController.Interface(), columns=128, pages=4)
+        self.assertEqual(fb.Header(), bytes([0x20, 0x00, 0x21, 0x00, 0x7F,
+                                             0x22, 0x00, 0x03]))
+
+    def test_refresh(self):
+        windows, _ = self._run_test(windows=3)
+        self.assertEqual(
+            windows,
+            [Window(0, COLUMNS - 1, 0, PAGES - 1, bytes(range(SIZE)))] * 3)
+
+    def test_frame_rate(self):
+        period = 1000
+        _, starts = self._run_test(
+            windows=3, frame_rate=util.SIMULATION_CLOCK_FREQUENCY / period)
+        # Allow for the controller stalling the first byte of each frame
+        for a, b in zip(starts, starts[1:]):
+            self.assertAlmostEqual(b - a, period, delta=10)
+
+    def test_double_buffer(self):
+        first = bytes(range(SIZE))
+        second = bytes(0xFF - b for b in first)
+        third = bytes(b ^ 0x55 for b in first)
+        windows, _ = self._run_test(windows=12, double_buffer=True,
+                                    swaps=[second, third])
+        images = [window.data for window in windows]
+        # Every frame is complete, and each swap is eventually displayed
+        for image in images:
+            self.assertIn(image, [first, second, third])
+        distinct = [image for i, image in enumerate(images)
+                    if i == 0 or image != images[i - 1]]
+        self.assertEqual(distinct, [first, second, third])
+
+    def test_partial_refresh(self):
+        image = bytearray(range(SIZE))
+        updates = [(5, 0xA0), (3, 0xA1), (COLUMNS + 10, 0xA2)]
+        windows, _ = self._run_test(
+            windows=None, partial_refresh=True,
+            frame_rate=util.SIMULATION_CLOCK_FREQUENCY / 1000,
+            updates=updates, cycles=4000)
+        for addr, byte in updates:
+            image[addr] = byte
+        # Each page is sent once in full, then only the changed columns
+        self.assertEqual(windows, [
+            Window(0, COLUMNS - 1, 0, 0, bytes(range(COLUMNS))),
+            Window(0, COLUMNS - 1, 1, 1, bytes(range(COLUMNS, SIZE))),
+            Window(3, 5, 0, 0, bytes(image[3:6])),
+            Window(10, 10, 1, 1, bytes(image[COLUMNS + 10:COLUMNS + 11])),
+        ])
+
+    def test_partial_refresh_swap(self):
+        # Swapping marks the whole image dirty, and nothing is sent after that
+        # until the next swap
+        second = bytes(0xFF - b for b in range(SIZE))
+        windows, _ = self._run_test(
+            windows=None, double_buffer=True, partial_refresh=True,
+            frame_rate=util.SIMULATION_CLOCK_FREQUENCY / 1000,
+            swaps=[second], cycles=4000)
+        self.assertEqual([(w.page_lo, w.col_lo, w.col_hi) for w in windows],
+                         [(0, 0, COLUMNS - 1), (1, 0, COLUMNS - 1)])
+        self.assertEqual(b''.join(w.data for w in windows), second)
+
+
+if __name__ == '__main__':
+    unittest.main()
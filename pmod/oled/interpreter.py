@@ -1,7 +1,8 @@
 """Command-based FSM generator for the Pmod OLED."""
 
 import abc
-from typing import Iterable, List, NamedTuple
+import enum
+from typing import Iterable, List, NamedTuple, Optional, Sequence, Union
 
 from nmigen import *
 from nmigen.build import *
@@ -51,6 +52,10 @@ class Command(abc.ABC):
     def Poll(self, ctx: 'Program.Context') -> Value:
         """Value macro determine whether the command is complete."""
 
+    @abc.abstractmethod
+    def Assemble(self, asm: 'MicrocodeProgram.Assembler'):
+        """Emit the command's microcode for MicrocodeProgram."""
+
 
 class DigitalWrite(Command):
     """Update the value of a flip-flop, e.g. one connected to an output pin."""
@@ -70,6 +75,10 @@ class DigitalWrite(Command):
     def Poll(self, ctx: 'Program.Context') -> Value:
         return C(1, 1)
 
+    def Assemble(self, asm: 'MicrocodeProgram.Assembler'):
+        asm.Emit(Opcode.DIGITAL_WRITE, asm.DigitalWriteOperand(self.ff,
+                                                               self.value))
+
 
 class Delay(Command):
     """Wait for a fixed number of cycles."""
@@ -90,6 +99,9 @@ class Delay(Command):
     def Poll(self, ctx: 'Program.Context') -> Value:
         return ctx.timer.triggered
 
+    def Assemble(self, asm: 'MicrocodeProgram.Assembler'):
+        asm.Delay(self.cycles)
+
 
 class WriteCommand(Command):
     """Write a command to the SSD1306 controller."""
@@ -108,50 +120,436 @@ class WriteCommand(Command):
     def Poll(self, ctx: 'Program.Context') -> Value:
         return ctx.controller.done
 
+    def Assemble(self, asm: 'MicrocodeProgram.Assembler'):
+        # The SSD1306 accepts multi-byte commands split across transfers
+        for byte in self.data.data:
+            asm.Emit(Opcode.WRITE_BYTE, byte)
+
+
+# Field widths of WriteBlock parameters
+OFFSET_BITS = 16
+LENGTH_BITS = 16
+
+
+class AssetROM(object):
+    """Byte ROM holding the data sent by WriteBlock commands.
+
+    Blocks are deduplicated as they are added: a block that already appears in
+    the ROM, including as part of a larger block, is not stored again. The
+    ROM may be shared by any number of programs, each of which gets its own
+    read port. All blocks must be added before the first program using the ROM
+    is elaborated.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.data = bytearray()
+        self._memory = None
+
+    def Add(self, block: bytes) -> int:
+        """Add a block to the ROM and return its offset."""
+        assert self._memory is None, 'AssetROM is already elaborated'
+        offset = self.data.find(block)
+        if offset < 0:
+            offset = len(self.data)
+            self.data += block
+        return offset
+
+    @property
+    def memory(self) -> Memory:
+        if self._memory is None:
+            self._memory = Memory(width=8, depth=max(len(self.data), 1),
+                                  init=self.data)
+        return self._memory
+
+
+class BlockReader(Elaboratable):
+    """Stream a block of an AssetROM to a StreamController as one burst."""
+
+    def __init__(self, assets: AssetROM,
+                 stream: ssd1306.StreamController.Interface):
+        super().__init__()
+        self.assets = assets
+        self.stream = stream
+        self.offset = Signal(OFFSET_BITS)
+        self.length = Signal(LENGTH_BITS)
+        self.dc = Signal()
+        self.start = Signal()
+        self.done = Signal(reset=0)
+
+    def elaborate(self, _: Platform) -> Module:
+        m = Module()
+        m.submodules.rport = rport = self.assets.memory.read_port(
+            transparent=False)
+        address = Signal(OFFSET_BITS)
+        remaining = Signal(LENGTH_BITS)
+        dc = Signal()
+        last = Signal()
+        valid = Signal(reset=0)
+        advance = ~valid | self.stream.ready
+        m.d.comb += [
+            self.stream.data.eq(rport.data),
+            self.stream.dc.eq(dc),
+            self.stream.last.eq(last),
+            self.stream.valid.eq(valid),
+            rport.addr.eq(address),
+        ]
+        m.d.sync += self.done.eq(0)  # default
+        m.d.comb += rport.en.eq(0)  # default
+        with m.FSM(reset='IDLE'):
+            with m.State('IDLE'):
+                with m.If(self.start):
+                    m.d.sync += address.eq(self.offset)
+                    m.d.sync += remaining.eq(self.length)
+                    m.d.sync += dc.eq(self.dc)
+                    m.next = 'SEND'
+            with m.State('SEND'):
+                with m.If(advance):
+                    with m.If(remaining == 0):
+                        m.d.sync += valid.eq(0)
+                        m.d.sync += self.done.eq(1)
+                        m.next = 'IDLE'
+                    with m.Else():
+                        m.d.comb += rport.en.eq(1)
+                        m.d.sync += address.eq(address + 1)
+                        m.d.sync += remaining.eq(remaining - 1)
+                        m.d.sync += last.eq(remaining == 1)
+                        m.d.sync += valid.eq(1)
+        return m
+
+
+class WriteBlock(Command):
+    """Stream a block of bytes from an AssetROM to the SSD1306 controller.
+
+    The bytes are sent in a single SPI burst through the program's stream
+    controller, with D/C# set to dc (GDDRAM data by default).
+    """
+
+    def __init__(self, assets: AssetROM, data: bytes, dc: int = 1):
+        super().__init__()
+        assert 0 < len(data) < 2**LENGTH_BITS
+        self.assets = assets
+        self.data = data
+        self.dc = dc
+        self.offset = assets.Add(data)
+        assert self.offset + len(data) <= 2**OFFSET_BITS
+
+    def __repr__(self) -> str:
+        # Don't dump the whole block into FSM state names
+        return f'WriteBlock(offset={self.offset}, length={len(self.data)})'
+
+    def Start(self, ctx: 'Program.Context') -> Iterable[Assign]:
+        yield ctx.block.offset.eq(self.offset)
+        yield ctx.block.length.eq(len(self.data))
+        yield ctx.block.dc.eq(self.dc)
+        yield ctx.block.start.eq(1)
+
+    def ReleaseStart(self, ctx: 'Program.Context') -> Iterable[Assign]:
+        yield ctx.block.start.eq(0)
+
+    def Poll(self, ctx: 'Program.Context') -> Value:
+        return ctx.block.done
+
+    def Assemble(self, asm: 'MicrocodeProgram.Assembler'):
+        asm.Emit(Opcode.WRITE_BLOCK, self.dc | (self.offset << 1) |
+                 (len(self.data) << 1 + OFFSET_BITS))
+
+
+# Program contents: either a single list of commands or a list of routines
+Routines = Union[Sequence[Command], Sequence[Sequence[Command]]]
+
+
+def _Routines(commands: Routines) -> List[List[Command]]:
+    """Normalize a program's contents to a list of routines."""
+    assert len(commands) != 0
+    if all(isinstance(command, Command) for command in commands):
+        routines = [list(commands)]
+    else:
+        routines = [list(routine) for routine in commands]
+    assert all(len(routine) != 0 for routine in routines)
+    return routines
+
+
+def _ProgramAssets(commands: List[Command]) -> Optional[AssetROM]:
+    """Find the asset ROM used by a program's WriteBlock commands."""
+    assets = None
+    for command in commands:
+        if isinstance(command, WriteBlock):
+            assert assets is None or command.assets is assets
+            assets = command.assets
+    return assets
+
 
 class Program(Elaboratable):
-    """Convert a list of Commands into an FSM."""
+    """Convert a list of Commands into an FSM.
+
+    A program may instead be given several lists of commands, or routines,
+    each of which is an entry point. The routines share the program's timer
+    and controller ports, so any number of command sequences driving the same
+    hardware can be built into a single program. Strobing start runs the
+    routine selected by entry, after which done strobes.
+
+    Programs containing WriteBlock commands must be given a stream controller
+    interface, to which the blocks are sent.
+    """
 
     class Context(NamedTuple):
         """Internal command execution context."""
         timer: timer_module.OneShot
         controller: ssd1306.Controller.Interface
+        block: Optional[BlockReader]
 
-    def __init__(self, commands: List[Command],
-                 controller: ssd1306.Controller.Interface):
+    def __init__(self, commands: Routines,
+                 controller: ssd1306.Controller.Interface,
+                 stream: Optional[ssd1306.StreamController.Interface] = None):
         super().__init__()
-        assert len(commands) != 0
-        for i, command in enumerate(commands):
+        self.routines = _Routines(commands)
+        self.commands = [cmd for routine in self.routines for cmd in routine]
+        for i, command in enumerate(self.commands):
             command.SetAddress(i)
-        self.commands = commands
         self.controller = controller
+        self.stream = stream
+        self.assets = _ProgramAssets(self.commands)
+        assert self.assets is None or stream is not None
+        self.entry = Signal(range(len(self.routines)))
         self.start = Signal(reset=0)
         self.done = Signal(reset=0)
 
     def elaborate(self, _: Platform) -> Module:
         m = Module()
         max_cycles = max(
-            cmd.cycles for cmd in self.commands if isinstance(cmd, Delay))
+            [cmd.cycles for cmd in self.commands if isinstance(cmd, Delay)],
+            default=1)
         m.submodules.timer = timer = timer_module.OneShot(
             Signal(range(max_cycles)))
-        ctx = Program.Context(timer, self.controller)
+        block = None
+        if self.assets is not None:
+            m.submodules.block = block = BlockReader(self.assets, self.stream)
+        ctx = Program.Context(timer, self.controller, block)
+        m.d.sync += self.done.eq(0)  # default
+        with m.FSM(reset='IDLE'):
+            with m.State('IDLE'):
+                with m.If(self.start):
+                    with m.Switch(self.entry):
+                        for i, routine in enumerate(self.routines):
+                            with m.Case(i):
+                                m.d.sync += routine[0].Start(ctx)
+                                m.next = routine[0].state
+            for routine in self.routines:
+                for prev, next in zip(routine[:-1], routine[1:]):
+                    m.d.sync += prev.ReleaseStart(ctx)
+                    with m.State(prev.state):
+                        with m.If(prev.Poll(ctx)):
+                            m.d.sync += next.Start(ctx)
+                            m.next = next.state
+                last = routine[-1]
+                with m.State(last.state):
+                    m.d.sync += last.ReleaseStart(ctx)
+                    with m.If(last.Poll(ctx)):
+                        m.d.sync += self.done.eq(1)
+                        m.next = 'IDLE'
+        return m
+
+
+class Opcode(enum.IntEnum):
+    """Microcode operation executed by MicrocodeProgram."""
+    NOP = 0
+    DIGITAL_WRITE = 1
+    WRITE_BYTE = 2
+    WRITE_BLOCK = 3
+
+
+class Microinstruction(NamedTuple):
+    """Microcode word: an operation followed by a delay in cycles.
+
+    The last word of each routine is marked as such, so that the sequencer
+    stops there rather than running into the next routine.
+    """
+    opcode: Opcode
+    operand: int
+    delay: int
+    last: bool = False
+
+
+class MicrocodeProgram(Elaboratable):
+    """Execute a list of Commands from a microcode ROM.
+
+    This is a drop-in replacement for Program. Instead of generating an FSM
+    state per command, the commands are assembled into a ROM of
+    (opcode, operand, delay) words, which are executed by a sequencer whose
+    size does not depend on the length of the program. Delays are folded into
+    the preceding word where possible. Multi-byte controller commands are sent
+    one byte per transfer. Routines are assembled back to back into the same
+    ROM, and entry selects the address at which start begins executing.
+
+    As with Program, WriteBlock commands require a stream controller.
+    """
+
+    class Assembler(object):
+        """Internal microcode builder passed to Command.Assemble."""
+
+        # Leave room for up to 16 flip-flops in DIGITAL_WRITE operands
+        INDEX_BITS = 4
+
+        def __init__(self):
+            super().__init__()
+            self.words: List[Microinstruction] = []
+            self.flip_flops: List[flop.FF.Interface] = []
+            self.entry_points: List[int] = []
+
+        def Routine(self, commands: List[Command]):
+            self.entry_points.append(len(self.words))
+            for command in commands:
+                command.Assemble(self)
+            self.words[-1] = self.words[-1]._replace(last=True)
+
+        def Emit(self, opcode: Opcode, operand: int):
+            self.words.append(Microinstruction(opcode, operand, 0))
+
+        def Delay(self, cycles: int):
+            if (len(self.words) == self.entry_points[-1] or
+                    self.words[-1].delay != 0):
+                self.Emit(Opcode.NOP, 0)
+            self.words[-1] = self.words[-1]._replace(delay=cycles)
+
+        def DigitalWriteOperand(self, ff: flop.FF.Interface,
+                                value: Const) -> int:
+            assert isinstance(value, Const)
+            for i, other in enumerate(self.flip_flops):
+                if other is ff:
+                    index = i
+                    break
+            else:
+                index = len(self.flip_flops)
+                self.flip_flops.append(ff)
+            return index | (value.value << self.INDEX_BITS)
+
+    def __init__(self, commands: Routines,
+                 controller: ssd1306.Controller.Interface,
+                 stream: Optional[ssd1306.StreamController.Interface] = None):
+        super().__init__()
+        self.routines = _Routines(commands)
+        self.commands = [cmd for routine in self.routines for cmd in routine]
+        for i, command in enumerate(self.commands):
+            command.SetAddress(i)
+        self.controller = controller
+        self.stream = stream
+        self.assets = _ProgramAssets(self.commands)
+        assert self.assets is None or stream is not None
+        self.entry = Signal(range(len(self.routines)))
+        self.start = Signal(reset=0)
+        self.done = Signal(reset=0)
+        self.asm = MicrocodeProgram.Assembler()
+        for routine in self.routines:
+            self.asm.Routine(routine)
+        assert len(self.asm.flip_flops) <= 2**self.asm.INDEX_BITS
+
+    def elaborate(self, _: Platform) -> Module:
+        m = Module()
+        words = self.asm.words
+        flip_flops = self.asm.flip_flops
+        index_bits = self.asm.INDEX_BITS
+        value_bits = max([len(ff.d) for ff in flip_flops], default=0)
+        opcode_bits = Shape.cast(Opcode).width
+        operand_bits = max(8, index_bits + value_bits,
+                           *[word.operand.bit_length() for word in words])
+        delay_bits = max(word.delay for word in words).bit_length() or 1
+        rom = Memory(
+            width=1 + opcode_bits + operand_bits + delay_bits,
+            depth=len(words),
+            init=[
+                word.last | (word.opcode << 1) |
+                (word.operand << 1 + opcode_bits) |
+                (word.delay << 1 + opcode_bits + operand_bits)
+                for word in words
+            ])
+        m.submodules.rport = rport = rom.read_port()
+        last = rport.data[0]
+        opcode = rport.data[1:1 + opcode_bits]
+        operand = rport.data[1 + opcode_bits:1 + opcode_bits + operand_bits]
+        delay = rport.data[1 + opcode_bits + operand_bits:]
+        ff_index = operand[:index_bits]
+        ff_value = operand[index_bits:]
+        byte = Signal(8)
+        m.d.comb += byte.eq(operand[:8])
+        block = None
+        if self.assets is not None:
+            m.submodules.block = block = BlockReader(self.assets, self.stream)
+
+        m.submodules.timer = timer = timer_module.OneShot(
+            Signal(delay_bits))
+        pc = Signal(range(len(words)), reset=0)
+        m.d.comb += rport.addr.eq(pc)
+
+        def Next(m: Module):
+            with m.If(delay != 0):
+                m.d.sync += timer.period.eq(delay)
+                m.d.sync += timer.go.eq(1)
+                m.next = 'DELAY'
+            with m.Elif(last):
+                m.d.sync += self.done.eq(1)
+                m.next = 'IDLE'
+            with m.Else():
+                m.d.sync += pc.eq(pc + 1)
+                m.next = 'FETCH'
+
         m.d.sync += self.done.eq(0)  # default
+        m.d.sync += timer.go.eq(0)  # default
+        m.d.sync += self.controller.start.eq(0)  # default
+        if block is not None:
+            m.d.sync += block.start.eq(0)  # default
+        for ff in flip_flops:
+            m.d.sync += ff.clk_en.eq(0)  # default
         with m.FSM(reset='IDLE'):
-            first = self.commands[0]
-            last = self.commands[-1]
             with m.State('IDLE'):
                 with m.If(self.start):
-                    m.d.sync += first.Start(ctx)
-                    m.next = first.state
-            for prev, next in zip(self.commands[:-1], self.commands[1:]):
-                m.d.sync += prev.ReleaseStart(ctx)
-                with m.State(prev.state):
-                    with m.If(prev.Poll(ctx)):
-                        m.d.sync += next.Start(ctx)
-                        m.next = next.state
-            with m.State(last.state):
-                m.d.sync += last.ReleaseStart(ctx)
-                with m.If(last.Poll(ctx)):
-                    m.d.sync += self.done.eq(1)
-                    m.next = 'IDLE'
+                    entry_points = Array(C(addr, len(pc))
+                                         for addr in self.asm.entry_points)
+                    m.d.sync += pc.eq(entry_points[self.entry])
+                    m.next = 'FETCH'
+            with m.State('FETCH'):
+                # Wait for the ROM read
+                m.next = 'EXECUTE'
+            with m.State('EXECUTE'):
+                with m.Switch(opcode):
+                    with m.Case(Opcode.NOP):
+                        Next(m)
+                    with m.Case(Opcode.DIGITAL_WRITE):
+                        for i, ff in enumerate(flip_flops):
+                            with m.If(ff_index == i):
+                                m.d.sync += ff.d.eq(ff_value)
+                                m.d.sync += ff.clk_en.eq(1)
+                        m.next = 'WRITE'
+                    with m.Case(Opcode.WRITE_BYTE):
+                        m.d.sync += self.controller.WriteData(byte, dc=0)
+                        m.d.sync += self.controller.start.eq(1)
+                        m.next = 'WAIT'
+                    if block is not None:
+                        with m.Case(Opcode.WRITE_BLOCK):
+                            m.d.sync += block.dc.eq(operand[0])
+                            m.d.sync += block.offset.eq(
+                                operand[1:1 + OFFSET_BITS])
+                            m.d.sync += block.length.eq(
+                                operand[1 + OFFSET_BITS:])
+                            m.d.sync += block.start.eq(1)
+                            m.next = 'WAIT_BLOCK'
+            with m.State('WRITE'):
+                # Retire the write once the flip-flop has been enabled, as
+                # DigitalWrite does under Program
+                Next(m)
+            with m.State('WAIT'):
+                with m.If(self.controller.done):
+                    Next(m)
+            if block is not None:
+                with m.State('WAIT_BLOCK'):
+                    with m.If(block.done):
+                        Next(m)
+            with m.State('DELAY'):
+                with m.If(timer.triggered):
+                    with m.If(last):
+                        m.d.sync += self.done.eq(1)
+                        m.next = 'IDLE'
+                    with m.Else():
+                        m.d.sync += pc.eq(pc + 1)
+                        m.next = 'FETCH'
         return m
@@ -0,0 +1,141 @@
+"""Tests for nmigen_nexys.pmod.oled.interpreter."""
+
+import random
+from typing import List, Tuple
+import unittest
+
+from nmigen import *
+from nmigen.sim import *
+
+from nmigen_nexys.core import util
+from nmigen_nexys.display import ssd1306
+from nmigen_nexys.pmod.oled import interpreter
+from nmigen_nexys.test import test_util
+
+
+SPLASH = random.Random(0).randbytes(64)
+
+
+class WriteBlockTest(unittest.TestCase):
+    """Run programs that stream blocks and collect the resulting bursts."""
+
+    def _run_test(self, program_class, commands: interpreter.Routines,
+                  entries: List[int] = (0,)) -> List[Tuple[int, bytes]]:
+        m = Module()
+        controller = ssd1306.Controller.Interface(8 * ssd1306.MAX_COMMAND_BYTES)
+        stream = ssd1306.StreamController.Interface()
+        m.submodules.program = program = program_class(
+            commands, controller, stream=stream)
+        m.submodules.timer = timer = test_util.Timer(self, timeout_s=10e-6)
+        sim = Simulator(m)
+        sim.add_clock(1.0 / util.SIMULATION_CLOCK_FREQUENCY)
+        bursts = []
+
+        def run():
+            for entry in entries:
+                yield program.entry.eq(entry)
+                yield program.start.eq(1)
+                yield
+                yield program.start.eq(0)
+                yield from test_util.WaitSync(program.done)
+
+        def consume():
+            yield Passive()
+            rng = random.Random(0)
+            burst = bytearray()
+            dcs = set()
+            while True:
+                ready = rng.random() < 0.5
+                yield stream.ready.eq(ready)
+                yield Settle()
+                if ready and (yield stream.valid):
+                    burst.append((yield stream.data))
+                    dcs.add((yield stream.dc))
+                    if (yield stream.last):
+                        self.assertEqual(len(dcs), 1)
+                        bursts.append((dcs.pop(), bytes(burst)))
+                        burst = bytearray()
+                yield
+
+        sim.add_sync_process(run)
+        sim.add_sync_process(consume)
+        sim.add_sync_process(timer.timeout_process)
+        sim.run()
+        return bursts
+
+    def test_dedup(self):
+        assets = interpreter.AssetROM()
+        blocks = [
+            interpreter.WriteBlock(assets, SPLASH),
+            interpreter.WriteBlock(assets, SPLASH[4:12]),
+            interpreter.WriteBlock(assets, b'\x01\x02\x03'),
+            interpreter.WriteBlock(assets, SPLASH[60:] + b'\x01'),
+            interpreter.WriteBlock(assets, b'\x02\x03'),
+        ]
+        self.assertEqual(bytes(assets.data), SPLASH + b'\x01\x02\x03')
+        self.assertEqual([block.offset for block in blocks],
+                         [0, 4, 64, 60, 65])
+
+    def test_write_block(self):
+        for program_class in [interpreter.Program,
+                              interpreter.MicrocodeProgram]:
+            with self.subTest(program=program_class.__name__):
+                assets = interpreter.AssetROM()
+                commands = [
+                    interpreter.WriteBlock(assets, SPLASH),
+                    interpreter.Delay(10),
+                    interpreter.WriteBlock(assets, SPLASH[4:12], dc=0),
+                    interpreter.WriteBlock(assets, b'\xA5'),
+                ]
+                bursts = self._run_test(program_class, commands)
+                self.assertEqual(bursts, [
+                    (1, SPLASH),
+                    (0, SPLASH[4:12]),
+                    (1, b'\xA5'),
+                ])
+
+    def test_entry_points(self):
+        for program_class in [interpreter.Program,
+                              interpreter.MicrocodeProgram]:
+            with self.subTest(program=program_class.__name__):
+                assets = interpreter.AssetROM()
+                routines = [
+                    [
+                        interpreter.WriteBlock(assets, SPLASH[:8]),
+                        interpreter.Delay(10),
+                    ],
+                    [
+                        # Must not be folded into the previous routine
+                        interpreter.Delay(20),
+                        interpreter.WriteBlock(assets, b'\x5A', dc=0),
+                    ],
+                    [
+                        interpreter.WriteBlock(assets, SPLASH[8:16]),
+                    ],
+                ]
+                bursts = self._run_test(program_class, routines,
+                                        entries=[1, 2, 0, 1])
+                self.assertEqual(bursts, [
+                    (0, b'\x5A'),
+                    (1, SPLASH[8:16]),
+                    (1, SPLASH[:8]),
+                    (0, b'\x5A'),
+                ])
+
+    def test_microcode_entry_points(self):
+        assets = interpreter.AssetROM()
+        program = interpreter.MicrocodeProgram(
+            [[interpreter.WriteBlock(assets, b'\x01'), interpreter.Delay(5)],
+             [interpreter.Delay(7)]],
+            ssd1306.Controller.Interface(8 * ssd1306.MAX_COMMAND_BYTES),
+            stream=ssd1306.StreamController.Interface())
+        self.assertEqual(program.asm.entry_points, [0, 1])
+        self.assertEqual([(w.opcode, w.delay, w.last)
+                          for w in program.asm.words], [
+            (interpreter.Opcode.WRITE_BLOCK, 5, True),
+            (interpreter.Opcode.NOP, 7, True),
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -75,15 +75,22 @@ class PowerSequencer(Elaboratable):
     The module must be powered up before use. This sequencer handles the control
     signals, time delays, and SPI commands needed to do this correctly. It also
     implements a power-down sequence.
+
+    Both sequences are routines of a single program, so they share its delay
+    timer and drive the controller and power-control flip-flops directly. If
+    microcode is set, the program is an interpreter.MicrocodeProgram rather
+    than an interpreter.Program.
     """
 
     def __init__(self, pins: Pins,
                  controller: ssd1306.Controller.Interface,
                  sim_logic_wait_us: Optional[numbers.Number] = None,
-                 sim_vcc_wait_us: Optional[numbers.Number] = None):
+                 sim_vcc_wait_us: Optional[numbers.Number] = None,
+                 microcode: bool = False):
         super().__init__()
         self.pins = pins
         self.controller = controller
+        self.microcode = microcode
         self.enable = Signal(reset=0)
         self.status = Signal(PowerStatus, reset=PowerStatus.OFF)
         self._sim_logic_wait_us = sim_logic_wait_us
@@ -91,8 +98,6 @@ class PowerSequencer(Elaboratable):
 
     def elaborate(self, platform: Platform) -> Module:
         m = Module()
-        # Give control to the power-up or -down logic
-        select = Signal(reset=0)
         # Explicit reset control
         m.submodules.vdd_en = vdd_en = flop.FF(1, reset=0)
         m.submodules.vbat_en = vbat_en = flop.FF(1, reset=0)
@@ -105,20 +110,13 @@ class PowerSequencer(Elaboratable):
         logic_delay = int((self._sim_logic_wait_us or 1000) * us)  # 1 ms
         vcc_delay = int((self._sim_vcc_wait_us or 100_000) * us)  # 100 ms
         # Use the interpreter to build the power sequence logic
-        controllers = [
-            ssd1306.Controller.Interface(self.controller.max_bits)
-            for _ in range(2)
-        ]
-        m.d.comb += util.Multiplex(select, self.controller, controllers)
-        vdd_enables = [flop.FF.Interface(1) for _ in range(2)]
-        vbat_enables = [flop.FF.Interface(1) for _ in range(2)]
-        m.d.comb += util.Multiplex(select, vdd_en.interface, vdd_enables)
-        m.d.comb += util.Multiplex(select, vbat_en.interface, vbat_enables)
-        m.submodules.power_up = power_up = interpreter.Program([
+        program_class = (interpreter.MicrocodeProgram if self.microcode
+                         else interpreter.Program)
+        power_up = [
             ## Adapted from https://reference.digilentinc.com/_media/reference/pmod/pmodoled/oled.zip.
             ## See OledDriver.cpp:OledDevInit.
             # Start by turning VDD on and wait a while for the power to come up.
-            interpreter.DigitalWrite(vdd_enables[0], C(1, 1)),
+            interpreter.DigitalWrite(vdd_en.interface, C(1, 1)),
             interpreter.Delay(logic_delay),
             # Display off command
             interpreter.WriteCommand(ssd1306.SetDisplayOn(False)),
@@ -130,7 +128,7 @@ class PowerSequencer(Elaboratable):
             interpreter.WriteCommand(ssd1306.ChargePumpSetting(True)),
             interpreter.WriteCommand(ssd1306.SetPrechargePeriod(phase1=1, phase2=15)),
             # Turn on VCC and wait 100ms
-            interpreter.DigitalWrite(vbat_enables[0], C(1, 1)),
+            interpreter.DigitalWrite(vbat_en.interface, C(1, 1)),
             interpreter.Delay(vcc_delay),
             # # Send the commands to invert the display.
             # interpreter.WriteCommand(ssd1306.Command(0xA1)),
@@ -140,38 +138,39 @@ class PowerSequencer(Elaboratable):
             # interpreter.WriteCommand(ssd1306.Command(0x20)),
             # Send Display On command
             interpreter.WriteCommand(ssd1306.SetDisplayOn(True)),
-        ], controllers[0])
-        m.submodules.power_down = power_down = interpreter.Program([
+        ]
+        power_down = [
             ## See OledDriver.cpp:OledDevTerm.
             # Send the Display Off command.
             interpreter.WriteCommand(ssd1306.SetDisplayOn(False)),
 	        # Turn off VCC
-            interpreter.DigitalWrite(vbat_enables[1], C(0, 1)),
+            interpreter.DigitalWrite(vbat_en.interface, C(0, 1)),
             interpreter.Delay(vcc_delay),
             # Turn off VDD
-            interpreter.DigitalWrite(vdd_enables[1], C(0, 1)),
-        ], controllers[1])
-        m.d.sync += power_up.start.eq(0)  # default
-        m.d.sync += power_down.start.eq(0)  # default
+            interpreter.DigitalWrite(vdd_en.interface, C(0, 1)),
+        ]
+        m.submodules.program = program = program_class(
+            [power_up, power_down], self.controller)
+        m.d.sync += program.start.eq(0)  # default
         with m.FSM(reset='OFF'):
             with m.State('OFF'):
                 with m.If(self.enable):
                     m.d.sync += self.status.eq(PowerStatus.POWERING_UP)
-                    m.d.sync += select.eq(0)
-                    m.d.sync += power_up.start.eq(1)
+                    m.d.sync += program.entry.eq(0)
+                    m.d.sync += program.start.eq(1)
                     m.next = 'POWERING_UP'
             with m.State('POWERING_UP'):
-                with m.If(power_up.done):
+                with m.If(program.done):
                     m.d.sync += self.status.eq(PowerStatus.READY)
                     m.next = 'READY'
             with m.State('READY'):
                 with m.If(~self.enable):
                     m.d.sync += self.status.eq(PowerStatus.POWERING_DOWN)
-                    m.d.sync += select.eq(1)
-                    m.d.sync += power_down.start.eq(1)
+                    m.d.sync += program.entry.eq(1)
+                    m.d.sync += program.start.eq(1)
                     m.next = 'POWERING_DOWN'
             with m.State('POWERING_DOWN'):
-                with m.If(power_down.done):
+                with m.If(program.done):
                     m.d.sync += self.status.eq(PowerStatus.OFF)
                     m.next = 'OFF'
         return m
@@ -79,14 +79,14 @@ class PowerSequenceTest(unittest.TestCase):
 
     TIMEOUT_S = 50e-6
 
-    def test_up_down(self):
+    def _test_up_down(self, microcode: bool = False):
         m = Module()
         pins = pmod_oled.PmodPins()
         m.submodules.controller = controller = ssd1306.Controller(
             pins.ControllerBus(), max_data_bytes=0)
         m.submodules.sequencer = sequencer = pmod_oled.PowerSequencer(
             pins, controller.interface, sim_logic_wait_us=0.1,
-            sim_vcc_wait_us=20)
+            sim_vcc_wait_us=20, microcode=microcode)
         m.submodules.decoder = decoder = spi.BusDecoder(
             controller.bus.SPIBus(), polarity=C(0, 1), phase=C(0, 1))
         m.submodules.reset_edge = reset_edge = edge.Detector(pins.reset)
@@ -144,6 +144,12 @@ class PowerSequenceTest(unittest.TestCase):
         ]
         events.ValidateConstraints(self, expected)
 
+    def test_up_down(self):
+        self._test_up_down()
+
+    def test_up_down_microcode(self):
+        self._test_up_down(microcode=True)
+
 
 if __name__ == '__main__':
     unittest.main()
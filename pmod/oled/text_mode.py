@@ -0,0 +1,186 @@
+"""Character-cell text mode for SSD1306 displays."""
+
+from typing import List, Optional
+
+from nmigen import *
+from nmigen.build import *
+
+from nmigen_nexys.core import timer as timer_module
+from nmigen_nexys.core import util
+from nmigen_nexys.display import font5x7
+from nmigen_nexys.display import ssd1306
+from nmigen_nexys.pmod.oled import framebuffer
+
+# Display width in pixels
+WIDTH = 128
+# Glyph width plus one column of spacing
+CELL_WIDTH = font5x7.WIDTH + 1
+
+
+class TextMode(Elaboratable):
+    """Text terminal rendered to the display on the fly.
+
+    Only the character codes are stored, one byte per cell at address
+    row * columns + column, and are updated by the application through the
+    write_addr/write_data/write_en port. Each text row occupies one GDDRAM
+    page. Characters outside of printable ASCII are shown as spaces, and the
+    buffer initially holds init (padded with spaces).
+
+    While enable is asserted, every frame is rendered from the character
+    buffer and the font ROM as it is sent to the controller, preceded by the
+    same window header as a full Framebuffer refresh. Frame timing and
+    frame_done behave as they do for Framebuffer.
+    """
+
+    def __init__(self, controller: ssd1306.StreamController.Interface,
+                 columns: int = WIDTH // CELL_WIDTH, rows: int = 4,
+                 frame_rate: Optional[float] = None, init: str = ''):
+        super().__init__()
+        assert 0 < columns <= WIDTH // CELL_WIDTH
+        assert 0 < rows <= 8
+        assert len(init) <= columns * rows
+        self.controller = controller
+        self.columns = columns
+        self.rows = rows
+        self.frame_rate = frame_rate
+        self.init = init
+        self.size = columns * rows
+        self.enable = Signal(reset=0)
+        self.write_addr = Signal(range(self.size))
+        self.write_data = Signal(8)
+        self.write_en = Signal()
+        self.frame_done = Signal(reset=0)
+
+    def Header(self) -> bytes:
+        """Commands sent ahead of each frame."""
+        return bytes(value.value for value in self._Header())
+
+    def _Header(self) -> List[Value]:
+        return framebuffer.WindowHeader(
+            C(0, 8), C(WIDTH - 1, 8), C(0, 8), C(self.rows - 1, 8))
+
+    def elaborate(self, platform: Platform) -> Module:
+        m = Module()
+        text = Memory(width=8, depth=self.size,
+                      init=[ord(c) for c in self.init.ljust(self.size)])
+        m.submodules.text_rport = text_rport = text.read_port(
+            transparent=False)
+        m.submodules.text_wport = text_wport = text.write_port()
+        m.d.comb += [
+            text_wport.addr.eq(self.write_addr),
+            text_wport.data.eq(self.write_data),
+            text_wport.en.eq(self.write_en),
+        ]
+        font = Memory(width=8, depth=len(font5x7.GLYPHS) * font5x7.WIDTH,
+                      init=font5x7.MemoryInit())
+        m.submodules.font_rport = font_rport = font.read_port(
+            transparent=False)
+
+        # Frame timing
+        frame_go = Signal()
+        if self.frame_rate is not None:
+            m.submodules.timer = timer = timer_module.UpTimer(
+                util.GetClockFreq(platform) / self.frame_rate)
+            frame_pending = Signal(reset=0)
+            with m.If(timer.triggered):
+                m.d.sync += frame_pending.eq(1)
+            m.d.comb += frame_go.eq(frame_pending | timer.triggered)
+        else:
+            m.d.comb += frame_go.eq(1)
+
+        # Each output byte goes through two pipeline stages: the first reads
+        # the character code from the text buffer, and the second reads the
+        # glyph column from the font ROM. Header bytes and blank columns are
+        # carried along without being looked up. The whole pipeline stalls
+        # while the controller is not ready, and the read ports hold their
+        # data while their enables are deasserted.
+        header = Array(self._Header())
+        header_index = Signal(range(len(header)))
+        x = Signal(range(WIDTH))
+        cell = Signal(range(WIDTH // CELL_WIDTH + 1))
+        glyph_col = Signal(range(CELL_WIDTH))
+        page = Signal(range(self.rows))
+        valid = Signal(2, reset=0)
+        advance = ~valid[1] | self.controller.ready
+        blank = (glyph_col == CELL_WIDTH - 1) | (cell >= self.columns)
+        frame_last = (x == WIDTH - 1) & (page == self.rows - 1)
+
+        # Stage tags
+        header_data = [Signal(8, name=f'header_data{i}') for i in range(2)]
+        is_header = [Signal(name=f'is_header{i}') for i in range(2)]
+        is_blank = [Signal(name=f'is_blank{i}') for i in range(2)]
+        last = [Signal(name=f'last{i}') for i in range(2)]
+        col = Signal(range(CELL_WIDTH))
+
+        code = text_rport.data
+        printable = (code >= font5x7.FIRST) & (code <= font5x7.LAST)
+        glyph = Mux(printable, code - font5x7.FIRST, 0)
+        m.d.comb += [
+            text_rport.addr.eq(page * self.columns + Mux(blank, 0, cell)),
+            text_rport.en.eq(advance),
+            font_rport.addr.eq(
+                Mux(is_blank[0], 0, glyph * font5x7.WIDTH + col)),
+            font_rport.en.eq(advance),
+            self.controller.data.eq(
+                Mux(is_header[1], header_data[1],
+                    Mux(is_blank[1], 0, font_rport.data))),
+            self.controller.dc.eq(~is_header[1]),
+            self.controller.last.eq(last[1]),
+            self.controller.valid.eq(valid[1]),
+        ]
+        with m.If(advance):
+            m.d.sync += [
+                valid[1].eq(valid[0]),
+                header_data[1].eq(header_data[0]),
+                is_header[1].eq(is_header[0]),
+                is_blank[1].eq(is_blank[0]),
+                last[1].eq(last[0]),
+                valid[0].eq(0),  # default
+            ]
+
+        m.d.sync += self.frame_done.eq(0)  # default
+        with m.FSM(reset='IDLE'):
+            with m.State('IDLE'):
+                with m.If(self.enable & frame_go):
+                    if self.frame_rate is not None:
+                        m.d.sync += frame_pending.eq(0)
+                    m.d.sync += header_index.eq(0)
+                    m.next = 'HEADER'
+            with m.State('HEADER'):
+                with m.If(advance):
+                    m.d.sync += [
+                        header_data[0].eq(header[header_index]),
+                        is_header[0].eq(1),
+                        last[0].eq(0),
+                        valid[0].eq(1),
+                        header_index.eq(header_index + 1),
+                    ]
+                    with m.If(header_index == len(header) - 1):
+                        m.d.sync += x.eq(0)
+                        m.d.sync += cell.eq(0)
+                        m.d.sync += glyph_col.eq(0)
+                        m.d.sync += page.eq(0)
+                        m.next = 'DATA'
+            with m.State('DATA'):
+                with m.If(advance):
+                    m.d.sync += [
+                        is_header[0].eq(0),
+                        is_blank[0].eq(blank),
+                        last[0].eq(frame_last),
+                        valid[0].eq(1),
+                        col.eq(glyph_col),
+                        x.eq(x + 1),
+                        glyph_col.eq(glyph_col + 1),
+                    ]
+                    with m.If(glyph_col == CELL_WIDTH - 1):
+                        m.d.sync += glyph_col.eq(0)
+                        m.d.sync += cell.eq(cell + 1)
+                    with m.If(x == WIDTH - 1):
+                        m.d.sync += x.eq(0)
+                        m.d.sync += cell.eq(0)
+                        m.d.sync += glyph_col.eq(0)
+                        m.d.sync += page.eq(page + 1)
+                    with m.If(frame_last):
+                        m.d.sync += self.frame_done.eq(1)
+                        m.next = 'IDLE'
+        return m
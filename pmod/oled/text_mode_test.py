@@ -0,0 +1,121 @@
+"""Tests for nmigen_nexys.pmod.oled.text_mode."""
+
+import random
+from typing import List, Optional, Tuple
+import unittest
+
+from nmigen import *
+from nmigen.sim import *
+
+from nmigen_nexys.core import util
+from nmigen_nexys.display import font5x7
+from nmigen_nexys.display import ssd1306
+from nmigen_nexys.pmod.oled import text_mode
+from nmigen_nexys.test import test_util
+
+
+def Render(lines: List[str], columns: int) -> bytes:
+    """Reference GDDRAM image of the given text, one line per page."""
+    data = bytearray()
+    for line in lines:
+        page = bytearray()
+        for c in line.ljust(columns):
+            page += font5x7.Glyph(c) + b'\x00'
+        data += page.ljust(text_mode.WIDTH, b'\x00')
+    return bytes(data)
+
+
+class TextModeTest(unittest.TestCase):
+    """Act as the controller and collect the frames sent to it."""
+
+    def _run_test(self, frames: int, columns: int = 21, rows: int = 4,
+                  init: str = '', updates: List[Tuple[int, str]] = (),
+                  frame_rate: Optional[float] = None
+                  ) -> Tuple[List[bytes], List[int]]:
+        m = Module()
+        controller = ssd1306.StreamController.Interface()
+        m.submodules.text = text = text_mode.TextMode(
+            controller, columns=columns, rows=rows, frame_rate=frame_rate,
+            init=init)
+        m.submodules.timer = timer = test_util.Timer(self, timeout_s=500e-6)
+        sim = Simulator(m)
+        sim.add_clock(1.0 / util.SIMULATION_CLOCK_FREQUENCY)
+        header = text.Header()
+        result = []
+        starts = []
+
+        def app():
+            yield Passive()
+            yield text.enable.eq(1)
+            if updates:
+                yield from test_util.WaitSync(text.frame_done)
+                for addr, c in updates:
+                    yield text.write_addr.eq(addr)
+                    yield text.write_data.eq(ord(c))
+                    yield text.write_en.eq(1)
+                    yield
+                yield text.write_en.eq(0)
+
+        def controller_process():
+            rng = random.Random(0)
+            packet = bytearray()
+            while len(result) < frames:
+                ready = rng.random() < 0.7
+                yield controller.ready.eq(ready)
+                yield Settle()
+                if ready and (yield controller.valid):
+                    if not packet:
+                        starts.append((yield timer.cycle_counter))
+                    packet.append((yield controller.data))
+                    self.assertEqual((yield controller.dc),
+                                     int(len(packet) > len(header)))
+                    if (yield controller.last):
+                        self.assertEqual(packet[:len(header)], header)
+                        result.append(bytes(packet[len(header):]))
+                        packet = bytearray()
+                yield
+
+        sim.add_sync_process(app)
+        sim.add_sync_process(controller_process)
+        sim.add_sync_process(timer.timeout_process)
+        sim.run()
+        return result, starts
+
+    def test_header(self):
+        text = text_mode.TextMode(ssd1306.StreamController.Interface())
+        self.assertEqual(text.Header(), bytes([0x20, 0x00, 0x21, 0x00, 0x7F,
+                                               0x22, 0x00, 0x03]))
+
+    def test_render(self):
+        lines = ['Hello, world!', '', '~' * 21, '0123456789']
+        init = ''.join(line.ljust(21) for line in lines)
+        frames, _ = self._run_test(frames=2, init=init)
+        self.assertEqual(frames, [Render(lines, 21)] * 2)
+
+    def test_unprintable(self):
+        frames, _ = self._run_test(frames=1, columns=4, rows=1,
+                                   init='A\x00\x7F\xFF')
+        self.assertEqual(frames, [Render(['A'], 4)])
+
+    def test_update(self):
+        columns = 8
+        frames, _ = self._run_test(
+            frames=2, columns=columns, rows=2, init='abc',
+            updates=[(1, 'X'), (columns + 7, 'Z')])
+        self.assertEqual(frames, [
+            Render(['abc', ''], columns),
+            Render(['aXc', '       Z'], columns),
+        ])
+
+    def test_frame_rate(self):
+        period = 1000
+        _, starts = self._run_test(
+            frames=3, columns=2, rows=1,
+            frame_rate=util.SIMULATION_CLOCK_FREQUENCY / period)
+        # Allow for the controller stalling the first byte of each frame
+        for a, b in zip(starts, starts[1:]):
+            self.assertAlmostEqual(b - a, period, delta=10)
+
+
+if __name__ == '__main__':
+    unittest.main()
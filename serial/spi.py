@@ -8,17 +8,19 @@ multiplexing of chip select or tri-stating of MISO.
 """
 
 import enum
-from typing import Iterable, Optional
+from typing import Iterable, NamedTuple, Optional
 
 from nmigen import *
 from nmigen.build import *
 from nmigen.hdl.ast import Assign
 from nmigen.hdl.rec import Direction, Layout, Record
+from nmigen.lib.fifo import SyncFIFOBuffered
 
 from nmigen_nexys.core import edge
 from nmigen_nexys.core import shift_register
 from nmigen_nexys.core import timer
 from nmigen_nexys.core import util
+from nmigen_nexys.vendor.xilinx import primitive
 
 
 class Bus(Record):
@@ -197,21 +199,45 @@ class ShiftMaster(Elaboratable):
             return self.miso_data[:width]
 
     class Multiplexer(Elaboratable):
-        """Multiplexer for ShiftMaster.Interface."""
+        """Multiplexer for ShiftMaster.Interface.
 
-        def __init__(self, n: int, root: 'ShiftMaster.Interface'):
+        If one_hot is set, select is a one-hot bit vector rather than a binary
+        index, and the multiplexer is built as an AND-OR tree. If
+        pipeline_levels is given, a register is inserted after every
+        pipeline_levels levels of the tree, delaying the requests to the master
+        by self.latency cycles.
+        """
+
+        def __init__(self, n: int, root: 'ShiftMaster.Interface',
+                     one_hot: bool = False,
+                     pipeline_levels: Optional[int] = None):
             super().__init__()
             self.n = n
             self.root = root
-            self.select = Signal(range(n), reset=0)
+            self.one_hot = one_hot
+            self.pipeline_levels = pipeline_levels
+            if one_hot:
+                self.select = Signal(n, reset=1)
+            else:
+                self.select = Signal(range(n), reset=0)
             self.interfaces = [
                 ShiftMaster.Interface(root.width, name_hint=str(i))
                 for i in range(n)
             ]
 
+        @property
+        def latency(self) -> int:
+            if self.pipeline_levels is None:
+                return 0
+            return util.PipelineLatency(self.n, self.pipeline_levels)
+
         def elaborate(self, _: Platform) -> Module:
             m = Module()
-            m.d.comb += util.Multiplex(self.select, self.root, self.interfaces)
+            pipeline = None
+            if self.pipeline_levels is not None:
+                pipeline = util.Pipeline(m, self.pipeline_levels)
+            m.d.comb += util.Multiplex(self.select, self.root, self.interfaces,
+                                       one_hot=self.one_hot, pipeline=pipeline)
             return m
 
     def __init__(self, bus: Bus, register: shift_register.Register):
@@ -258,6 +284,545 @@ class ShiftMaster(Elaboratable):
         return m
 
 
+class ClockRate(enum.Enum):
+    """Bus clock rate of FastMaster relative to the system clock."""
+    HALF = 2
+    FULL = 1
+
+
+class FastMaster(Elaboratable):
+    """SPI master clocked directly from the system clock.
+
+    Rather than timing the bus clock with a ClockEngine, this master toggles it
+    every cycle (ClockRate.HALF) or gates the system clock itself onto the bus
+    (ClockRate.FULL), so bus.freq_Hz is ignored. At full rate, the bus clock is
+    idle during the first half of each cycle and active during the second,
+    which centers the sampling edge in the MOSI data eye. This requires a DDR
+    output register on hardware, so FastMaster only supports full rate in
+    simulation; use XilinxFastMaster on hardware.
+
+    As with ShiftMaster, MOSI changes on the trailing edge of the bus clock.
+    MISO is nominally sampled just before the leading edge, but at high speed
+    the round trip through the pads and the slave can exceed the bit period.
+    Setting sample_delay postpones every sample by that many system clock
+    cycles, up to max_sample_delay. The done strobe follows the last delayed
+    sample.
+
+    Transactions use the same interface as ShiftMaster, so the two may be used
+    interchangeably behind a ShiftMaster.Multiplexer.
+    """
+
+    def __init__(self, bus: Bus, width: int,
+                 rate: ClockRate = ClockRate.HALF, max_sample_delay: int = 3):
+        super().__init__()
+        self.bus = bus
+        self.rate = rate
+        self.max_sample_delay = max_sample_delay
+        self.interface = ShiftMaster.Interface(width)
+        self.polarity = Signal(reset=0)
+        self.sample_delay = Signal(range(max_sample_delay + 1), reset=0)
+        self.busy = Signal(reset=0)
+
+    def _DriveBus(self, m: Module, platform: Optional[Platform], cs_n: Value,
+                  mosi: Value, active: Value):
+        """Drive the bus outputs.
+
+        The bus clock is in its active phase during the cycles where active is
+        asserted (at full rate, during the second half of those cycles).
+        """
+        m.d.comb += self.bus.cs_n.eq(cs_n)
+        m.d.comb += self.bus.mosi.eq(mosi)
+        if self.rate == ClockRate.HALF:
+            m.d.comb += self.bus.clk.eq(self.polarity ^ active)
+        else:
+            # Gating the clock net through fabric logic onto a pin does not
+            # work on hardware
+            assert platform is None, (
+                'Full-rate FastMaster needs a DDR output; '
+                'use XilinxFastMaster')
+            # The system clock is high in the first half cycle
+            m.d.comb += self.bus.clk.eq(
+                self.polarity ^ (active & ~ClockSignal()))
+
+    def elaborate(self, platform: Optional[Platform]) -> Module:
+        m = Module()
+        width = self.interface.width
+        mosi_data = Signal(width)
+        miso_data = Signal(width)
+        remaining = Signal(range(width + 1))
+        pending = Signal(range(width + 1))
+        assert_cs = Signal(reset=0)
+        high = Signal(reset=0)  # HALF: bus clock in the active phase
+        m.d.comb += self.interface.miso_data.eq(miso_data)
+
+        sample = Signal()
+        m.d.comb += sample.eq(0)  # default
+        m.d.sync += self.interface.done.eq(0)  # default
+        with m.FSM(reset='IDLE'):
+            with m.State('IDLE'):
+                with m.If(self.interface.start):
+                    m.d.sync += mosi_data.eq(self.interface.mosi_data)
+                    m.d.sync += remaining.eq(self.interface.transfer_size)
+                    m.d.sync += pending.eq(self.interface.transfer_size)
+                    m.d.sync += self.busy.eq(1)
+                    m.next = 'SETUP'
+            with m.State('SETUP'):
+                # Give chip select and the first MOSI bit a cycle of setup
+                m.d.sync += assert_cs.eq(1)
+                m.next = 'SHIFT'
+            with m.State('SHIFT'):
+                if self.rate == ClockRate.HALF:
+                    m.d.sync += high.eq(~high)
+                    m.d.comb += sample.eq(~high)
+                    last_cycle = high
+                else:
+                    m.d.comb += sample.eq(1)
+                    last_cycle = C(1, 1)
+                with m.If(last_cycle):
+                    m.d.sync += mosi_data.eq(mosi_data << 1)
+                    m.d.sync += remaining.eq(remaining - 1)
+                    with m.If(remaining == 1):
+                        m.d.sync += assert_cs.eq(0)
+                        m.next = 'CAPTURE'
+            with m.State('CAPTURE'):
+                # Wait for the delayed samples to drain
+                with m.If(pending == 0):
+                    m.d.sync += self.busy.eq(0)
+                    m.d.sync += self.interface.done.eq(1)
+                    m.next = 'IDLE'
+        if self.rate == ClockRate.HALF:
+            active = assert_cs & high
+        else:
+            active = assert_cs
+        self._DriveBus(m, platform, ~assert_cs, mosi_data[-1], active)
+
+        # Sample strobes from the previous max_sample_delay cycles, most recent
+        # first
+        history = Signal(self.max_sample_delay)
+        m.d.sync += history.eq(Cat(sample, history[:-1]))
+        delayed_sample = Cat(sample, history).bit_select(self.sample_delay, 1)
+        with m.If(delayed_sample & (pending != 0)):
+            m.d.sync += miso_data.eq(Cat(self.bus.miso, miso_data[:-1]))
+            m.d.sync += pending.eq(pending - 1)
+        return m
+
+
+class XilinxFastMaster(FastMaster):
+    """FastMaster with the full-rate bus clock generated by an ODDR.
+
+    The ODDR delays the bus clock by one cycle, so chip select and MOSI are
+    registered once more to match. Account for the extra cycle in the MISO
+    round trip when choosing sample_delay.
+    """
+
+    def _DriveBus(self, m: Module, platform: Optional[Platform], cs_n: Value,
+                  mosi: Value, active: Value):
+        if platform is None or self.rate == ClockRate.HALF:
+            # Simulation, or no DDR needed
+            return super()._DriveBus(m, platform, cs_n, mosi, active)
+        m.d.sync += self.bus.cs_n.eq(cs_n)
+        m.d.sync += self.bus.mosi.eq(mosi)
+        m.submodules.clk_oddr = oddr = primitive.ODDR(init=0)
+        m.d.comb += [
+            oddr.d1.eq(self.polarity),
+            oddr.d2.eq(self.polarity ^ active),
+            self.bus.clk.eq(oddr.q),
+        ]
+
+
+class StreamMaster(Elaboratable):
+    """FIFO-fed SPI master that holds chip select across words.
+
+    Words are queued on the data/last/valid/ready stream interface and sent MSB
+    first. Chip select is asserted for the first word and held for as long as
+    the packet continues: a word with last set ends the frame after it is
+    sent, as does reaching max_burst words (if given). If the FIFO runs dry in
+    the middle of a packet, the bus clock pauses with chip select held until
+    more data arrives.
+
+    The bus clock runs at bus.freq_Hz, rounded up to an integer division of
+    half the system clock. As with ShiftMaster, MOSI changes on the trailing
+    edge and MISO is sampled on the leading edge. Each received word is
+    presented on miso_data with a one-cycle miso_valid strobe.
+
+    If sideband_width is nonzero, each word also carries the given number of
+    sideband bits through the FIFO. These are presented on word_sideband for
+    as long as the word is on the bus, e.g. to drive a data/command line.
+    """
+
+    def __init__(self, bus: Bus, width: int = 8, fifo_depth: int = 16,
+                 max_burst: Optional[int] = None, sideband_width: int = 0):
+        super().__init__()
+        assert max_burst is None or max_burst >= 1
+        self.bus = bus
+        self.width = width
+        self.fifo_depth = fifo_depth
+        self.max_burst = max_burst
+        self.sideband_width = sideband_width
+        self.data = Signal(width)
+        self.sideband = Signal(sideband_width)
+        self.word_sideband = Signal(sideband_width, reset=0)
+        self.last = Signal()
+        self.valid = Signal()
+        self.ready = Signal()
+        self.miso_data = Signal(width, reset=0)
+        self.miso_valid = Signal(reset=0)
+        self.polarity = Signal(reset=0)
+        self.busy = Signal()
+
+    def elaborate(self, platform: Platform) -> Module:
+        m = Module()
+        half_period = -(-util.GetClockFreq(platform) // (2 * self.bus.freq_Hz))
+        m.submodules.fifo = fifo = SyncFIFOBuffered(
+            width=self.width + 1 + self.sideband_width, depth=self.fifo_depth)
+        m.d.comb += [
+            fifo.w_data.eq(Cat(self.data, self.last, self.sideband)),
+            fifo.w_en.eq(self.valid),
+            self.ready.eq(fifo.w_rdy),
+        ]
+        fifo_data = fifo.r_data[:self.width]
+        fifo_last = fifo.r_data[self.width]
+        fifo_sideband = fifo.r_data[self.width + 1:]
+
+        mosi_data = Signal(self.width)
+        miso_data = Signal(self.width)
+        packet_last = Signal()
+        bits_left = Signal(range(self.width + 1))
+        burst = Signal(range((self.max_burst or 1) + 1))
+        assert_cs = Signal(reset=0)
+        high = Signal(reset=0)
+        timer = Signal(range(half_period), reset=0)
+        tick = timer == half_period - 1
+        m.d.comb += self.bus.cs_n.eq(~assert_cs)
+        m.d.comb += self.bus.clk.eq(self.polarity ^ high)
+        m.d.comb += self.bus.mosi.eq(mosi_data[-1])
+
+        def Load(m: Module):
+            m.d.comb += fifo.r_en.eq(1)
+            m.d.sync += mosi_data.eq(fifo_data)
+            m.d.sync += packet_last.eq(fifo_last)
+            m.d.sync += self.word_sideband.eq(fifo_sideband)
+            m.d.sync += bits_left.eq(self.width)
+            m.d.sync += timer.eq(0)
+
+        m.d.comb += fifo.r_en.eq(0)  # default
+        m.d.sync += self.miso_valid.eq(0)  # default
+        with m.FSM(reset='IDLE') as fsm:
+            m.d.comb += self.busy.eq(~fsm.ongoing('IDLE') | fifo.r_rdy)
+            with m.State('IDLE'):
+                with m.If(fifo.r_rdy):
+                    Load(m)
+                    m.d.sync += assert_cs.eq(1)
+                    m.d.sync += burst.eq(1)
+                    m.next = 'SHIFT'
+            with m.State('SHIFT'):
+                m.d.sync += timer.eq(Mux(tick, 0, timer + 1))
+                with m.If(tick & ~high):
+                    # Leading edge
+                    m.d.sync += high.eq(1)
+                    m.d.sync += miso_data.eq(Cat(self.bus.miso, miso_data[:-1]))
+                with m.If(tick & high):
+                    # Trailing edge
+                    m.d.sync += high.eq(0)
+                    m.d.sync += mosi_data.eq(mosi_data << 1)
+                    m.d.sync += bits_left.eq(bits_left - 1)
+                    with m.If(bits_left == 1):
+                        m.d.sync += self.miso_data.eq(miso_data)
+                        m.d.sync += self.miso_valid.eq(1)
+                        end_frame = packet_last
+                        if self.max_burst is not None:
+                            end_frame |= burst == self.max_burst
+                        with m.If(end_frame):
+                            m.d.sync += assert_cs.eq(0)
+                            m.next = 'HOLD'
+                        with m.Elif(fifo.r_rdy):
+                            Load(m)
+                            m.d.sync += burst.eq(burst + 1)
+                        with m.Else():
+                            m.next = 'STALL'
+            with m.State('STALL'):
+                with m.If(fifo.r_rdy):
+                    Load(m)
+                    m.d.sync += burst.eq(burst + 1)
+                    m.next = 'SHIFT'
+            with m.State('HOLD'):
+                # Keep chip select deasserted for at least half a bus cycle
+                m.d.sync += timer.eq(timer + 1)
+                with m.If(tick):
+                    m.d.sync += timer.eq(0)
+                    m.next = 'IDLE'
+        return m
+
+
+class QuadBus(Record):
+    """Multi-lane SPI bus with chip select.
+
+    The four data lanes are bidirectional and split into output, output enable,
+    and input fields for connection to tristate pins. In single-lane transfers,
+    DQ0 is MOSI and DQ1 is MISO, and DQ2 and DQ3 (which double as the
+    write-protect and hold inputs on flash devices) are driven high outside of
+    quad-lane phases.
+    """
+
+    LAYOUT = Layout([
+        ('cs_n', 1),
+        ('clk', 1),
+        ('dq_o', 4),
+        ('dq_oe', 4),
+        ('dq_i', 4),
+    ])
+
+    def __init__(self, cs_n: Signal, clk: Signal, dq_o: Signal, dq_oe: Signal,
+                 dq_i: Signal, freq_Hz: int):
+        super().__init__(self.LAYOUT, fields={
+            'cs_n': cs_n,
+            'clk': clk,
+            'dq_o': dq_o,
+            'dq_oe': dq_oe,
+            'dq_i': dq_i,
+        })
+        self.freq_Hz = freq_Hz
+
+
+class Lanes(enum.IntEnum):
+    """Lane width of a QuadMaster transfer phase, encoded as log2(lanes)."""
+    X1 = 0
+    X2 = 1
+    X4 = 2
+
+
+class TransferMode(NamedTuple):
+    """Lane widths of the command, address, and data phases."""
+    command: Lanes
+    address: Lanes
+    data: Lanes
+
+
+MODE_1_1_1 = TransferMode(Lanes.X1, Lanes.X1, Lanes.X1)
+MODE_1_1_2 = TransferMode(Lanes.X1, Lanes.X1, Lanes.X2)
+MODE_1_1_4 = TransferMode(Lanes.X1, Lanes.X1, Lanes.X4)
+MODE_1_4_4 = TransferMode(Lanes.X1, Lanes.X4, Lanes.X4)
+
+
+class QuadMaster(Elaboratable):
+    """SPI master for dual and quad transfers.
+
+    Each transaction consists of an 8-bit command phase followed by optional
+    address, dummy, and data phases, all within one chip select frame. The
+    command, address, and data phases each have their own lane width (see
+    TransferMode), so that the common 1-1-1, 1-1-2, 1-1-4, and 1-4-4 modes are
+    supported. The address phase sends the top address_bits bits of address,
+    MSB first; mode bits such as those of flash fast-read commands can be sent
+    by extending the address. The dummy phase clocks dummy_cycles bus cycles
+    with all data lanes released.
+
+    The transaction parameters are latched when start is strobed. Data is
+    written from the wdata/wvalid/wready stream, which pauses the bus clock
+    while empty, and read data is presented with a one-cycle rvalid strobe.
+    The bus clock runs at bus.freq_Hz, rounded up to an integer division of
+    half the system clock.
+    """
+
+    class Phase(enum.IntEnum):
+        COMMAND = 0
+        ADDRESS = 1
+        DUMMY = 2
+        DATA = 3
+
+    def __init__(self, bus: QuadBus, length_width: int = 16):
+        super().__init__()
+        self.bus = bus
+        # Transaction parameters
+        self.command = Signal(8)
+        self.command_lanes = Signal(Lanes)
+        self.address = Signal(32)
+        self.address_bits = Signal(range(33))
+        self.address_lanes = Signal(Lanes)
+        self.dummy_cycles = Signal(8)
+        self.data_lanes = Signal(Lanes)
+        self.write = Signal()
+        self.length = Signal(length_width)
+        # Control
+        self.start = Signal()
+        self.busy = Signal(reset=0)
+        self.done = Signal(reset=0)
+        # Data streams
+        self.wdata = Signal(8)
+        self.wvalid = Signal()
+        self.wready = Signal()
+        self.rdata = Signal(8, reset=0)
+        self.rvalid = Signal(reset=0)
+
+    def SetMode(self, mode: TransferMode) -> Iterable[Assign]:
+        yield self.command_lanes.eq(mode.command)
+        yield self.address_lanes.eq(mode.address)
+        yield self.data_lanes.eq(mode.data)
+
+    def elaborate(self, platform: Platform) -> Module:
+        m = Module()
+        half_period = -(-util.GetClockFreq(platform) // (2 * self.bus.freq_Hz))
+        Phase = self.Phase
+
+        # Latched transaction parameters
+        address = Signal(32)
+        address_bits = Signal.like(self.address_bits)
+        address_lanes = Signal(Lanes)
+        dummy_cycles = Signal.like(self.dummy_cycles)
+        data_lanes = Signal(Lanes)
+        write = Signal()
+        length = Signal.like(self.length)
+
+        phase = Signal(Phase)
+        lanes = Signal(Lanes)
+        shreg = Signal(32)
+        rx = Signal(8)
+        clocks_left = Signal(range(256))
+        bytes_left = Signal.like(self.length)
+        assert_cs = Signal(reset=0)
+        high = Signal(reset=0)
+        timer = Signal(range(half_period), reset=0)
+        tick = timer == half_period - 1
+        m.d.comb += self.bus.cs_n.eq(~assert_cs)
+        m.d.comb += self.bus.clk.eq(high)
+
+        # Lane drivers
+        driving = (phase != Phase.DUMMY) & ((phase != Phase.DATA) | write)
+        with m.Switch(lanes):
+            with m.Case(Lanes.X1):
+                m.d.comb += self.bus.dq_o.eq(Cat(shreg[-1], C(0b110, 3)))
+                m.d.comb += self.bus.dq_oe.eq(0b1101)
+            with m.Case(Lanes.X2):
+                m.d.comb += self.bus.dq_o.eq(Cat(shreg[-2:], C(0b11, 2)))
+                m.d.comb += self.bus.dq_oe.eq(Mux(driving, 0b1111, 0b1100))
+            with m.Case(Lanes.X4):
+                m.d.comb += self.bus.dq_o.eq(shreg[-4:])
+                m.d.comb += self.bus.dq_oe.eq(Mux(driving, 0b1111, 0b0000))
+        with m.If(~assert_cs):
+            m.d.comb += self.bus.dq_oe.eq(0)
+
+        def Begin(m: Module, next_phase: Phase):
+            """Load the shift register for the first item of next_phase."""
+            m.d.sync += phase.eq(next_phase)
+            if next_phase == Phase.COMMAND:
+                m.d.sync += shreg.eq(self.command << 24)
+                m.d.sync += lanes.eq(self.command_lanes)
+                m.d.sync += clocks_left.eq(C(8, 4) >> self.command_lanes)
+            elif next_phase == Phase.ADDRESS:
+                m.d.sync += shreg.eq(address << (C(32, 6) - address_bits)[:6])
+                m.d.sync += lanes.eq(address_lanes)
+                m.d.sync += clocks_left.eq(address_bits >> address_lanes)
+            elif next_phase == Phase.DUMMY:
+                # Release the data lanes as if for the data phase
+                m.d.sync += lanes.eq(data_lanes)
+                m.d.sync += clocks_left.eq(dummy_cycles)
+            else:
+                m.d.sync += lanes.eq(data_lanes)
+                m.d.sync += clocks_left.eq(C(8, 4) >> data_lanes)
+                m.d.sync += bytes_left.eq(length)
+                with m.If(write):
+                    LoadWrite(m)
+
+        def LoadWrite(m: Module):
+            """Load the next write byte, or stall until one is available."""
+            m.d.comb += self.wready.eq(1)
+            m.d.sync += shreg.eq(self.wdata << 24)
+            with m.If(~self.wvalid):
+                m.next = 'STALL'
+
+        def Advance(m: Module, after: Phase):
+            """Move to the first non-empty phase after the given one."""
+            conditions = {
+                Phase.ADDRESS: address_bits != 0,
+                Phase.DUMMY: dummy_cycles != 0,
+                Phase.DATA: length != 0,
+            }
+            pending = [(next_phase, condition)
+                       for next_phase, condition in conditions.items()
+                       if next_phase > after]
+            if not pending:
+                End(m)
+                return
+            for i, (next_phase, condition) in enumerate(pending):
+                with (m.Elif if i else m.If)(condition):
+                    Begin(m, next_phase)
+            with m.Else():
+                End(m)
+
+        def End(m: Module):
+            m.d.sync += assert_cs.eq(0)
+            m.next = 'HOLD'
+
+        m.d.comb += self.wready.eq(0)  # default
+        m.d.sync += self.done.eq(0)  # default
+        m.d.sync += self.rvalid.eq(0)  # default
+        with m.FSM(reset='IDLE'):
+            with m.State('IDLE'):
+                with m.If(self.start):
+                    m.d.sync += [
+                        address.eq(self.address),
+                        address_bits.eq(self.address_bits),
+                        address_lanes.eq(self.address_lanes),
+                        dummy_cycles.eq(self.dummy_cycles),
+                        data_lanes.eq(self.data_lanes),
+                        write.eq(self.write),
+                        length.eq(self.length),
+                        self.busy.eq(1),
+                        assert_cs.eq(1),
+                        timer.eq(0),
+                    ]
+                    Begin(m, Phase.COMMAND)
+                    m.next = 'SHIFT'
+            with m.State('SHIFT'):
+                m.d.sync += timer.eq(Mux(tick, 0, timer + 1))
+                with m.If(tick & ~high):
+                    # Leading edge
+                    m.d.sync += high.eq(1)
+                    with m.Switch(lanes):
+                        with m.Case(Lanes.X1):
+                            m.d.sync += rx.eq(Cat(self.bus.dq_i[1], rx[:-1]))
+                        with m.Case(Lanes.X2):
+                            m.d.sync += rx.eq(Cat(self.bus.dq_i[:2], rx[:-2]))
+                        with m.Case(Lanes.X4):
+                            m.d.sync += rx.eq(Cat(self.bus.dq_i[:4], rx[:-4]))
+                with m.If(tick & high):
+                    # Trailing edge
+                    m.d.sync += high.eq(0)
+                    m.d.sync += clocks_left.eq(clocks_left - 1)
+                    m.d.sync += shreg.eq(shreg << (C(1, 3) << lanes))
+                    with m.If(clocks_left == 1):
+                        with m.Switch(phase):
+                            for p in [Phase.COMMAND, Phase.ADDRESS,
+                                      Phase.DUMMY]:
+                                with m.Case(p):
+                                    Advance(m, p)
+                            with m.Case(Phase.DATA):
+                                with m.If(~write):
+                                    m.d.sync += self.rdata.eq(rx)
+                                    m.d.sync += self.rvalid.eq(1)
+                                m.d.sync += bytes_left.eq(bytes_left - 1)
+                                with m.If(bytes_left == 1):
+                                    Advance(m, Phase.DATA)
+                                with m.Else():
+                                    m.d.sync += clocks_left.eq(C(8, 4) >> lanes)
+                                    with m.If(write):
+                                        LoadWrite(m)
+            with m.State('STALL'):
+                # Write data underrun: hold the clock idle
+                m.d.comb += self.wready.eq(1)
+                m.d.sync += shreg.eq(self.wdata << 24)
+                with m.If(self.wvalid):
+                    m.d.sync += timer.eq(0)
+                    m.next = 'SHIFT'
+            with m.State('HOLD'):
+                # Keep chip select deasserted for at least half a bus cycle
+                m.d.sync += timer.eq(Mux(tick, 0, timer + 1))
+                with m.If(tick):
+                    m.d.sync += self.busy.eq(0)
+                    m.d.sync += self.done.eq(1)
+                    m.next = 'IDLE'
+        return m
+
+
 class ShiftSlave(Elaboratable):
     """Reference implementation of a SPI slave based on a shift register."""
 
@@ -299,3 +864,123 @@ class ShiftSlave(Elaboratable):
             m.d.sync += self.busy.eq(0)
             m.d.sync += self.done.eq(self.busy)
         return m
+
+
+class StreamSlave(Elaboratable):
+    """FIFO-backed SPI slave for frames of any number of words.
+
+    Each word received from the master is queued in a receive FIFO and
+    presented on the rx_data/rx_first/rx_valid/rx_ready stream interface, with
+    rx_first set on the first word of each frame. Words to send are queued on
+    the tx_data/tx_valid/tx_ready interface and consumed one per bus word for
+    as long as chip select is held. Words are sent and received MSB first.
+
+    The start and done signals strobe for one cycle at the beginning and end
+    of each frame. The following flags are set during a frame and hold until
+    the next one begins:
+
+      underrun: the TX FIFO was empty at the start of a word, so idle_word was
+                sent in its place.
+      overrun:  the RX FIFO was full at the end of a word, so the word was
+                dropped.
+      partial:  chip select was deasserted in the middle of a word, which is
+                discarded.
+
+    A TX word is only consumed once its first bit has been sampled by the
+    master, so a word made available at the end of a frame is kept for the
+    next one.
+    """
+
+    def __init__(self, bus: Bus, width: int = 8, rx_fifo_depth: int = 16,
+                 tx_fifo_depth: int = 16, idle_word: int = 0):
+        super().__init__()
+        assert width >= 2
+        self.bus = bus
+        self.width = width
+        self.rx_fifo_depth = rx_fifo_depth
+        self.tx_fifo_depth = tx_fifo_depth
+        self.idle_word = idle_word
+        self.polarity = Signal(reset=0)
+        self.phase = Signal(reset=0)
+        self.rx_data = Signal(width)
+        self.rx_first = Signal()
+        self.rx_valid = Signal()
+        self.rx_ready = Signal()
+        self.tx_data = Signal(width)
+        self.tx_valid = Signal()
+        self.tx_ready = Signal()
+        self.start = Signal(reset=0)
+        self.busy = Signal(reset=0)
+        self.done = Signal(reset=0)
+        self.underrun = Signal(reset=0)
+        self.overrun = Signal(reset=0)
+        self.partial = Signal(reset=0)
+
+    def elaborate(self, _: Platform) -> Module:
+        m = Module()
+        m.submodules.decoder = decoder = BusDecoder(
+            self.bus, self.polarity, self.phase)
+        m.submodules.rx_fifo = rx_fifo = SyncFIFOBuffered(
+            width=self.width + 1, depth=self.rx_fifo_depth)
+        m.submodules.tx_fifo = tx_fifo = SyncFIFOBuffered(
+            width=self.width, depth=self.tx_fifo_depth)
+        m.d.comb += [
+            self.rx_data.eq(rx_fifo.r_data[:self.width]),
+            self.rx_first.eq(rx_fifo.r_data[self.width]),
+            self.rx_valid.eq(rx_fifo.r_rdy),
+            rx_fifo.r_en.eq(self.rx_ready),
+            tx_fifo.w_data.eq(self.tx_data),
+            tx_fifo.w_en.eq(self.tx_valid),
+            self.tx_ready.eq(tx_fifo.w_rdy),
+        ]
+
+        bit = Signal(range(self.width), reset=0)
+        first = Signal(reset=0)
+        rx_word = Signal(self.width)
+        tx_word = Signal(self.width)
+        # Whether tx_word came from the TX FIFO
+        tx_loaded = Signal(reset=0)
+        m.d.comb += rx_fifo.w_en.eq(0)  # default
+        m.d.comb += tx_fifo.r_en.eq(0)  # default
+        m.d.sync += self.start.eq(0)  # default
+        m.d.sync += self.done.eq(0)  # default
+        with m.If(decoder.events[BusEvent.START]):
+            m.d.sync += self.underrun.eq(0)
+            m.d.sync += self.overrun.eq(0)
+            m.d.sync += self.partial.eq(0)
+            m.d.sync += first.eq(1)
+            m.d.sync += self.start.eq(1)
+            m.d.sync += self.busy.eq(1)
+        with m.If(decoder.events[BusEvent.SETUP]):
+            with m.If(bit == 0):
+                # Peek at the next word without consuming it
+                next_word = Mux(tx_fifo.r_rdy, tx_fifo.r_data, self.idle_word)
+                m.d.sync += tx_word.eq(next_word)
+                m.d.sync += tx_loaded.eq(tx_fifo.r_rdy)
+                m.d.sync += self.bus.miso.eq(next_word[-1])
+            with m.Else():
+                m.d.sync += tx_word.eq(tx_word << 1)
+                m.d.sync += self.bus.miso.eq(tx_word[-2])
+        with m.If(decoder.events[BusEvent.SAMPLE]):
+            word = Cat(self.bus.mosi, rx_word[:-1])
+            m.d.sync += rx_word.eq(word)
+            m.d.sync += bit.eq(bit + 1)
+            with m.If(bit == 0):
+                with m.If(tx_loaded):
+                    m.d.comb += tx_fifo.r_en.eq(1)
+                with m.Else():
+                    m.d.sync += self.underrun.eq(1)
+            with m.If(bit == self.width - 1):
+                m.d.sync += bit.eq(0)
+                m.d.sync += first.eq(0)
+                m.d.comb += rx_fifo.w_data.eq(Cat(word, first))
+                with m.If(rx_fifo.w_rdy):
+                    m.d.comb += rx_fifo.w_en.eq(1)
+                with m.Else():
+                    m.d.sync += self.overrun.eq(1)
+        with m.If(decoder.events[BusEvent.STOP]):
+            m.d.sync += bit.eq(0)
+            m.d.sync += self.partial.eq(bit != 0)
+            m.d.sync += self.busy.eq(0)
+            m.d.sync += self.done.eq(self.busy)
+        return m
@@ -0,0 +1,174 @@
+"""Memory-mapped access to SPI NOR flash."""
+
+from typing import NamedTuple, Optional
+
+from minerva import wishbone
+from nmigen import *
+from nmigen.build import *
+from nmigen.hdl.rec import Record
+from nmigen.utils import log2_int
+
+from nmigen_nexys.serial import spi
+
+
+class ReadCommand(NamedTuple):
+    """Flash read command and its transfer layout.
+
+    If mode_byte is given, it is sent on the address lanes following the
+    address, as required by the quad I/O read command.
+    """
+    opcode: int
+    mode: spi.TransferMode
+    dummy_cycles: int
+    mode_byte: Optional[int] = None
+
+
+READ = ReadCommand(0x03, spi.MODE_1_1_1, 0)
+FAST_READ = ReadCommand(0x0B, spi.MODE_1_1_1, 8)
+DUAL_OUTPUT_READ = ReadCommand(0x3B, spi.MODE_1_1_2, 8)
+QUAD_OUTPUT_READ = ReadCommand(0x6B, spi.MODE_1_1_4, 8)
+# Mode byte 0xFF keeps the device out of continuous read mode
+QUAD_IO_READ = ReadCommand(0xEB, spi.MODE_1_4_4, 4, mode_byte=0xFF)
+
+
+class XIPCache(Elaboratable):
+    """Read-only Wishbone slave mapping SPI flash into the address space.
+
+    The size-byte window starting at flash_offset in the flash is served
+    through a direct-mapped cache of lines lines of line_words words each.
+    Hits are acknowledged on the following cycle. A miss fetches the whole line
+    with a single read command before acknowledging. If prefetch is set, the
+    following line is then fetched in the background, as it is on the first hit
+    to a prefetched line, so that sequential instruction fetches stay a line
+    ahead. Hits are served while a fetch is in flight, but further misses wait
+    for it to finish.
+
+    Writes are answered with err. The quad read commands require the quad
+    enable bit to be set in the flash's nonvolatile configuration.
+    """
+
+    def __init__(self, bus: spi.QuadBus, size: int, flash_offset: int = 0,
+                 command: ReadCommand = FAST_READ, lines: int = 16,
+                 line_words: int = 8, prefetch: bool = True):
+        super().__init__()
+        assert flash_offset % (4 * line_words) == 0
+        assert size >= 4 * line_words * lines
+        assert lines >= 2 or not prefetch
+        self.bus = bus
+        self.size = size
+        self.flash_offset = flash_offset
+        self.command = command
+        self.lines = lines
+        self.line_words = line_words
+        self.prefetch = prefetch
+        self.wbus = Record(wishbone.wishbone_layout)
+
+    def elaborate(self, _: Optional[Platform]) -> Module:
+        m = Module()
+        m.submodules.master = master = spi.QuadMaster(self.bus)
+        command = self.command
+        m.d.comb += master.SetMode(command.mode)
+        m.d.comb += [
+            master.command.eq(command.opcode),
+            master.address_bits.eq(24 if command.mode_byte is None else 32),
+            master.dummy_cycles.eq(command.dummy_cycles),
+            master.write.eq(0),
+            master.length.eq(4 * self.line_words),
+        ]
+
+        # Split the word address into tag, line index, and word within line
+        word_bits = log2_int(self.size // 4)
+        offset_bits = log2_int(self.line_words)
+        index_bits = log2_int(self.lines)
+        offset = self.wbus.adr[:word_bits]
+        word = offset[:offset_bits]
+        line = offset[offset_bits:]
+        index = line[:index_bits]
+        tag = line[index_bits:]
+        tags = Array(Signal(len(tag), name=f'tag{i}')
+                     for i in range(self.lines))
+        valid = Signal(self.lines, reset=0)
+        # Lines filled by prefetch and not yet used
+        prefetched = Signal(self.lines, reset=0)
+
+        def LineHit(l: Value) -> Value:
+            l_index = l[:index_bits]
+            return valid.bit_select(l_index, 1) & (
+                tags[l_index] == l[index_bits:])
+
+        hit = LineHit(line)
+
+        mem = Memory(width=32, depth=self.lines * self.line_words)
+        m.submodules.rport = rport = mem.read_port()
+        m.submodules.wport = wport = mem.write_port()
+        strobe = self.wbus.cyc & self.wbus.stb
+        m.d.comb += rport.addr.eq(Cat(word, index))
+        m.d.comb += self.wbus.dat_r.eq(rport.data)
+        m.d.sync += self.wbus.ack.eq(
+            strobe & ~self.wbus.we & hit & ~self.wbus.ack)
+        m.d.sync += self.wbus.err.eq(strobe & self.wbus.we & ~self.wbus.err)
+
+        # Line fill
+        fill_line = Signal.like(line)
+        fill_index = fill_line[:index_bits]
+        fill_tag = fill_line[index_bits:]
+        fill_word = Signal(offset_bits)
+        fill_data = Signal(24)
+        fill_byte = Signal(2)
+        prefetching = Signal()
+
+        def Fetch(m: Module, next_line: Value, is_prefetch: bool):
+            next_index = next_line[:index_bits]
+            m.d.sync += valid.bit_select(next_index, 1).eq(0)
+            m.d.sync += fill_line.eq(next_line)
+            m.d.sync += fill_word.eq(0)
+            m.d.sync += fill_byte.eq(0)
+            m.d.sync += prefetching.eq(is_prefetch)
+            byte_address = self.flash_offset + (next_line << offset_bits + 2)
+            if command.mode_byte is None:
+                m.d.sync += master.address.eq(byte_address)
+            else:
+                m.d.sync += master.address.eq(
+                    Cat(C(command.mode_byte, 8), byte_address[:24]))
+            m.d.sync += master.start.eq(1)
+            m.next = 'FILL'
+
+        m.d.sync += master.start.eq(0)  # default
+        m.d.comb += wport.en.eq(0)  # default
+        with m.FSM(reset='IDLE'):
+            with m.State('IDLE'):
+                with m.If(strobe & ~self.wbus.we & ~hit):
+                    Fetch(m, line, False)
+                if self.prefetch:
+                    with m.Elif(strobe & ~self.wbus.we &
+                                prefetched.bit_select(index, 1)):
+                        m.d.sync += prefetched.bit_select(index, 1).eq(0)
+                        next_line = (line + 1)[:len(line)]
+                        with m.If(~LineHit(next_line)):
+                            Fetch(m, next_line, True)
+            with m.State('FILL'):
+                with m.If(master.rvalid):
+                    # Assemble little-endian words
+                    m.d.sync += fill_data.eq(Cat(fill_data[8:], master.rdata))
+                    m.d.sync += fill_byte.eq(fill_byte + 1)
+                    with m.If(fill_byte == 3):
+                        m.d.comb += [
+                            wport.addr.eq(Cat(fill_word, fill_index)),
+                            wport.data.eq(Cat(fill_data, master.rdata)),
+                            wport.en.eq(1),
+                        ]
+                        m.d.sync += fill_word.eq(fill_word + 1)
+                with m.If(master.done):
+                    m.d.sync += valid.bit_select(fill_index, 1).eq(1)
+                    m.d.sync += prefetched.bit_select(fill_index, 1).eq(
+                        prefetching)
+                    m.d.sync += tags[fill_index].eq(fill_tag)
+                    next_line = (fill_line + 1)[:len(line)]
+                    if self.prefetch:
+                        with m.If(~prefetching & ~LineHit(next_line)):
+                            Fetch(m, next_line, True)
+                        with m.Else():
+                            m.next = 'IDLE'
+                    else:
+                        m.next = 'IDLE'
+        return m
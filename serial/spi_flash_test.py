@@ -0,0 +1,139 @@
+"""Tests for nmigen_nexys.serial.spi_flash."""
+
+import os
+import random
+from typing import List, Optional
+import unittest
+
+from nmigen import *
+from nmigen.sim import *
+
+from nmigen_nexys.core import util
+from nmigen_nexys.serial import spi
+from nmigen_nexys.serial import spi_flash
+from nmigen_nexys.test import flash_model
+from nmigen_nexys.test import test_util
+
+
+class XIPCacheTest(unittest.TestCase):
+    """Read through the cache and count the resulting flash transactions."""
+
+    FLASH_OFFSET = 0x1000
+    SIZE = 0x400
+
+    def _run_test(self, addresses: List[int],
+                  command: spi_flash.ReadCommand = spi_flash.FAST_READ,
+                  prefetch: bool = True,
+                  write_address: Optional[int] = None,
+                  cycles: Optional[List[int]] = None):
+        m = Module()
+        bus = spi.QuadBus(
+            cs_n=Signal(name='cs', reset=1),
+            clk=Signal(name='spi_clk'),
+            dq_o=Signal(4, name='dq_o'),
+            dq_oe=Signal(4, name='dq_oe'),
+            dq_i=Signal(4, name='dq_i'),
+            freq_Hz=50_000_000)
+        m.submodules.xip = xip = spi_flash.XIPCache(
+            bus, self.SIZE, flash_offset=self.FLASH_OFFSET, command=command,
+            lines=4, line_words=4, prefetch=prefetch)
+        memory = bytearray(random.Random(0).randbytes(2 * self.FLASH_OFFSET))
+        log = []
+        m.submodules.timer = timer = test_util.Timer(self, timeout_s=100e-6)
+        sim = Simulator(m)
+        sim.add_clock(1.0 / util.SIMULATION_CLOCK_FREQUENCY)
+        wbus = xip.wbus
+
+        def Read(address: int):
+            # Model a few cycles of execution per instruction fetch
+            for _ in range(8):
+                yield
+            yield wbus.adr.eq(address >> 2)
+            yield wbus.we.eq(0)
+            yield wbus.cyc.eq(1)
+            yield wbus.stb.eq(1)
+            yield
+            yield from test_util.WaitSync(wbus.ack | wbus.err)
+            self.assertFalse((yield wbus.err))
+            data = yield wbus.dat_r
+            yield wbus.cyc.eq(0)
+            yield wbus.stb.eq(0)
+            yield
+            return data
+
+        def process():
+            if write_address is not None:
+                yield wbus.adr.eq(write_address >> 2)
+                yield wbus.we.eq(1)
+                yield wbus.cyc.eq(1)
+                yield wbus.stb.eq(1)
+                yield
+                yield from test_util.WaitSync(wbus.ack | wbus.err)
+                self.assertTrue((yield wbus.err))
+                yield wbus.cyc.eq(0)
+                yield wbus.stb.eq(0)
+                yield
+            start = yield timer.cycle_counter
+            for address in addresses:
+                data = yield from Read(address)
+                offset = self.FLASH_OFFSET + address
+                self.assertEqual(
+                    data,
+                    int.from_bytes(memory[offset:offset + 4], 'little'),
+                    f'address {address:#x}')
+            if cycles is not None:
+                cycles.append((yield timer.cycle_counter) - start)
+            # Let any prefetch finish
+            for _ in range(1000):
+                yield
+
+        sim.add_process(flash_model.FlashModel(bus, memory, log))
+        sim.add_process(timer.timeout_process)
+        sim.add_sync_process(process)
+        test_dir = test_util.BazelTestOutput(self.id())
+        os.makedirs(test_dir, exist_ok=True)
+        with sim.write_vcd(os.path.join(test_dir, "test.vcd"),
+                           os.path.join(test_dir, "test.gtkw"),
+                           traces=list(bus.fields.values())):
+            sim.run()
+        return [address - self.FLASH_OFFSET for _, address in log]
+
+    def test_sequential(self):
+        # Two passes over a loop of three lines, which fits in the cache
+        addresses = list(range(0, 48, 4)) * 2
+        for prefetch in [False, True]:
+            with self.subTest(prefetch=prefetch):
+                fetches = self._run_test(addresses, prefetch=prefetch)
+                # With prefetching, the line after the loop is also fetched
+                expected = [0x00, 0x10, 0x20]
+                if prefetch:
+                    expected.append(0x30)
+                self.assertEqual(fetches, expected)
+
+    def test_prefetch_latency(self):
+        # Prefetching overlaps line fills with execution
+        addresses = list(range(0, 64, 4))
+        cycles = []
+        for prefetch in [False, True]:
+            self._run_test(addresses, prefetch=prefetch, cycles=cycles)
+        self.assertLess(cycles[1], cycles[0])
+
+    def test_conflict(self):
+        # Lines 0x000 and 0x040 map to the same index
+        fetches = self._run_test([0x000, 0x040, 0x004, 0x044],
+                                 prefetch=False)
+        self.assertEqual(fetches, [0x000, 0x040, 0x000, 0x040])
+
+    def test_commands(self):
+        addresses = [0x3FC, 0x100, 0x104, 0x11C, 0x120]
+        for command in [spi_flash.READ, spi_flash.DUAL_OUTPUT_READ,
+                        spi_flash.QUAD_OUTPUT_READ, spi_flash.QUAD_IO_READ]:
+            with self.subTest(opcode=hex(command.opcode)):
+                self._run_test(addresses, command=command)
+
+    def test_write(self):
+        self._run_test([0x000], write_address=0x000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,7 @@
 """Tests for nmigen_nexys.serial.spi."""
 
 import os
-from typing import List, NamedTuple
+from typing import List, NamedTuple, Optional, Tuple
 import unittest
 
 from nmigen import *
@@ -11,6 +11,7 @@ from nmigen_nexys.core import edge
 from nmigen_nexys.core import shift_register
 from nmigen_nexys.core import util
 from nmigen_nexys.serial import spi
+from nmigen_nexys.test import flash_model
 from nmigen_nexys.test import test_util
 
 
@@ -187,6 +188,462 @@ class ShiftMasterSlaveTest(unittest.TestCase):
         self._run_test(EXAMPLES, 1, 1)
 
 
+def SlaveModel(bus: spi.Bus, polarity: int, responses: List[Example],
+               received: List[Tuple[int, int]], miso_latency: int = 0):
+    """Simulation only: behavioral slave for buses faster than ShiftSlave.
+
+    The bus is polled four times per system clock cycle, between clock edges.
+    MISO changes miso_latency quarter cycles after the trailing edge (or chip
+    select assertion) that launches it, modeling the round trip from the
+    master's clock output to its MISO input. Each transaction is recorded in
+    received as a (mosi_data, size) pair.
+    """
+    period = 1.0 / util.SIMULATION_CLOCK_FREQUENCY
+
+    def process():
+        yield Passive()
+        yield Delay(period / 2 + period / 8)
+        scheduled = []
+        step = 0
+        last_cs_n = 1
+        last_clk = polarity
+        responses_left = list(responses)
+        while True:
+            cs_n = yield bus.cs_n
+            clk = yield bus.clk
+            mosi = yield bus.mosi
+            if last_cs_n and not cs_n:
+                response = responses_left.pop(0)
+                bits = [(response.miso_data >> i) & 1
+                        for i in reversed(range(response.size))]
+                mosi_data = 0
+                size = 0
+                scheduled.append((step + miso_latency, bits.pop(0)))
+            elif not last_cs_n and cs_n:
+                received.append((mosi_data, size))
+            elif not cs_n and clk != last_clk:
+                if clk != polarity:  # Leading edge
+                    mosi_data = (mosi_data << 1) | mosi
+                    size += 1
+                elif bits:  # Trailing edge
+                    scheduled.append((step + miso_latency, bits.pop(0)))
+            while scheduled and scheduled[0][0] <= step:
+                yield bus.miso.eq(scheduled.pop(0)[1])
+            last_cs_n, last_clk = cs_n, clk
+            step += 1
+            yield Delay(period / 4)
+
+    return process
+
+
+class FastMasterTest(unittest.TestCase):
+    """Test the direct-clocked master against a behavioral slave."""
+
+    def _run_test(self, rate: spi.ClockRate, polarity: int = 0,
+                  miso_latency: int = 0, sample_delay: int = 0,
+                  examples: List[Example] = EXAMPLES) -> List[int]:
+        m = Module()
+        bus = spi.Bus(
+            cs_n=Signal(name='cs', reset=1),
+            clk=Signal(name='spi_clk'),
+            mosi=Signal(name='mosi'),
+            miso=Signal(name='miso'),
+            freq_Hz=0)
+        m.submodules.master = master = spi.FastMaster(bus, 16, rate)
+        m.d.comb += master.polarity.eq(polarity)
+        m.d.comb += master.sample_delay.eq(sample_delay)
+        sim = Simulator(m)
+        sim.add_clock(1.0 / util.SIMULATION_CLOCK_FREQUENCY)
+        received = []
+        actual = []
+
+        def master_proc():
+            for example in examples:
+                actual.append((yield from MasterDoOne(
+                    master.interface, example.mosi_data, example.size)))
+                # Let the slave see chip select deassert
+                yield
+
+        def timeout():
+            yield Passive()
+            yield Delay(10e-6)
+            self.fail('Timed out after 10 us')
+
+        sim.add_process(SlaveModel(bus, polarity, examples, received,
+                                   miso_latency))
+        sim.add_process(timeout)
+        sim.add_sync_process(master_proc)
+        test_dir = test_util.BazelTestOutput(self.id())
+        os.makedirs(test_dir, exist_ok=True)
+        with sim.write_vcd(os.path.join(test_dir, "test.vcd"),
+                           os.path.join(test_dir, "test.gtkw"),
+                           traces=list(bus.fields.values())):
+            sim.run()
+        self.assertEqual(received,
+                         [(e.mosi_data, e.size) for e in examples])
+        return actual
+
+    def test_half_rate(self):
+        for polarity in [0, 1]:
+            with self.subTest(polarity=polarity):
+                actual = self._run_test(spi.ClockRate.HALF, polarity)
+                self.assertEqual(actual, [e.miso_data for e in EXAMPLES])
+
+    def test_full_rate(self):
+        for polarity in [0, 1]:
+            with self.subTest(polarity=polarity):
+                actual = self._run_test(spi.ClockRate.FULL, polarity)
+                self.assertEqual(actual, [e.miso_data for e in EXAMPLES])
+
+    def test_sample_delay(self):
+        # A round trip of one and a half cycles needs one cycle of delay
+        for rate in spi.ClockRate:
+            with self.subTest(rate=rate):
+                actual = self._run_test(rate, miso_latency=6)
+                self.assertNotEqual(actual, [e.miso_data for e in EXAMPLES])
+                actual = self._run_test(rate, miso_latency=6, sample_delay=1)
+                self.assertEqual(actual, [e.miso_data for e in EXAMPLES])
+
+    def test_full_rate_hardware(self):
+        def Elaborate(cls):
+            bus = spi.Bus(cs_n=Signal(reset=1), clk=Signal(), mosi=Signal(),
+                          miso=Signal(), freq_Hz=0)
+            # Only the presence of a platform matters for the clock output
+            return Fragment.get(cls(bus, 16, spi.ClockRate.FULL),
+                                platform=object())
+
+        with self.assertRaises(AssertionError):
+            Elaborate(spi.FastMaster)
+        Elaborate(spi.XilinxFastMaster)
+
+
+class StreamMasterTest(unittest.TestCase):
+    """Test packetization of the streaming master."""
+
+    def _run_test(self, packets: List[bytes], frames: List[bytes],
+                  max_burst: Optional[int] = None, gap: int = 0):
+        m = Module()
+        bus = spi.Bus(
+            cs_n=Signal(name='cs', reset=1),
+            clk=Signal(name='spi_clk'),
+            mosi=Signal(name='mosi'),
+            miso=Signal(name='miso'),
+            freq_Hz=25_000_000)
+        m.submodules.master = master = spi.StreamMaster(
+            bus, fifo_depth=4, max_burst=max_burst)
+        sim = Simulator(m)
+        sim.add_clock(1.0 / util.SIMULATION_CLOCK_FREQUENCY)
+        # The slave answers each frame with the bitwise complement
+        responses = [
+            Example(0, int.from_bytes(bytes(~b & 0xFF for b in frame), 'big'),
+                    8 * len(frame))
+            for frame in frames
+        ]
+        received = []
+        miso = bytearray()
+
+        def write():
+            for packet in packets:
+                for i, byte in enumerate(packet):
+                    yield master.data.eq(byte)
+                    yield master.last.eq(i == len(packet) - 1)
+                    yield master.valid.eq(1)
+                    yield
+                    while not (yield master.ready):
+                        yield
+                    yield master.valid.eq(0)
+                    for _ in range(gap):
+                        yield
+            yield master.valid.eq(0)
+            yield Settle()
+            while (yield master.busy):
+                yield
+                yield Settle()
+            # Let the slave see chip select deassert
+            yield
+
+        def read():
+            yield Passive()
+            while True:
+                if (yield master.miso_valid):
+                    miso.append((yield master.miso_data))
+                yield
+
+        def timeout():
+            yield Passive()
+            yield Delay(20e-6)
+            self.fail('Timed out after 20 us')
+
+        sim.add_process(SlaveModel(bus, 0, responses, received))
+        sim.add_process(timeout)
+        sim.add_sync_process(write)
+        sim.add_sync_process(read)
+        test_dir = test_util.BazelTestOutput(self.id())
+        os.makedirs(test_dir, exist_ok=True)
+        with sim.write_vcd(os.path.join(test_dir, "test.vcd"),
+                           os.path.join(test_dir, "test.gtkw"),
+                           traces=list(bus.fields.values())):
+            sim.run()
+        self.assertEqual(
+            received,
+            [(int.from_bytes(frame, 'big'), 8 * len(frame))
+             for frame in frames])
+        self.assertEqual(bytes(miso),
+                         bytes(~b & 0xFF for b in b''.join(frames)))
+
+    def test_packets(self):
+        packets = [b'\x01\x02\x03\x04\x05\x06', b'\xAA', b'\x55\x0F']
+        self._run_test(packets, packets)
+
+    def test_max_burst(self):
+        self._run_test([b'\x01\x02\x03\x04\x05'],
+                       [b'\x01\x02', b'\x03\x04', b'\x05'], max_burst=2)
+
+    def test_underrun(self):
+        # Chip select is held while the writer falls behind
+        packets = [b'\x01\x02\x03', b'\x04']
+        self._run_test(packets, packets, gap=40)
+
+
+class QuadMasterTest(unittest.TestCase):
+    """Test the multi-lane master against a behavioral flash model."""
+
+    def _run_test(self, transactions: List[Tuple[int, int, bytes]],
+                  memory: bytearray) -> List[bytes]:
+        """Run (command, address, data) transactions, returning read data.
+
+        For reads, the length of data gives the number of bytes to read.
+        """
+        m = Module()
+        bus = spi.QuadBus(
+            cs_n=Signal(name='cs', reset=1),
+            clk=Signal(name='spi_clk'),
+            dq_o=Signal(4, name='dq_o'),
+            dq_oe=Signal(4, name='dq_oe'),
+            dq_i=Signal(4, name='dq_i'),
+            freq_Hz=25_000_000)
+        m.submodules.master = master = spi.QuadMaster(bus)
+        sim = Simulator(m)
+        sim.add_clock(1.0 / util.SIMULATION_CLOCK_FREQUENCY)
+        results = []
+
+        def process():
+            for opcode, address, data in transactions:
+                command = flash_model.COMMANDS[opcode]
+                if command.address_bits == 32:
+                    # Mode byte for a single quad I/O read
+                    address = (address << 8) | 0xFF
+                yield from master.SetMode(command.mode)
+                yield master.command.eq(opcode)
+                yield master.address.eq(address)
+                yield master.address_bits.eq(command.address_bits)
+                yield master.dummy_cycles.eq(command.dummy_cycles)
+                yield master.write.eq(command.write)
+                yield master.length.eq(len(data))
+                yield master.start.eq(1)
+                yield
+                yield master.start.eq(0)
+                received = bytearray()
+                to_write = list(data) if command.write else []
+                while True:
+                    yield master.wdata.eq(to_write[0] if to_write else 0)
+                    yield master.wvalid.eq(bool(to_write))
+                    yield Settle()
+                    if (yield master.wready) and to_write:
+                        to_write.pop(0)
+                    if (yield master.rvalid):
+                        received.append((yield master.rdata))
+                    if (yield master.done):
+                        break
+                    yield
+                yield master.wvalid.eq(0)
+                yield
+                results.append(bytes(received))
+
+        def timeout():
+            yield Passive()
+            yield Delay(50e-6)
+            self.fail('Timed out after 50 us')
+
+        sim.add_process(flash_model.FlashModel(bus, memory))
+        sim.add_process(timeout)
+        sim.add_sync_process(process)
+        test_dir = test_util.BazelTestOutput(self.id())
+        os.makedirs(test_dir, exist_ok=True)
+        with sim.write_vcd(os.path.join(test_dir, "test.vcd"),
+                           os.path.join(test_dir, "test.gtkw"),
+                           traces=list(bus.fields.values())):
+            sim.run()
+        return results
+
+    def test_reads(self):
+        memory = bytearray(range(256)) * 4
+        for opcode in [0x03, 0x0B, 0x3B, 0x6B, 0xEB]:
+            with self.subTest(command=hex(opcode)):
+                results = self._run_test([(opcode, 0x123, bytes(6))], memory)
+                self.assertEqual(results, [memory[0x123:0x129]])
+
+    def test_program(self):
+        memory = bytearray(1024)
+        data = b'\xDE\xAD\xBE\xEF'
+        results = self._run_test(
+            [(0x02, 0x200, data), (0xEB, 0x1FF, bytes(6))], memory)
+        self.assertEqual(memory[0x200:0x204], data)
+        self.assertEqual(results[1], b'\x00' + data + b'\x00')
+
+
+class StreamSlaveTest(unittest.TestCase):
+    """Send frames from the streaming master to the streaming slave."""
+
+    def _run_test(self, packets: List[bytes], responses: bytes,
+                  rx_fifo_depth: int = 4, drain: bool = True):
+        m = Module()
+        bus = spi.Bus(
+            cs_n=Signal(name='cs', reset=1),
+            clk=Signal(name='spi_clk'),
+            mosi=Signal(name='mosi'),
+            miso=Signal(name='miso'),
+            freq_Hz=10_000_000)
+        m.submodules.master = master = spi.StreamMaster(bus, fifo_depth=4)
+        m.submodules.slave = slave = spi.StreamSlave(
+            bus, rx_fifo_depth=rx_fifo_depth, tx_fifo_depth=4, idle_word=0xFF)
+        sim = Simulator(m)
+        sim.add_clock(1.0 / util.SIMULATION_CLOCK_FREQUENCY)
+        rx = []
+        miso = bytearray()
+        flags = []
+
+        def write():
+            for packet in packets:
+                for i, byte in enumerate(packet):
+                    yield master.data.eq(byte)
+                    yield master.last.eq(i == len(packet) - 1)
+                    yield master.valid.eq(1)
+                    yield
+                    while not (yield master.ready):
+                        yield
+            yield master.valid.eq(0)
+            yield Settle()
+            while (yield master.busy):
+                yield
+                yield Settle()
+            # Let the slave see chip select deassert
+            for _ in range(4):
+                yield
+            # Collect whatever is left in the RX FIFO
+            yield slave.rx_ready.eq(1)
+            for _ in range(rx_fifo_depth + 2):
+                yield
+
+        def read_miso():
+            yield Passive()
+            while True:
+                if (yield master.miso_valid):
+                    miso.append((yield master.miso_data))
+                yield
+
+        def respond():
+            yield Passive()
+            for byte in responses:
+                yield slave.tx_data.eq(byte)
+                yield slave.tx_valid.eq(1)
+                yield
+                while not (yield slave.tx_ready):
+                    yield
+            yield slave.tx_valid.eq(0)
+
+        def receive():
+            yield Passive()
+            yield slave.rx_ready.eq(drain)
+            while True:
+                yield Settle()
+                if (yield slave.rx_valid) and (yield slave.rx_ready):
+                    rx.append(((yield slave.rx_data), (yield slave.rx_first)))
+                if (yield slave.done):
+                    flags.append(((yield slave.underrun),
+                                  (yield slave.overrun),
+                                  (yield slave.partial)))
+                yield
+
+        def timeout():
+            yield Passive()
+            yield Delay(50e-6)
+            self.fail('Timed out after 50 us')
+
+        sim.add_process(timeout)
+        sim.add_sync_process(write)
+        sim.add_sync_process(read_miso)
+        sim.add_sync_process(respond)
+        sim.add_sync_process(receive)
+        test_dir = test_util.BazelTestOutput(self.id())
+        os.makedirs(test_dir, exist_ok=True)
+        with sim.write_vcd(os.path.join(test_dir, "test.vcd"),
+                           os.path.join(test_dir, "test.gtkw"),
+                           traces=list(bus.fields.values())):
+            sim.run()
+        return rx, bytes(miso), flags
+
+    def test_frames(self):
+        # Frames longer than either FIFO
+        packets = [bytes(range(1, 21)), b'\xAA', bytes(range(0x80, 0x88))]
+        responses = bytes(~b & 0xFF for b in b''.join(packets))
+        rx, miso, flags = self._run_test(packets, responses)
+        self.assertEqual(
+            rx, [(b, int(i == 0)) for p in packets for i, b in enumerate(p)])
+        self.assertEqual(miso, responses)
+        self.assertEqual(flags, [(0, 0, 0)] * len(packets))
+
+    def test_underrun(self):
+        packets = [b'\x01\x02', b'\x03\x04\x05']
+        rx, miso, flags = self._run_test(packets, b'\x11\x22\x33')
+        self.assertEqual([b for b, _ in rx], [1, 2, 3, 4, 5])
+        self.assertEqual(miso, b'\x11\x22\x33\xFF\xFF')
+        self.assertEqual(flags, [(0, 0, 0), (1, 0, 0)])
+
+    def test_overrun(self):
+        packets = [bytes(range(1, 9))]
+        rx, _, flags = self._run_test(packets, b'', rx_fifo_depth=2,
+                                      drain=False)
+        self.assertLess(len(rx), 8)
+        self.assertEqual(rx, [(b, int(b == 1)) for b in packets[0][:len(rx)]])
+        self.assertEqual(flags, [(1, 1, 0)])
+
+    def test_partial(self):
+        m = Module()
+        bus = spi.Bus(
+            cs_n=Signal(name='cs'),
+            clk=Signal(name='spi_clk'),
+            mosi=Signal(name='mosi'),
+            miso=Signal(name='miso'),
+            freq_Hz=10_000_000)
+        m.submodules.master = master = spi.ShiftMaster(
+            bus, shift_register.Up(16))
+        m.submodules.slave = slave = spi.StreamSlave(bus)
+        sim = Simulator(m)
+        sim.add_clock(1.0 / util.SIMULATION_CLOCK_FREQUENCY)
+
+        def process():
+            yield from MasterDoOne(master.interface, 0xABC, 12)
+            yield
+            yield Settle()
+            self.assertTrue((yield slave.partial))
+            yield from MasterDoOne(master.interface, 0x1234, 16)
+            yield
+            yield Settle()
+            self.assertFalse((yield slave.partial))
+            rx = []
+            yield slave.rx_ready.eq(1)
+            for _ in range(4):
+                yield Settle()
+                if (yield slave.rx_valid):
+                    rx.append(((yield slave.rx_data), (yield slave.rx_first)))
+                yield
+            self.assertEqual(rx, [(0xAB, 1), (0x12, 1), (0x34, 0)])
+
+        sim.add_sync_process(process)
+        sim.run()
+
+
 class NoChipSelectTest(unittest.TestCase):
     """Validates slave behavior when chip select is deasserted."""
 
@@ -262,7 +719,8 @@ class NoChipSelectTest(unittest.TestCase):
 class MultiplexerTest(unittest.TestCase):
     """Test application-side multiplexing."""
 
-    def test_multiplexer(self):
+    def _test_multiplexer(self, one_hot: bool = False,
+                          pipeline_levels: Optional[int] = None):
         m = Module()
         bus = spi.Bus(
             cs_n=Signal(name='cs'),
@@ -275,7 +733,9 @@ class MultiplexerTest(unittest.TestCase):
         m.submodules.slave = slave = spi.ShiftSlave(
             bus, shift_register.Up(16))
         m.submodules.mux = mux = master.Multiplexer(
-            len(EXAMPLES), master.interface)
+            len(EXAMPLES), master.interface, one_hot=one_hot,
+            pipeline_levels=pipeline_levels)
+        index = lambda n: 1 << n if one_hot else n
         master_finish = [Signal(reset=0) for _ in range(mux.n)]
         slave_finish = Signal(reset=0)
         finish = Signal()
@@ -287,12 +747,12 @@ class MultiplexerTest(unittest.TestCase):
             def process():
                 yield Passive()
                 example = EXAMPLES[n]
-                yield from test_util.WaitSync(mux.select == n)
+                yield from test_util.WaitSync(mux.select == index(n))
                 actual = yield from MasterDoOne(
                     mux.interfaces[n], example.mosi_data, example.size)
                 self.assertEqual(actual, example.miso_data)
                 yield master_finish[n].eq(1)
-                yield mux.select.eq(mux.select + 1)
+                yield mux.select.eq(index(n + 1))
             return process
 
         def slave_proc():
@@ -327,6 +787,18 @@ class MultiplexerTest(unittest.TestCase):
                            traces=list(bus.fields.values())):
             sim.run()
 
+    def test_multiplexer(self):
+        self._test_multiplexer()
+
+    def test_one_hot(self):
+        self._test_multiplexer(one_hot=True)
+
+    def test_pipelined(self):
+        self._test_multiplexer(pipeline_levels=1)
+
+    def test_one_hot_pipelined(self):
+        self._test_multiplexer(one_hot=True, pipeline_levels=2)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,10 +1,14 @@
 """Basic UART frontend implementations."""
 
+import enum
 import fractions
+from typing import NamedTuple, Optional
 
 from nmigen import *
 from nmigen.build import *
 from nmigen.lib.cdc import *
+from nmigen.lib.fifo import SyncFIFOBuffered
+from nmigen.utils import log2_int
 
 from nmigen_nexys.core import edge
 from nmigen_nexys.core import shift_register
@@ -12,52 +16,137 @@ from nmigen_nexys.core import timer as timer_module
 from nmigen_nexys.core import util
 
 
+# Runtime divisors are in clock cycles per bit, with this many fractional bits
+DIVISOR_FRACTION_BITS = 3
+# Wide enough for 9600 baud at 100 MHz, with room to spare
+DIVISOR_WIDTH = 16 + DIVISOR_FRACTION_BITS
+
+
+def Divisor(clk_freq: int, baud_rate: int) -> int:
+    """The runtime divisor value for baud_rate."""
+    return round(fractions.Fraction(clk_freq, baud_rate) *
+                 2**DIVISOR_FRACTION_BITS)
+
+
+def _BitTimer(platform: Platform, baud_rate: Optional[int],
+              divisor: Optional[Value], ticks_per_bit: int,
+              max_denominator: int = 10) -> Elaboratable:
+    """Timer triggering ticks_per_bit times per bit period.
+
+    The timer has a fixed period if baud_rate is given, or follows the runtime
+    divisor otherwise. Runtime divisors only support powers of two for
+    ticks_per_bit.
+    """
+    if divisor is None:
+        return timer_module.UpTimer(
+            period=fractions.Fraction(util.GetClockFreq(platform),
+                                      ticks_per_bit * baud_rate),
+            max_denominator=max_denominator)
+    return timer_module.FractionalTimer(
+        divisor, DIVISOR_FRACTION_BITS + log2_int(ticks_per_bit))
+
+
+class Parity(enum.Enum):
+    """Parity bit generation and checking."""
+    NONE = 0
+    EVEN = 1
+    ODD = 2
+
+
+class Framing(NamedTuple):
+    """UART frame format.
+
+    The default is 8N1: eight data bits, no parity, and one stop bit.
+    """
+    data_bits: int = 8
+    parity: Parity = Parity.NONE
+    stop_bits: int = 1
+
+    @property
+    def parity_bits(self) -> int:
+        return 0 if self.parity == Parity.NONE else 1
+
+    @property
+    def frame_bits(self) -> int:
+        """Number of bit periods in a transmitted frame."""
+        return 1 + self.data_bits + self.parity_bits + self.stop_bits
+
+    def ParityBit(self, data: Value) -> Value:
+        """The parity bit accompanying data."""
+        assert self.parity != Parity.NONE
+        return data.xor() if self.parity == Parity.EVEN else ~data.xor()
+
+
 class Transmit(Elaboratable):
     """UART transmitter implementation.
 
     This transmitter runs at a fixed baud rate and operates on one byte at a
-    time. Any data queueing must be handled by and external FIFO.
+    time. A start strobe is accepted whenever ready is asserted, which includes
+    the last cycle of the stop bit; starting then sends the next frame with no
+    gap between them. See StreamTransmit for a FIFO-buffered version.
+
+    Instead of a baud rate, a runtime divisor (see Divisor) may be given to
+    allow the rate to be changed without resynthesis.
     """
 
-    def __init__(self, baud_rate: int):
+    def __init__(self, baud_rate: Optional[int], framing: Framing = Framing(),
+                 divisor: Optional[Value] = None):
         super().__init__()
+        assert (baud_rate is None) != (divisor is None)
         self.baud_rate = baud_rate
-        self.data = Signal(8)
+        self.divisor = divisor
+        self.framing = framing
+        self.data = Signal(framing.data_bits)
         self.start = Signal()
+        self.ready = Signal()
         self.busy = Signal(reset=0)
         self.done = Signal(reset=0)
         self.output = Signal(reset=1)
 
     def elaborate(self, platform: Platform) -> Module:
         m = Module()
-        m.submodules.timer = timer = timer_module.UpTimer(
-            period=fractions.Fraction(util.GetClockFreq(platform),
-                                      self.baud_rate))
-        m.submodules.symbols = symbols = shift_register.Down(10, reset=0x3FF)
-        m.d.comb += symbols.word_in.eq(Cat(C(0, 1), self.data, C(1, 1)))
+        m.submodules.timer = timer = _BitTimer(
+            platform, self.baud_rate, self.divisor, 1)
+        nbits = self.framing.frame_bits
+        m.submodules.symbols = symbols = shift_register.Down(
+            nbits, reset=2**nbits - 1)
+        parity = []
+        if self.framing.parity != Parity.NONE:
+            parity = [self.framing.ParityBit(self.data)]
+        m.d.comb += symbols.word_in.eq(
+            Cat(C(0, 1), self.data, *parity,
+                C(2**self.framing.stop_bits - 1, self.framing.stop_bits)))
         m.d.comb += symbols.bit_in.eq(1)
         m.d.comb += symbols.shift.eq(self.busy & timer.triggered)
         m.d.comb += self.output.eq(symbols.bit_out)
-        remaining = Signal(range(10 + 1))
+        remaining = Signal(range(nbits + 1))
 
         m.d.comb += timer.reload.eq(0)  # default
         m.d.comb += symbols.latch.eq(0)  # default
         m.d.sync += self.done.eq(0)  # default
+        m.d.comb += self.ready.eq(0)  # default
         with m.FSM(reset='IDLE'):
             with m.State('IDLE'):
+                m.d.comb += self.ready.eq(1)
                 with m.If(self.start):
                     m.d.sync += self.busy.eq(1)
                     m.d.comb += timer.reload.eq(1)
                     m.d.comb += symbols.latch.eq(1)
-                    m.d.sync += remaining.eq(10)
+                    m.d.sync += remaining.eq(nbits)
                     m.next = 'RUN'
             with m.State('RUN'):
                 with m.If(timer.triggered):
                     m.d.sync += remaining.eq(remaining - 1)
                     with m.If(remaining == 1):
-                        m.d.sync += self.busy.eq(0)
+                        m.d.comb += self.ready.eq(1)
                         m.d.sync += self.done.eq(1)
-                        m.next = 'IDLE'
+                        with m.If(self.start):
+                            # Back-to-back frame: keep the timer running
+                            m.d.comb += symbols.latch.eq(1)
+                            m.d.sync += remaining.eq(nbits)
+                        with m.Else():
+                            m.d.sync += self.busy.eq(0)
+                            m.next = 'IDLE'
         return m
 
 
@@ -65,34 +154,62 @@ class Receive(Elaboratable):
     """UART receiver implementation.
 
     This receiver runs at a fixed baud rate and operates on one byte at a time.
-    Any data queueing must be handled by and external FIFO.
+    See StreamReceive for a FIFO-buffered version.
+
+    Only the first stop bit is checked, so frames with more stop bits than
+    configured are also accepted. The data and error signals are valid while
+    done is asserted. The error signal is the union of parity_error and
+    framing_error, the latter indicating a missing stop bit.
+
+    As with Transmit, a runtime divisor may be given instead of a baud rate.
     """
 
-    def __init__(self, baud_rate: int):
+    def __init__(self, baud_rate: Optional[int], framing: Framing = Framing(),
+                 divisor: Optional[Value] = None):
         super().__init__()
+        assert (baud_rate is None) != (divisor is None)
         self.baud_rate = baud_rate
+        self.divisor = divisor
+        self.framing = framing
         self.input = Signal()
-        self.data = Signal(8, reset=0)
+        self.data = Signal(framing.data_bits, reset=0)
         self.start = Signal(reset=0)
         self.busy = Signal(reset=0)
         self.done = Signal(reset=0)
         self.error = Signal(reset=0)
+        self.parity_error = Signal(reset=0)
+        self.framing_error = Signal(reset=0)
+
+    @property
+    def _sampled_bits(self) -> int:
+        """Bits sampled per frame: start, data, parity, and one stop bit."""
+        return 1 + self.framing.data_bits + self.framing.parity_bits + 1
+
+    def _CheckFrame(self, m: Module, bits: Value):
+        """Decode the data, parity, and stop bits following the start bit."""
+        data_bits = self.framing.data_bits
+        m.d.comb += self.data.eq(bits[:data_bits])
+        if self.framing.parity != Parity.NONE:
+            m.d.comb += self.parity_error.eq(
+                bits[data_bits] != self.framing.ParityBit(self.data))
+        m.d.comb += self.framing_error.eq(~bits[-1])
+        m.d.comb += self.error.eq(self.parity_error | self.framing_error)
 
     def elaborate(self, platform: Platform) -> Module:
         m = Module()
         input_sync = Signal()
         m.submodules.input_synchronizer = FFSynchronizer(
             i=self.input, o=input_sync, reset=1)
-        m.submodules.timer = timer = timer_module.UpTimer(
-            period=fractions.Fraction(util.GetClockFreq(platform),
-                                      2 * self.baud_rate))
-        m.submodules.symbols = symbols = shift_register.Down(10)
+        m.submodules.timer = timer = _BitTimer(
+            platform, self.baud_rate, self.divisor, 2)
+        nbits = self._sampled_bits
+        m.submodules.symbols = symbols = shift_register.Down(nbits)
         m.submodules.in_edge = in_edge = edge.Detector(input_sync)
-        remaining = Signal(range(19 + 1))
+        remaining = Signal(range(2 * nbits))
         sample = timer.triggered & remaining[0]
         m.d.comb += self.start.eq(in_edge.fell & ~self.busy)
         m.d.comb += timer.reload.eq(self.start)
-        m.d.comb += self.data.eq(symbols.word_out[1:-1])
+        self._CheckFrame(m, symbols.word_out[1:])
         m.d.comb += symbols.bit_in.eq(input_sync)
         m.d.comb += symbols.shift.eq(self.busy & sample)
 
@@ -101,7 +218,7 @@ class Receive(Elaboratable):
             with m.State('IDLE'):
                 with m.If(self.start):
                     m.d.sync += self.busy.eq(1)
-                    m.d.sync += remaining.eq(19)
+                    m.d.sync += remaining.eq(2 * nbits - 1)
                     m.next = 'RUN'
             with m.State('RUN'):
                 with m.If(timer.triggered):
@@ -111,3 +228,354 @@ class Receive(Elaboratable):
                         m.d.sync += self.done.eq(1)
                         m.next = 'IDLE'
         return m
+
+
+class OversamplingReceive(Receive):
+    """UART receiver with majority voting and edge resynchronization.
+
+    The line is sampled oversampling times per bit, and each bit is decided by
+    a majority vote of the three samples around its center. The bit phase is
+    reset on every transition within the frame, so timing error only
+    accumulates across runs of identical bits rather than across the whole
+    frame. The oversampling ratio must be at least three and cannot exceed the
+    number of clock cycles per bit. With a runtime divisor, the oversampling
+    ratio must also be a power of two.
+    """
+
+    def __init__(self, baud_rate: Optional[int], oversampling: int = 8,
+                 framing: Framing = Framing(),
+                 divisor: Optional[Value] = None):
+        super().__init__(baud_rate, framing, divisor)
+        assert oversampling >= 3
+        self.oversampling = oversampling
+
+    def elaborate(self, platform: Platform) -> Module:
+        m = Module()
+        input_sync = Signal()
+        m.submodules.input_synchronizer = FFSynchronizer(
+            i=self.input, o=input_sync, reset=1)
+        if self.divisor is None:
+            tick_period = fractions.Fraction(
+                util.GetClockFreq(platform), self.oversampling * self.baud_rate)
+            assert tick_period >= 1, 'Oversampling ratio is too high'
+        m.submodules.timer = timer = _BitTimer(
+            platform, self.baud_rate, self.divisor, self.oversampling,
+            max_denominator=64)
+        tick = timer.triggered
+        # Previous two samples, most recent first
+        history = Signal(2, reset=0b11)
+        with m.If(tick):
+            m.d.sync += history.eq(Cat(input_sync, history[0]))
+        a, b, c = input_sync, history[0], history[1]
+        # The majority of the last three samples serves both as the filtered
+        # line state and, at the center of each bit, as the bit decision
+        vote = Signal()
+        last_vote = Signal(reset=1)
+        m.d.comb += vote.eq((a & b) | (a & c) | (b & c))
+        with m.If(tick):
+            m.d.sync += last_vote.eq(vote)
+        # Single-sample glitches are rejected by the filter, so they do not
+        # disturb the phase
+        edge = Signal()
+        m.d.comb += edge.eq(tick & (vote != last_vote))
+        # Sample phase within the bit. The filtered edge is seen on the second
+        # sample after the transition, i.e. at phase 1.
+        phase = Signal(range(self.oversampling), reset=0)
+        sample_phase = (self.oversampling - 1) // 2 + 1
+        sample = tick & (phase == sample_phase)
+        nbits = self._sampled_bits
+        index = Signal(range(nbits), reset=0)
+        # Bits following the start bit, shifted in from the top
+        bits = Signal(nbits - 1, reset=0)
+        self._CheckFrame(m, bits)
+        m.d.comb += self.start.eq(edge & ~vote & ~self.busy)
+        with m.If(edge):
+            m.d.sync += phase.eq(2)
+        with m.Elif(tick):
+            m.d.sync += phase.eq(Mux(phase == self.oversampling - 1, 0,
+                                     phase + 1))
+
+        m.d.sync += self.done.eq(0)  # default
+        with m.FSM(reset='IDLE'):
+            with m.State('IDLE'):
+                with m.If(self.start):
+                    m.d.sync += self.busy.eq(1)
+                    m.d.sync += index.eq(0)
+                    m.next = 'RUN'
+            with m.State('RUN'):
+                with m.If(sample):
+                    m.d.sync += index.eq(index + 1)
+                    with m.If(index == 0):
+                        with m.If(vote):
+                            # False start
+                            m.d.sync += self.busy.eq(0)
+                            m.next = 'IDLE'
+                    with m.Else():
+                        m.d.sync += bits.eq(Cat(bits[1:], vote))
+                    with m.If(index == nbits - 1):
+                        m.d.sync += self.busy.eq(0)
+                        m.d.sync += self.done.eq(1)
+                        m.next = 'IDLE'
+        return m
+
+
+class AutobaudReceive(Elaboratable):
+    """UART receiver that measures the baud rate from a sync character.
+
+    After reset, or when relock is strobed, the receiver waits for a 0x55 ('U')
+    sync character. Its start and data bits alternate, so the first and fifth
+    falling edges of the frame are exactly eight bit periods apart; a capture
+    counter between the two yields the divisor directly with three fractional
+    bits. Every edge in between must follow the previous one by the length of
+    the start bit, to within a quarter bit, so other characters and line noise
+    are rejected. A falling edge that breaks the pattern starts a new
+    measurement. Measurements of fewer than eight cycles per bit, or that
+    overflow the counter, are also discarded. Note that a character whose
+    last data bit is zero, sent back to back with the sync character, is
+    indistinguishable from a sync character two bits earlier, so the sync
+    character should follow an idle line.
+
+    The sync character is consumed. Once its stop bit begins, locked is
+    asserted and subsequent frames are received by OversamplingReceive at the
+    measured rate. The detected divisor is exposed so that, for example, a
+    Transmit can answer at the same rate.
+    """
+
+    def __init__(self, framing: Framing = Framing()):
+        super().__init__()
+        assert framing.data_bits >= 8
+        self.framing = framing
+        self.input = Signal()
+        self.relock = Signal()
+        self.locked = Signal(reset=0)
+        self.divisor = Signal(DIVISOR_WIDTH, reset=0)
+        self.data = Signal(framing.data_bits)
+        self.busy = Signal()
+        self.done = Signal()
+        self.error = Signal()
+
+    def elaborate(self, _: Platform) -> Module:
+        m = Module()
+        input_sync = Signal()
+        m.submodules.input_synchronizer = FFSynchronizer(
+            i=self.input, o=input_sync, reset=1)
+        m.submodules.in_edge = in_edge = edge.Detector(input_sync)
+        # Hold the receiver in reset until it has a divisor to work with
+        rx = OversamplingReceive(None, 8, self.framing, self.divisor)
+        m.submodules.rx = rx = ResetInserter(~self.locked)(rx)
+        m.d.comb += [
+            rx.input.eq(self.input),
+            self.data.eq(rx.data),
+            self.busy.eq(rx.busy),
+            self.done.eq(rx.done),
+            self.error.eq(rx.error),
+        ]
+        count = Signal(DIVISOR_WIDTH)
+        last_edge = Signal(DIVISOR_WIDTH)
+        interval = Signal(DIVISOR_WIDTH)
+        bit_period = Signal(DIVISOR_WIDTH)
+        tolerance = bit_period >> 2
+        edges = Signal(range(8))
+        m.d.comb += interval.eq(count - last_edge)
+        with m.FSM(reset='IDLE'):
+            with m.State('IDLE'):
+                m.d.sync += self.locked.eq(0)
+                with m.If(in_edge.fell):
+                    m.d.sync += count.eq(1)
+                    m.d.sync += last_edge.eq(0)
+                    m.d.sync += edges.eq(0)
+                    m.next = 'MEASURE'
+            with m.State('MEASURE'):
+                m.d.sync += count.eq(count + 1)
+                with m.If(count == 2**DIVISOR_WIDTH - 1):
+                    m.next = 'IDLE'
+                with m.Elif(in_edge.fell | in_edge.rose):
+                    m.d.sync += last_edge.eq(count)
+                    m.d.sync += edges.eq(edges + 1)
+                    with m.If(edges == 0):
+                        # End of the start bit
+                        m.d.sync += bit_period.eq(interval)
+                    with m.Elif((interval > bit_period + tolerance) |
+                                (interval + tolerance < bit_period)):
+                        with m.If(in_edge.fell):
+                            # This may be the start bit of the sync character
+                            m.d.sync += count.eq(1)
+                            m.d.sync += last_edge.eq(0)
+                            m.d.sync += edges.eq(0)
+                        with m.Else():
+                            m.next = 'IDLE'
+                    with m.Elif(edges == 7):
+                        with m.If(count < 8 << DIVISOR_FRACTION_BITS):
+                            m.next = 'IDLE'
+                        with m.Else():
+                            m.d.sync += self.divisor.eq(count)
+                            m.next = 'SETTLE'
+            with m.State('SETTLE'):
+                # Release the receiver once the line idles in the stop bit
+                with m.If(in_edge.rose):
+                    m.d.sync += self.locked.eq(1)
+                    m.next = 'LOCKED'
+            with m.State('LOCKED'):
+                with m.If(self.relock):
+                    m.d.sync += self.locked.eq(0)
+                    m.next = 'IDLE'
+        return m
+
+
+class AddressFilter(Elaboratable):
+    """Hardware address matching for 9-bit multidrop buses.
+
+    On a multidrop bus, frames with the ninth data bit set carry a device
+    address, and frames with it clear carry data for the most recently
+    addressed device. This filter consumes address frames and forwards the low
+    eight bits of data frames only while the last address matched address (or
+    broadcast, if given).
+    """
+
+    def __init__(self, broadcast: Optional[int] = None):
+        super().__init__()
+        self.broadcast = broadcast
+        self.address = Signal(8)
+        self.data_in = Signal(9)
+        self.strobe_in = Signal()
+        self.data_out = Signal(8)
+        self.strobe_out = Signal()
+        self.selected = Signal(reset=0)
+
+    def elaborate(self, _: Platform) -> Module:
+        m = Module()
+        is_address = self.data_in[8]
+        match = self.data_in[:8] == self.address
+        if self.broadcast is not None:
+            match |= self.data_in[:8] == self.broadcast
+        with m.If(self.strobe_in & is_address):
+            m.d.sync += self.selected.eq(match)
+        m.d.comb += [
+            self.data_out.eq(self.data_in[:8]),
+            self.strobe_out.eq(self.strobe_in & ~is_address & self.selected),
+        ]
+        return m
+
+
+class StreamTransmit(Elaboratable):
+    """FIFO-buffered UART transmitter.
+
+    Words are accepted on the data/valid/ready stream interface whenever the
+    FIFO has space, and are sent back-to-back at the full line rate for as long
+    as the FIFO is non-empty.
+    """
+
+    def __init__(self, baud_rate: Optional[int], fifo_depth: int = 16,
+                 framing: Framing = Framing(),
+                 divisor: Optional[Value] = None):
+        super().__init__()
+        self.baud_rate = baud_rate
+        self.divisor = divisor
+        self.fifo_depth = fifo_depth
+        self.framing = framing
+        self.data = Signal(framing.data_bits)
+        self.valid = Signal()
+        self.ready = Signal()
+        self.busy = Signal()
+        self.output = Signal()
+
+    def elaborate(self, _: Platform) -> Module:
+        m = Module()
+        m.submodules.fifo = fifo = SyncFIFOBuffered(
+            width=self.framing.data_bits, depth=self.fifo_depth)
+        m.submodules.tx = tx = Transmit(self.baud_rate, self.framing,
+                                        self.divisor)
+        m.d.comb += [
+            fifo.w_data.eq(self.data),
+            fifo.w_en.eq(self.valid),
+            self.ready.eq(fifo.w_rdy),
+            tx.data.eq(fifo.r_data),
+            tx.start.eq(fifo.r_rdy & tx.ready),
+            fifo.r_en.eq(tx.start),
+            self.busy.eq(tx.busy | (fifo.level != 0)),
+            self.output.eq(tx.output),
+        ]
+        return m
+
+
+class StreamReceive(Elaboratable):
+    """FIFO-buffered UART receiver.
+
+    Received words are presented on the data/valid/ready stream interface. If a
+    word arrives while the FIFO is full, it is dropped and the saturating
+    overflows counter is incremented. Words received with parity or framing
+    errors are likewise dropped and counted in errors. Strobing clear_counters
+    resets both counters. A runtime divisor may be given instead of a baud rate.
+
+    If oversampling is given, OversamplingReceive is used as the frontend. If
+    address is given, the framing must have nine data bits, and only the data
+    frames addressed to this device are queued (see AddressFilter).
+    """
+
+    def __init__(self, baud_rate: Optional[int], fifo_depth: int = 16,
+                 counter_width: int = 16,
+                 oversampling: Optional[int] = None,
+                 framing: Framing = Framing(),
+                 address: Optional[Value] = None,
+                 broadcast: Optional[int] = None,
+                 divisor: Optional[Value] = None):
+        super().__init__()
+        if address is not None:
+            assert framing.data_bits == 9
+        self.baud_rate = baud_rate
+        self.divisor = divisor
+        self.fifo_depth = fifo_depth
+        self.oversampling = oversampling
+        self.framing = framing
+        self.address = address
+        self.broadcast = broadcast
+        self.width = 8 if address is not None else framing.data_bits
+        self.input = Signal()
+        self.data = Signal(self.width)
+        self.valid = Signal()
+        self.ready = Signal()
+        self.overflows = Signal(counter_width, reset=0)
+        self.errors = Signal(counter_width, reset=0)
+        self.clear_counters = Signal()
+
+    def elaborate(self, _: Platform) -> Module:
+        m = Module()
+        if self.oversampling is not None:
+            rx = OversamplingReceive(self.baud_rate, self.oversampling,
+                                     self.framing, self.divisor)
+        else:
+            rx = Receive(self.baud_rate, self.framing, self.divisor)
+        m.submodules.rx = rx
+        m.submodules.fifo = fifo = SyncFIFOBuffered(
+            width=self.width, depth=self.fifo_depth)
+        m.d.comb += rx.input.eq(self.input)
+        valid_frame = rx.done & ~rx.error
+        if self.address is not None:
+            m.submodules.filter = addr_filter = AddressFilter(self.broadcast)
+            m.d.comb += [
+                addr_filter.address.eq(self.address),
+                addr_filter.data_in.eq(rx.data),
+                addr_filter.strobe_in.eq(valid_frame),
+                fifo.w_data.eq(addr_filter.data_out),
+                fifo.w_en.eq(addr_filter.strobe_out),
+            ]
+        else:
+            m.d.comb += [
+                fifo.w_data.eq(rx.data),
+                fifo.w_en.eq(valid_frame),
+            ]
+        m.d.comb += [
+            self.data.eq(fifo.r_data),
+            self.valid.eq(fifo.r_rdy),
+            fifo.r_en.eq(self.ready),
+        ]
+        with m.If(self.clear_counters):
+            m.d.sync += self.overflows.eq(0)
+            m.d.sync += self.errors.eq(0)
+        with m.Else():
+            # FIFO writes are masked internally by w_rdy
+            with m.If(fifo.w_en & ~fifo.w_rdy):
+                m.d.sync += self.overflows.eq(util.SatAdd(self.overflows, 1))
+            with m.If(rx.done & rx.error):
+                m.d.sync += self.errors.eq(util.SatAdd(self.errors, 1))
+        return m
@@ -1,6 +1,7 @@
 """Tests for nmigen_nexys.serial.uart."""
 
 import os
+from typing import List, Optional, Tuple
 import unittest
 
 from nmigen import *
@@ -133,5 +134,379 @@ class ReceiveTest(unittest.TestCase):
             sim.run()
 
 
+class StreamTest(unittest.TestCase):
+    """Tests the stream interfaces in loopback."""
+
+    BAUD_RATE = 12_000_000
+
+    def _make(self, rx_fifo_depth: int = 16):
+        m = Module()
+        m.submodules.tx = tx = uart.StreamTransmit(self.BAUD_RATE)
+        m.submodules.rx = rx = uart.StreamReceive(
+            self.BAUD_RATE, fifo_depth=rx_fifo_depth)
+        m.d.comb += rx.input.eq(tx.output)
+        sim = Simulator(m)
+        sim.add_clock(1.0 / util.SIMULATION_CLOCK_FREQUENCY)
+        return tx, rx, sim
+
+    def _run(self, sim: Simulator, traces: List[Signal]):
+        def timeout():
+            yield Passive()
+            yield Delay(20e-6)
+            self.fail('Timed out after 20 us')
+
+        sim.add_process(timeout)
+        test_dir = test_util.BazelTestOutput(self.id())
+        os.makedirs(test_dir, exist_ok=True)
+        with sim.write_vcd(os.path.join(test_dir, "test.vcd"),
+                           os.path.join(test_dir, "test.gtkw"),
+                           traces=traces):
+            sim.run()
+
+    def test_loopback(self):
+        tx, rx, sim = self._make()
+        message = b'Hello, world!'
+        received = []
+        # Cycle counts at the first start bit and at the end of the last frame
+        times = []
+
+        def transmit():
+            yield Passive()
+            yield from test_util.StreamWrite(tx, message)
+
+        def line_monitor():
+            yield Passive()
+            cycle = 0
+            while True:
+                if not times and not (yield tx.output):
+                    times.append(cycle)
+                if times and not (yield tx.busy):
+                    times.append(cycle)
+                    return
+                cycle += 1
+                yield
+
+        def receive():
+            received.extend(
+                (yield from test_util.StreamRead(rx, len(message))))
+
+        sim.add_sync_process(transmit)
+        sim.add_sync_process(line_monitor)
+        sim.add_sync_process(receive)
+        self._run(sim, [tx.output, tx.busy, rx.valid, rx.data])
+        self.assertEqual(bytes(received), message)
+        # No gaps between frames
+        cycles_per_bit = util.SIMULATION_CLOCK_FREQUENCY // self.BAUD_RATE
+        expected = len(message) * 10 * util.SIMULATION_CLOCK_FREQUENCY / (
+            self.BAUD_RATE)
+        self.assertLessEqual(times[1] - times[0], expected + cycles_per_bit)
+
+    def test_overflow(self):
+        tx, rx, sim = self._make(rx_fifo_depth=2)
+        message = b'abcde'
+
+        def transmit():
+            yield from test_util.StreamWrite(tx, message)
+            yield from test_util.WaitSync(~tx.busy)
+            # Let the last frame finish in the receiver
+            for _ in range(100):
+                yield
+            self.assertEqual((yield rx.overflows), 3)
+            received = []
+            yield rx.ready.eq(1)
+            for _ in range(4):
+                yield Settle()
+                if (yield rx.valid):
+                    received.append((yield rx.data))
+                yield
+            self.assertEqual(bytes(received), b'ab')
+            yield rx.clear_counters.eq(1)
+            yield
+            yield rx.clear_counters.eq(0)
+            yield
+            self.assertEqual((yield rx.overflows), 0)
+
+        sim.add_sync_process(transmit)
+        self._run(sim, [tx.output, rx.valid, rx.overflows])
+
+
+class OversamplingReceiveTest(unittest.TestCase):
+    """Tests the oversampling receiver against mismatched and noisy lines."""
+
+    MESSAGE = bytes([0x00, 0xFF, 0x55, 0xAA, 0x01, 0x80, 0x0F, 0xF0]) * 2
+
+    def _run_test(self, tx_baud_rate: int, glitch_period: Optional[int] = None):
+        m = Module()
+        m.submodules.tx = tx = uart.StreamTransmit(tx_baud_rate)
+        m.submodules.rx = rx = uart.StreamReceive(12_000_000, oversampling=8)
+        glitch = Signal(reset=0)
+        m.d.comb += rx.input.eq(tx.output ^ glitch)
+        sim = Simulator(m)
+        sim.add_clock(1.0 / util.SIMULATION_CLOCK_FREQUENCY)
+        received = []
+
+        def transmit():
+            yield Passive()
+            yield from test_util.StreamWrite(tx, self.MESSAGE)
+
+        def noise():
+            yield Passive()
+            while True:
+                for _ in range(glitch_period - 1):
+                    yield
+                yield glitch.eq(1)
+                yield
+                yield glitch.eq(0)
+
+        def receive():
+            received.extend(
+                (yield from test_util.StreamRead(rx, len(self.MESSAGE))))
+
+        def timeout():
+            yield Passive()
+            yield Delay(20e-6)
+            self.fail('Timed out after 20 us')
+
+        sim.add_sync_process(transmit)
+        if glitch_period is not None:
+            sim.add_sync_process(noise)
+        sim.add_sync_process(receive)
+        sim.add_process(timeout)
+        test_dir = test_util.BazelTestOutput(self.id())
+        os.makedirs(test_dir, exist_ok=True)
+        with sim.write_vcd(os.path.join(test_dir, "test.vcd"),
+                           os.path.join(test_dir, "test.gtkw"),
+                           traces=[tx.output, rx.input, rx.valid, rx.data]):
+            sim.run()
+        self.assertEqual(bytes(received), self.MESSAGE)
+
+    def test_matched(self):
+        self._run_test(12_000_000)
+
+    def test_fast_transmitter(self):
+        # 100 MHz / 8.1 cycles per bit, about 3% fast
+        self._run_test(12_345_679)
+
+    def test_slow_transmitter(self):
+        # 100 MHz / 8.6 cycles per bit, about 3% slow
+        self._run_test(11_627_907)
+
+    def test_glitches(self):
+        self._run_test(12_000_000, glitch_period=13)
+
+
+class RuntimeDivisorTest(unittest.TestCase):
+    """Loops back at rates chosen by a runtime divisor register."""
+
+    def test_loopback(self):
+        m = Module()
+        divisor = Signal(uart.DIVISOR_WIDTH)
+        m.submodules.tx = tx = uart.StreamTransmit(None, divisor=divisor)
+        m.submodules.rx = rx = uart.StreamReceive(None, divisor=divisor)
+        m.d.comb += rx.input.eq(tx.output)
+        sim = Simulator(m)
+        sim.add_clock(1.0 / util.SIMULATION_CLOCK_FREQUENCY)
+        received = []
+
+        def process():
+            yield rx.ready.eq(1)
+            for baud_rate, message in [(12_000_000, b'fast'),
+                                       (3_000_000, b'slow')]:
+                yield divisor.eq(uart.Divisor(util.SIMULATION_CLOCK_FREQUENCY,
+                                              baud_rate))
+                yield from test_util.StreamWrite(tx, message)
+                while (yield tx.busy) or (yield rx.valid):
+                    yield Settle()
+                    if (yield rx.valid):
+                        received.append((yield rx.data))
+                    yield
+                # Let the receiver finish the last stop bit
+                for _ in range(100):
+                    yield Settle()
+                    if (yield rx.valid):
+                        received.append((yield rx.data))
+                    yield
+
+        sim.add_sync_process(process)
+        sim.run()
+        self.assertEqual(bytes(received), b'fastslow')
+
+
+class AutobaudReceiveTest(unittest.TestCase):
+    """Locks onto a sync character and echoes at the detected rate."""
+
+    MESSAGE = b'Hello, world!'
+
+    def _run_test(self, baud_rates: List[int], preamble: bytes = b''):
+        m = Module()
+        baud_rate = Signal(uart.DIVISOR_WIDTH)
+        # The host transmits at a runtime divisor so that it can change rates
+        m.submodules.host_tx = host_tx = uart.StreamTransmit(
+            None, divisor=baud_rate)
+        m.submodules.rx = rx = uart.AutobaudReceive()
+        m.d.comb += rx.input.eq(host_tx.output)
+        # Echo back at the detected rate, which may be slightly slower
+        m.submodules.tx = tx = uart.StreamTransmit(None, divisor=rx.divisor)
+        m.d.comb += tx.data.eq(rx.data)
+        m.d.comb += tx.valid.eq(rx.done & ~rx.error)
+        m.submodules.host_rx = host_rx = uart.StreamReceive(
+            None, divisor=baud_rate)
+        m.d.comb += host_rx.input.eq(tx.output)
+        sim = Simulator(m)
+        sim.add_clock(1.0 / util.SIMULATION_CLOCK_FREQUENCY)
+        echoed = []
+        divisors = []
+
+        def host():
+            for i, rate in enumerate(baud_rates):
+                expected_divisor = uart.Divisor(
+                    util.SIMULATION_CLOCK_FREQUENCY, rate)
+                yield baud_rate.eq(expected_divisor)
+                if i > 0:
+                    yield rx.relock.eq(1)
+                    yield
+                    yield rx.relock.eq(0)
+                if preamble:
+                    yield from test_util.StreamWrite(host_tx, preamble)
+                    yield from test_util.WaitSync(host_tx.busy)
+                    yield from test_util.WaitSync(~host_tx.busy)
+                    # Idle for a couple of bit periods
+                    for _ in range(expected_divisor >> 2):
+                        yield
+                yield from test_util.StreamWrite(host_tx, b'U' + self.MESSAGE)
+                received = yield from test_util.StreamRead(
+                    host_rx, len(self.MESSAGE))
+                echoed.append(bytes(received))
+                divisors.append(((yield rx.divisor), expected_divisor))
+
+        def timeout():
+            yield Passive()
+            yield Delay(1e-3)
+            self.fail('Timed out after 1 ms')
+
+        sim.add_sync_process(host)
+        sim.add_process(timeout)
+        test_dir = test_util.BazelTestOutput(self.id())
+        os.makedirs(test_dir, exist_ok=True)
+        with sim.write_vcd(os.path.join(test_dir, "test.vcd"),
+                           os.path.join(test_dir, "test.gtkw"),
+                           traces=[host_tx.output, rx.locked, rx.divisor,
+                                   tx.output, host_rx.valid, host_rx.data]):
+            sim.run()
+        self.assertEqual(echoed, [self.MESSAGE] * len(baud_rates))
+        for actual, expected in divisors:
+            # Each edge is captured to within a cycle
+            self.assertLessEqual(abs(actual - expected), 2)
+
+    def test_lock(self):
+        for baud_rate in [12_000_000, 3_000_000, 921_600]:
+            with self.subTest(baud_rate=baud_rate):
+                self._run_test([baud_rate])
+
+    def test_relock(self):
+        self._run_test([2_000_000, 10_000_000])
+
+    def test_reject(self):
+        # 0xD5 only differs from the sync character in its last data bit, and
+        # the fifth falling edge after the start bit of 'A' is the start bit
+        # of the 'U'
+        for preamble in [b'A', b'\xD5', b'\x00\xAA']:
+            with self.subTest(preamble=preamble):
+                self._run_test([3_000_000], preamble=preamble)
+
+
+class FramingTest(unittest.TestCase):
+    """Tests non-default framing in loopback."""
+
+    def _loopback(self, tx_framing: uart.Framing, words: List[int],
+                  **rx_kwargs) -> Tuple[List[int], int]:
+        """Returns the received words and the error count."""
+        m = Module()
+        m.submodules.tx = tx = uart.StreamTransmit(
+            12_000_000, framing=tx_framing)
+        m.submodules.rx = rx = uart.StreamReceive(12_000_000, **rx_kwargs)
+        m.d.comb += rx.input.eq(tx.output)
+        sim = Simulator(m)
+        sim.add_clock(1.0 / util.SIMULATION_CLOCK_FREQUENCY)
+        received = []
+        errors = []
+
+        def process():
+            yield from test_util.StreamWrite(tx, words)
+            yield from test_util.WaitSync(~tx.busy)
+            # Let the last frame finish in the receiver
+            for _ in range(100):
+                yield
+            yield rx.ready.eq(1)
+            for _ in range(len(words) + 2):
+                yield Settle()
+                if (yield rx.valid):
+                    received.append((yield rx.data))
+                yield
+            errors.append((yield rx.errors))
+
+        sim.add_sync_process(process)
+        test_dir = test_util.BazelTestOutput(self.id())
+        os.makedirs(test_dir, exist_ok=True)
+        with sim.write_vcd(os.path.join(test_dir, "test.vcd"),
+                           os.path.join(test_dir, "test.gtkw"),
+                           traces=[tx.output, rx.valid, rx.data, rx.errors]):
+            sim.run()
+        return received, errors[0]
+
+    def test_7e1(self):
+        framing = uart.Framing(data_bits=7, parity=uart.Parity.EVEN)
+        words = [0x00, 0x7F, 0x41, 0x2A, 0x15]
+        for oversampling in [None, 8]:
+            with self.subTest(oversampling=oversampling):
+                received, errors = self._loopback(
+                    framing, words, framing=framing, oversampling=oversampling)
+                self.assertEqual(received, words)
+                self.assertEqual(errors, 0)
+
+    def test_8o2(self):
+        framing = uart.Framing(parity=uart.Parity.ODD, stop_bits=2)
+        words = [0x00, 0xFF, 0x80, 0x01]
+        received, errors = self._loopback(framing, words, framing=framing)
+        self.assertEqual(received, words)
+        self.assertEqual(errors, 0)
+
+    def test_parity_error(self):
+        words = [0x00, 0x01, 0x03]
+        for oversampling in [None, 8]:
+            with self.subTest(oversampling=oversampling):
+                received, errors = self._loopback(
+                    uart.Framing(parity=uart.Parity.ODD), words,
+                    framing=uart.Framing(parity=uart.Parity.EVEN),
+                    oversampling=oversampling)
+                self.assertEqual(received, [])
+                self.assertEqual(errors, len(words))
+
+    def test_framing_error(self):
+        # The receiver sees the cleared ninth bit as a missing stop bit
+        words = [0x0AA, 0x055]
+        for oversampling in [None, 8]:
+            with self.subTest(oversampling=oversampling):
+                received, errors = self._loopback(
+                    uart.Framing(data_bits=9), words,
+                    oversampling=oversampling)
+                self.assertEqual(received, [])
+                self.assertEqual(errors, len(words))
+
+    def test_multidrop(self):
+        framing = uart.Framing(data_bits=9)
+        words = [
+            0x105, ord('x'),  # Another device
+            0x142, ord('h'), ord('i'),  # This device
+            0x106, ord('y'),  # Another device
+            0x1FF, ord('!'),  # Broadcast
+        ]
+        received, errors = self._loopback(
+            framing, words, framing=framing, address=C(0x42, 8),
+            broadcast=0xFF)
+        self.assertEqual(bytes(received), b'hi!')
+        self.assertEqual(errors, 0)
+
+
 if __name__ == '__main__':
     unittest.main()
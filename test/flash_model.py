@@ -0,0 +1,109 @@
+"""Behavioral SPI flash model for simulation."""
+
+from typing import List, NamedTuple, Optional, Tuple
+
+from nmigen.sim import *
+
+from nmigen_nexys.core import util
+from nmigen_nexys.serial import spi
+
+
+class FlashCommand(NamedTuple):
+    """Layout of a command supported by FlashModel."""
+    mode: spi.TransferMode
+    address_bits: int
+    dummy_cycles: int
+    write: bool
+
+
+COMMANDS = {
+    0x02: FlashCommand(spi.MODE_1_1_1, 24, 0, True),  # Page program
+    0x03: FlashCommand(spi.MODE_1_1_1, 24, 0, False),  # Read
+    0x0B: FlashCommand(spi.MODE_1_1_1, 24, 8, False),  # Fast read
+    0x3B: FlashCommand(spi.MODE_1_1_2, 24, 8, False),  # Dual output read
+    0x6B: FlashCommand(spi.MODE_1_1_4, 24, 8, False),  # Quad output read
+    # Quad I/O read, with the mode byte sent as part of the address
+    0xEB: FlashCommand(spi.MODE_1_4_4, 32, 4, False),
+}
+
+
+def FlashModel(bus: spi.QuadBus, memory: bytearray,
+               log: Optional[List[Tuple[int, int]]] = None):
+    """Behavioral flash device supporting COMMANDS.
+
+    The bus is polled four times per system clock cycle, between clock edges.
+    Driving a lane that the master is also driving fails the simulation, as
+    does deasserting write protect or hold during single- and dual-lane
+    phases. If given, each transaction is recorded in log as an (opcode,
+    address) pair.
+    """
+    period = 1.0 / util.SIMULATION_CLOCK_FREQUENCY
+
+    def process():
+        yield Passive()
+        yield Delay(period / 2 + period / 8)
+        last_cs_n = 1
+        last_clk = 0
+        while True:
+            cs_n = yield bus.cs_n
+            clk = yield bus.clk
+            dq_o = yield bus.dq_o
+            dq_oe = yield bus.dq_oe
+            if last_cs_n and not cs_n:
+                clocks = 0
+                value = 0
+                command = None
+                drive = 0
+            elif not cs_n and clk and not last_clk:
+                # Leading edge: sample the master's lanes
+                if command is None:
+                    lanes = 1
+                else:
+                    lanes = 1 << command.mode.address
+                    if clocks >= 8 + address_clocks:
+                        # The lanes turn around for the dummy phase
+                        lanes = 1 << command.mode.data
+                if lanes < 4:
+                    assert dq_oe >> 2 == 0b11 and dq_o >> 2 == 0b11
+                assert dq_oe & drive == 0, 'Bus contention'
+                value = (value << lanes) | (dq_o & (2**lanes - 1))
+                clocks += 1
+                if command is None and clocks == 8:
+                    opcode = value
+                    command = COMMANDS[value]
+                    address_clocks = (command.address_bits >>
+                                      command.mode.address)
+                    data_start = 8 + address_clocks + command.dummy_cycles
+                    value = 0
+                elif command is not None and (
+                        clocks == 8 + address_clocks):
+                    address = value >> (command.address_bits - 24)
+                    start_address = address
+                    value = 0
+                elif command is not None and command.write and (
+                        clocks > data_start and
+                        (clocks - data_start) % 8 == 0):
+                    memory[address] = value & 0xFF
+                    address += 1
+            elif not cs_n and not clk and last_clk:
+                # Trailing edge: drive read data for the next clock
+                if (command is not None and not command.write and
+                        clocks >= data_start):
+                    lanes = 1 << command.mode.data
+                    bit = (clocks - data_start) * lanes
+                    byte = memory[address + bit // 8]
+                    bits = (byte >> (8 - lanes - bit % 8)) & (2**lanes - 1)
+                    if lanes == 1:
+                        drive = 0b0010
+                        yield bus.dq_i.eq(bits << 1)
+                    else:
+                        drive = 2**lanes - 1
+                        yield bus.dq_i.eq(bits)
+            elif not last_cs_n and cs_n:
+                drive = 0
+                if log is not None and command is not None:
+                    log.append((opcode, start_address))
+            last_cs_n, last_clk = cs_n, clk
+            yield Delay(period / 4)
+
+    return process
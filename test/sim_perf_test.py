@@ -18,6 +18,8 @@ from nmigen_nexys.test import test_util
 
 flags.DEFINE_boolean('vcd', False, 'Generate VCD/GTKW output')
 flags.DEFINE_integer('runs', 10, 'Number of test iterations to profile')
+flags.DEFINE_integer('stream_length', 64,
+                     'Number of contiguous characters to stream')
 
 FLAGS = flags.FLAGS
 
@@ -88,12 +90,64 @@ class SimPerfTest(unittest.TestCase):
                                   traces=[tx.output, rx.input]))
             sim.run()
 
+    def _run_stream_test(self, message: bytes):
+        m = Module()
+        pins = Record(Layout([
+            ('rx', 1, Direction.FANIN),
+            ('tx', 1, Direction.FANOUT),
+            ('rts', 1, Direction.FANOUT),
+            ('cts', 1, Direction.FANIN),
+        ]))
+        m.submodules.tx = tx = uart.StreamTransmit(12_000_000)
+        m.submodules.rx = rx = uart.StreamReceive(12_000_000)
+        m.submodules.demo = uart_demo.UARTDemo(
+            pins, rx_fifo_depth=max(len(message), 16))
+        m.d.comb += pins.rx.eq(tx.output)
+        m.d.comb += rx.input.eq(pins.tx)
+        expected = b''.join(
+            b"'" + bytes([c]) + f"' = 0x{c:02X}\r\n".encode()
+            for c in message)
+        m.submodules.timer = timer = test_util.Timer(
+            self, timeout_s=len(expected) * 1e-6)
+        sim = Simulator(m)
+        sim.add_clock(1.0 / util.SIMULATION_CLOCK_FREQUENCY)
+        received = []
+
+        def transmit():
+            yield Passive()
+            yield from test_util.StreamWrite(tx, message)
+
+        def receive():
+            received.extend(
+                (yield from test_util.StreamRead(rx, len(expected))))
+
+        sim.add_sync_process(transmit)
+        sim.add_sync_process(receive)
+        sim.add_sync_process(timer.timeout_process)
+        test_dir = test_util.BazelTestOutput(self.id())
+        os.makedirs(test_dir, exist_ok=True)
+        with contextlib.ExitStack() as stack:
+            if FLAGS.vcd:
+                stack.enter_context(
+                    sim.write_vcd(os.path.join(test_dir, "test.vcd"),
+                                  os.path.join(test_dir, "test.gtkw"),
+                                  traces=[tx.output, rx.input]))
+            sim.run()
+        self.assertEqual(bytes(received), expected)
+
     def test_sim(self):
         test = rf"""self._run_test('a', b"'a' = 0x61\r\n", runs={FLAGS.runs})"""
         test_dir = test_util.BazelTestOutput(self.id())
         perf_file = os.path.join(test_dir, 'test.perf')
         cProfile.runctx(test, globals(), locals(), perf_file)
 
+    def test_stream_sim(self):
+        message = bytes(32 + i % 95 for i in range(FLAGS.stream_length))
+        test = 'self._run_stream_test(message)'
+        test_dir = test_util.BazelTestOutput(self.id())
+        perf_file = os.path.join(test_dir, 'test.perf')
+        cProfile.runctx(test, globals(), locals(), perf_file)
+
 
 if __name__ == '__main__':
     app.run(lambda argv: unittest.main(argv=argv))
@@ -1,7 +1,7 @@
 """Utilities for test and simulation."""
 
 import os
-from typing import Generator, Union, TypeVar
+from typing import Generator, Iterable, List, Union, TypeVar
 import unittest
 
 from nmigen import *
@@ -68,6 +68,29 @@ def WaitSync(signal: Signal):
         yield
 
 
+def StreamWrite(stream, words: Iterable[int]) -> CoroutineProcess[None]:
+    """Send words on a data/valid/ready stream, such as uart.StreamTransmit."""
+    for word in words:
+        yield stream.data.eq(word)
+        yield stream.valid.eq(1)
+        yield
+        while not (yield stream.ready):
+            yield
+    yield stream.valid.eq(0)
+
+
+def StreamRead(stream, count: int) -> CoroutineProcess[List[int]]:
+    """Receive count words from a data/valid/ready stream."""
+    words = []
+    yield stream.ready.eq(1)
+    while len(words) < count:
+        yield Settle()
+        if (yield stream.valid):
+            words.append((yield stream.data))
+        yield
+    return words
+
+
 # TODO: This should be handled by nMigen itself, by descheduling the process
 # until some event occurs.
 def WaitEdge(signal):